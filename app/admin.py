@@ -1,18 +1,21 @@
 # app/admin.py
-from flask_admin import Admin, AdminIndexView, expose
+from flask_admin import Admin, AdminIndexView, BaseView, expose
 from flask_admin.contrib.sqla import ModelView
-from flask_admin.contrib.sqla.filters import DateBetweenFilter, FilterEqual
+from flask_admin.contrib.sqla.filters import DateBetweenFilter, FilterEqual, BaseSQLAFilter
 from flask_admin.actions import action
 from flask_login import current_user
-from flask import abort, flash
+from flask import abort, flash, request, redirect, url_for, current_app, Response
 from flask_babel import gettext
 from wtforms import TextAreaField, ValidationError
 from wtforms.fields import PasswordField
 from werkzeug.security import generate_password_hash
 from sqlalchemy.orm.attributes import get_history
-from . import db
-from datetime import date
-from .models import Employee, Department, JobDetail, Absence, OrgRole, User, SystemRole, EmployeeHistory  
+from sqlalchemy.orm import joinedload, load_only, noload
+from sqlalchemy import select, update, delete, insert, not_, func
+from . import db, kpi, history, utils, live, cache, counters, jobs, profiler
+from .changes import record_changes
+from datetime import date, timedelta
+from .models import Employee, Department, JobDetail, Absence, AbsencePart, OrgRole, User, SystemRole, EmployeeHistory, Job, Team, EmployeeSearchTerm, normalize_search
 from markupsafe import Markup
 
 admin = Admin(name='Admin Panel', template_mode='bootstrap4', url='/admin')
@@ -37,12 +40,21 @@ def _role_value(val):
 def _role_label(val) -> str:
     return VI_ROLE_LABEL.get(_role_value(val), '')
 
+def _role_name(val):
+    # coerce cho ô chọn org_role: Enum (dữ liệu của model) / chuỗi (form gửi lên) -> "MEMBER" | ...
+    return val.name if isinstance(val, OrgRole) else str(val)
+
 # fields cần tracking (phù hợp với model Employee hiện tại)
 TRACKED_FIELDS = {"department_id", "position", "org_role"}
 
 def _enum_val(x):
     return x.value if hasattr(x, "value") else x
 
+# Số lượng nhân viên theo phạm vi xem ('all' hoặc ('dept', id)) cho trang danh sách admin,
+# đọc từ bộ đếm theo phòng (app/counters.py) thay vì COUNT(*).
+def _count_employees_in_scope(scope):
+    return counters.headcount(None if scope == "all" else scope[1])
+
 def infer_change_type(changed: set[str]) -> str:
     # Ưu tiên theo nghiệp vụ
     if "department_id" in changed:
@@ -85,10 +97,12 @@ class EmployeeModelView(ModelView):
     column_list = ['name', 'department', 'position', 'email', 'phone', 'org_role']
     column_labels = {
         'name': 'Họ tên', 'department': 'Tổ/Phòng', 'position': 'Vị trí',
-        'email': 'Email', 'phone': 'Điện thoại', 'org_role': 'Vai trò'
+        'email': 'Email', 'phone': 'Điện thoại', 'org_role': 'Vai trò', 'team': 'Tổ (nhóm)'
     }
     column_searchable_list = ['name', 'position', 'email', 'phone']
-    form_columns = ['name', 'year_of_birth', 'position', 'email', 'phone', 'department', 'org_role', 'reason']
+    # Phòng ban được joined-load trong get_list (chỉ lấy cột name)
+    column_auto_select_related = False
+    form_columns = ['name', 'year_of_birth', 'position', 'email', 'phone', 'department', 'team', 'org_role', 'reason']
         # Hiển thị tiếng Việt ở bảng (list view)
     column_formatters = {
         'org_role': lambda v, c, m, p: (m.org_role.value if m.org_role else ''),
@@ -106,11 +120,12 @@ class EmployeeModelView(ModelView):
             ('DEPT_HEAD', 'Trưởng/phó phòng')
         ]
     }
+    # coerce mặc định là str -> "OrgRole.DEPT_HEAD" không khớp lựa chọn nào, form hiện sai vai trò
+    form_args = {'org_role': {'coerce': _role_name}}
     form_extra_fields = { 'reason': TextAreaField('Lý do điều chỉnh') }
         # Giới hạn quyền truy cập
     def is_accessible(self):
         # Cho phép ADMIN, HR_GENERAL và HR_DEPARTMENT
-        print(current_user.role)
         allowed_roles = ["ADMIN", "HR_GENERAL", "HR_DEPARTMENT"]
         return current_user.is_authenticated and current_user.role.value in allowed_roles
 
@@ -167,6 +182,52 @@ class EmployeeModelView(ModelView):
             return query.filter(Employee.department_id == current_user.employee.department_id)
         return query
 
+    def _count_scope(self):
+        if current_user.is_authenticated and current_user.role.value == "HR_DEPARTMENT":
+            return ("dept", current_user.employee.department_id)
+        return "all"
+
+    def _cached_count(self):
+        return _count_employees_in_scope(self._count_scope())
+
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        """Mỗi từ tìm theo tiền tố trên bảng từ khóa đã bỏ dấu (dùng index) thay vì 4 mệnh đề LIKE."""
+        for term in normalize_search(search).split():
+            # Tiền tố viết dạng khoảng [term, term kế tiếp) -> index dùng được trên cả SQLite lẫn MySQL
+            term = term[:100]
+            upper = term[:-1] + chr(ord(term[-1]) + 1)
+            cond = Employee.id.in_(select(EmployeeSearchTerm.employee_id)
+                                   .where(EmployeeSearchTerm.term >= term, EmployeeSearchTerm.term < upper))
+            query = query.filter(cond)
+            if count_query is not None:
+                count_query = count_query.filter(cond)
+        return query, count_query, joins, count_joins
+
+    def get_list(self, page, sort_column, sort_desc, search, filters,
+                 execute=True, page_size=None):
+        """
+        Số truy vấn cố định theo trang: 1 COUNT (có cache khi không tìm/lọc) + 1 SELECT
+        đã joined-load phòng ban và chỉ lấy các cột hiển thị.
+        """
+        if search or filters:
+            count, query = super().get_list(page, sort_column, sort_desc, search, filters,
+                                            execute=False, page_size=page_size)
+        else:
+            count = self._cached_count()
+            query = self.get_query()
+            query, _ = self._apply_sorting(query, {}, sort_column, sort_desc)
+            query = self._apply_pagination(query, page, page_size)
+
+        query = query.options(
+            load_only(Employee.name, Employee.department_id, Employee.position,
+                      Employee.email, Employee.phone, Employee.org_role),
+            joinedload(Employee.department).load_only(Department.name),
+            noload(Employee.absences),
+        )
+        if execute:
+            query = query.all()
+        return count, query
+
     def on_model_change(self, form, model, is_created):
         # Chuẩn hoá enum nếu form trả về string
         if isinstance(model.org_role, str):
@@ -174,9 +235,9 @@ class EmployeeModelView(ModelView):
 
         # ----- CREATE: mở kỳ đầu tiên -----
         if is_created:
-            db.session.add(EmployeeHistory(
+            db.session.flush()  # cần model.id cho kỳ lịch sử đầu tiên
+            history.open_period(
                 employee_id=model.id,
-                effective_from=date.today(),
                 department_id=model.department_id,
                 position=model.position,
                 org_role=model.org_role,
@@ -184,7 +245,8 @@ class EmployeeModelView(ModelView):
                 reason=(form.reason.data if hasattr(form, "reason") else None),
                 source="admin",
                 changed_by=getattr(current_user, "username", "system"),
-            ))
+                current=False,
+            )
             return super().on_model_change(form, model, is_created)
 
         # ===== UPDATE =====
@@ -205,10 +267,7 @@ class EmployeeModelView(ModelView):
             new_org_role = model.org_role
 
         # 2) LẤY SNAPSHOT HIỆN HÀNH (kỳ đang mở) TỪ EmployeeHistory
-        current_hist = (EmployeeHistory.query
-                        .filter_by(employee_id=model.id, effective_to=None)
-                        .order_by(EmployeeHistory.effective_from.desc(), EmployeeHistory.id.desc())
-                        .first())
+        current_hist = history.current_period(model.id)
 
         old_dep  = _enum_val(getattr(current_hist, "department_id", None)) if current_hist else None
         old_pos  = _enum_val(getattr(current_hist, "position", None))      if current_hist else None
@@ -232,15 +291,9 @@ class EmployeeModelView(ModelView):
             if not getattr(form, "reason", None) or not form.reason.data.strip():
                 raise ValidationError("Vui lòng nhập Lý do điều chỉnh.")
 
-            # 3) ĐÓNG KỲ CŨ
-            if current_hist:
-                current_hist.effective_to = date.today()
-                db.session.add(current_hist)
-
-            # 4) MỞ KỲ MỚI (snapshot dùng GIÁ TRỊ MỚI LẤY TỪ FORM)
-            db.session.add(EmployeeHistory(
+            # 3) ĐÓNG KỲ CŨ + 4) MỞ KỲ MỚI (snapshot dùng GIÁ TRỊ MỚI LẤY TỪ FORM)
+            history.open_period(
                 employee_id=model.id,
-                effective_from=date.today(),
                 department_id=new_department_id,
                 position=new_position,
                 org_role=new_org_role,
@@ -248,11 +301,444 @@ class EmployeeModelView(ModelView):
                 reason=form.reason.data.strip(),
                 source="admin",
                 changed_by=getattr(current_user, "username", "system"),
-            ))
+                current=current_hist,
+            )
 
         return super().on_model_change(form, model, is_created)
 
+def _is_hr_department():
+    return current_user.is_authenticated and current_user.role.value == "HR_DEPARTMENT"
+
+def _scoped_employee_query():
+    """Nhân viên trong phạm vi quản lý của user hiện tại (HR_DEPARTMENT -> chỉ phòng mình)."""
+    q = (Employee.query
+         .options(load_only(Employee.name, Employee.department_id), noload(Employee.absences))
+         .order_by(Employee.name.asc()))
+    if _is_hr_department():
+        q = q.filter(Employee.department_id == current_user.employee.department_id)
+    return q
+
+def _scoped_employee_ids():
+    """Subquery id nhân viên trong phạm vi; None = không giới hạn."""
+    if _is_hr_department():
+        return select(Employee.id).where(Employee.department_id == current_user.employee.department_id)
+    return None
+
+class FilterAbsenceDepartment(BaseSQLAFilter):
+    """Lọc theo phòng ban qua employee_id IN (...) để dùng index employee_id, không cần JOIN."""
+    def clean(self, value):
+        # validate() mặc định gọi clean(): giá trị không phải số -> bộ lọc bị bỏ qua thay vì lỗi 500
+        return int(value)
+
+    def apply(self, query, value, alias=None):
+        return query.filter(Absence.employee_id.in_(
+            select(Employee.id).where(Employee.department_id == value)))
+
+    def operation(self):
+        return 'bằng'
+
+    def get_options(self, view):
+        # Flask-Admin lưu options từ lúc khởi tạo view (chưa chắc đã có bảng/dữ liệu):
+        # trả về đối tượng lười để mỗi lần hiển thị mới truy vấn danh sách phòng.
+        return _LazyOptions(self.options)
+
+class _LazyOptions:
+    def __init__(self, loader):
+        self.loader = loader
+
+    def __iter__(self):
+        return iter(self.loader())
+
+def _department_options():
+    return [(str(d.id), d.name) for d in
+            Department.query.with_entities(Department.id, Department.name).order_by(Department.name)]
+
+class AbsenceModelView(ModelView):
+    list_template = 'admin/absence_list.html'
+    column_list = ['employee', 'work_date', 'part', 'is_permitted', 'reason']
+    column_labels = {
+        'employee': 'Nhân viên', 'work_date': 'Ngày nghỉ', 'part': 'Buổi',
+        'is_permitted': 'Có phép', 'reason': 'Lý do'
+    }
+    column_default_sort = ('work_date', True)
+    column_sortable_list = ['work_date', 'part', 'is_permitted']
+    column_formatters = {
+        'employee': lambda v, c, m, p: (m.employee.name if m.employee else ''),
+        'part': lambda v, c, m, p: (m.part.value if m.part else ''),
+    }
+    column_filters = [
+        DateBetweenFilter(Absence.work_date, 'Ngày nghỉ'),
+        FilterAbsenceDepartment(Absence.employee_id, 'Tổ/Phòng', options=_department_options),
+        FilterEqual(Absence.employee_id, 'Mã nhân viên'),
+    ]
+    form_columns = ['employee', 'work_date', 'part', 'is_permitted', 'reason']
+    form_args = {
+        'employee': {'label': 'Nhân viên', 'query_factory': _scoped_employee_query},
+    }
+    column_auto_select_related = False
+    # Xóa hàng loạt bằng 1 câu DELETE (xem action_delete)
+    fast_mass_delete = True
+
+    def is_accessible(self):
+        allowed_roles = ["ADMIN", "HR_GENERAL", "HR_DEPARTMENT"]
+        return current_user.is_authenticated and current_user.role.value in allowed_roles
+
+    def inaccessible_callback(self, name, **kwargs):
+        abort(403)
+
+    def _scope(self, query):
+        emp_ids = _scoped_employee_ids()
+        if emp_ids is not None:
+            query = query.filter(Absence.employee_id.in_(emp_ids))
+        return query
+
+    def get_query(self):
+        # Chỉ lấy tên nhân viên, không kéo theo toàn bộ absences của nhân viên đó
+        return self._scope(super().get_query()).options(
+            joinedload(Absence.employee).load_only(Employee.name).noload(Employee.absences))
+
+    def get_count_query(self):
+        return self._scope(super().get_count_query())
+
+    def get_one(self, id):
+        obj = super().get_one(id)
+        if obj is not None and _is_hr_department() and \
+                obj.employee.department_id != current_user.employee.department_id:
+            abort(403)
+        return obj
+
+    def on_model_change(self, form, model, is_created):
+        if _is_hr_department():
+            emp = model.employee or db.session.get(Employee, model.employee_id)
+            if not emp or emp.department_id != current_user.employee.department_id:
+                abort(403)
+        return super().on_model_change(form, model, is_created)
+
+    # --- Thao tác hàng loạt: 1 câu SQL cho cả tập, không flush từng dòng ---
+    def _affected(self, ids):
+        """(employee_id, work_date) của các dòng được chọn và nằm trong phạm vi."""
+        q = self._scope(db.session.query(Absence.id, Absence.employee_id, Absence.work_date)
+                        .filter(Absence.id.in_([int(i) for i in ids])))
+        return q.all()
+
+    def _mark_changed(self, rows):
+        """KPI dirty + bộ đếm theo phòng + tag cache của các (nhân viên, tháng) bị ảnh hưởng."""
+        by_month = {}
+        for r in rows:
+            by_month.setdefault((r.work_date.year, r.work_date.month), set()).add(r.employee_id)
+        for month, emp_ids in by_month.items():
+            kpi.mark_kpi_dirty(db.session, emp_ids, [month])
+        counters.rebuild_periods(db.session, by_month)
+        cache.tag_on_commit(db.session, *(cache.month_tag(r.employee_id, r.work_date) for r in rows))
+
+    @action('toggle_permitted', 'Đổi Có phép/Không phép',
+            'Đổi trạng thái có phép cho các dòng đã chọn?')
+    def action_toggle_permitted(self, ids):
+        try:
+            rows = self._affected(ids)
+            if rows:
+                db.session.execute(
+                    update(Absence)
+                    .where(Absence.id.in_([r.id for r in rows]))
+                    .values(is_permitted=not_(Absence.is_permitted)),
+                    execution_options={"synchronize_session": False})
+                self._mark_changed(rows)
+                record_changes(db.session, "absences", [r.id for r in rows], "U")
+                live.mark_stale(db.session)
+            db.session.commit()
+            flash(f'Đã đổi trạng thái {len(rows)} dòng.', 'success')
+        except Exception as ex:
+            db.session.rollback()
+            if not self.handle_view_exception(ex):
+                raise
+            flash(gettext('Failed to update record. %(error)s', error=str(ex)), 'error')
+
+    @action('delete', 'Xóa', 'Xóa các dòng nghỉ đã chọn?')
+    def action_delete(self, ids):
+        try:
+            rows = self._affected(ids)
+            if rows:
+                db.session.execute(
+                    delete(Absence).where(Absence.id.in_([r.id for r in rows])),
+                    execution_options={"synchronize_session": False})
+                self._mark_changed(rows)
+                record_changes(db.session, "absences", [r.id for r in rows], "D")
+                live.mark_stale(db.session)
+            db.session.commit()
+            flash(f'Đã xóa {len(rows)} dòng.', 'success')
+        except Exception as ex:
+            db.session.rollback()
+            if not self.handle_view_exception(ex):
+                raise
+            flash(gettext('Failed to delete records. %(error)s', error=str(ex)), 'error')
+
+    @expose('/bulk-add/', methods=('GET', 'POST'))
+    def bulk_add_view(self):
+        """Đánh dấu nghỉ cho nhiều nhân viên trong một khoảng ngày (INSERT bỏ qua dòng đã có)."""
+        employees = _scoped_employee_query().all()
+        return_url = url_for('.index_view')
+
+        if request.method == 'POST':
+            try:
+                emp_ids = {int(i) for i in request.form.getlist('employee_ids')}
+                date_from = date.fromisoformat(request.form['date_from'])
+                date_to = date.fromisoformat(request.form['date_to'])
+                part = AbsencePart[request.form.get('part', 'FULL')]
+            except (KeyError, ValueError):
+                flash('Dữ liệu không hợp lệ.', 'error')
+                return redirect(url_for('.bulk_add_view'))
+
+            allowed = {e.id for e in employees}
+            if not emp_ids or not emp_ids <= allowed:
+                abort(403)
+            if date_to < date_from or (date_to - date_from).days > 366:
+                flash('Khoảng ngày không hợp lệ (tối đa 1 năm).', 'error')
+                return redirect(url_for('.bulk_add_view'))
+
+            skip_weekend = bool(request.form.get('skip_weekend'))
+            is_permitted = bool(request.form.get('is_permitted'))
+            reason = (request.form.get('reason') or '').strip() or None
+
+            days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+            if skip_weekend:
+                days = [d for d in days if d.weekday() < 5]
+
+            values = [{"employee_id": e, "work_date": d, "part": part,
+                       "is_permitted": is_permitted, "reason": reason}
+                      for e in sorted(emp_ids) for d in days]
+            try:
+                if values:
+                    # Trùng uq_abs_employee_date_part thì bỏ qua -> gửi lại không tạo dòng lặp
+                    stmt = (insert(Absence)
+                            .prefix_with('IGNORE', dialect='mysql')
+                            .prefix_with('OR IGNORE', dialect='sqlite'))
+                    db.session.execute(stmt, values)
+                    kpi.mark_kpi_dirty(db.session, emp_ids, {(d.year, d.month) for d in days})
+                    # Dòng đã có bị bỏ qua cũng ghi "U": client đồng bộ chỉ cần upsert lại
+                    record_changes(db.session, "absences", db.session.scalars(
+                        select(Absence.id).where(Absence.employee_id.in_(emp_ids),
+                                                 Absence.work_date.in_(days),
+                                                 Absence.part == part)), "U")
+                    live.mark_stale(db.session)
+                    counters.rebuild_periods(db.session, {(d.year, d.month) for d in days})
+                    cache.tag_on_commit(db.session, *(cache.month_tag(e, d) for e in emp_ids for d in days))
+                db.session.commit()
+                flash(f'Đã ghi nhận nghỉ cho {len(emp_ids)} nhân viên, {len(days)} ngày.', 'success')
+            except Exception as ex:
+                db.session.rollback()
+                flash(gettext('Failed to create record. %(error)s', error=str(ex)), 'error')
+                return redirect(url_for('.bulk_add_view'))
+            return redirect(return_url)
+
+        return self.render('admin/absence_bulk_add.html', employees=employees,
+                           parts=list(AbsencePart), return_url=return_url,
+                           today=date.today().isoformat())
+
+    @expose('/roll-call/', methods=('GET', 'POST'))
+    def roll_call_view(self):
+        """Điểm danh cả ngày: 1 bảng cho toàn bộ nhân viên trong phạm vi, lưu bằng 1 transaction."""
+        employees = _scoped_employee_query().all()
+        try:
+            work_date = date.fromisoformat(request.values.get('date') or date.today().isoformat())
+        except ValueError:
+            flash('Ngày không hợp lệ.', 'error')
+            return redirect(url_for('.roll_call_view'))
+
+        if request.method == 'POST':
+            entries = []
+            for e in employees:
+                am, pm = request.form.get(f'am_{e.id}'), request.form.get(f'pm_{e.id}')
+                if not (am or pm):
+                    continue
+                entries.append({
+                    "employee_id": e.id,
+                    "part": "FULL" if am and pm else ("AM" if am else "PM"),
+                    "is_permitted": bool(request.form.get(f'permitted_{e.id}')),
+                    "reason": request.form.get(f'reason_{e.id}'),
+                })
+            try:
+                s = utils.apply_roll_call(work_date, entries,
+                                          delete_missing=bool(request.form.get('delete_missing')),
+                                          scope_ids={e.id for e in employees})
+                flash(f"Đã lưu điểm danh {work_date.strftime('%d/%m/%Y')}: thêm {s['inserted']}, "
+                      f"sửa {s['updated']}, xóa {s['deleted']}, giữ nguyên {s['unchanged']}.", 'success')
+            except Exception as ex:
+                flash(gettext('Failed to update record. %(error)s', error=str(ex)), 'error')
+            return redirect(url_for('.roll_call_view', date=work_date.isoformat()))
+
+        # Điền sẵn dữ liệu đã có trong ngày
+        existing = {}
+        q = self._scope(db.session.query(Absence.employee_id, Absence.part,
+                                         Absence.is_permitted, Absence.reason)
+                        .filter(Absence.work_date == work_date))
+        for r in q:
+            cur = existing.setdefault(r.employee_id, {"am": False, "pm": False,
+                                                      "permitted": False, "reason": ""})
+            cur["am"] = cur["am"] or r.part in (AbsencePart.FULL, AbsencePart.AM)
+            cur["pm"] = cur["pm"] or r.part in (AbsencePart.FULL, AbsencePart.PM)
+            cur["permitted"] = cur["permitted"] or r.is_permitted
+            cur["reason"] = cur["reason"] or (r.reason or "")
+        return self.render('admin/absence_roll_call.html', employees=employees,
+                           existing=existing, work_date=work_date.isoformat(),
+                           return_url=url_for('.index_view'))
+
+class TeamModelView(ModelView):
+    """Cây tổ/nhóm: đổi tổ cha = chuyển cả nhánh (bảng bao đóng cập nhật trong app/teams.py)."""
+    column_list = ['name', 'department', 'parent', 'manager']
+    column_labels = {'name': 'Tên tổ', 'department': 'Phòng', 'parent': 'Tổ cha', 'manager': 'Người phụ trách'}
+    column_searchable_list = ['name']
+    column_filters = ['department']
+    form_columns = ['name', 'department', 'parent', 'manager']
+    column_auto_select_related = False
+
+    def is_accessible(self):
+        return current_user.is_authenticated and current_user.role.value in ("ADMIN", "HR_GENERAL")
+
+    def inaccessible_callback(self, name, **kwargs):
+        abort(403)
+
+    def get_query(self):
+        return super().get_query().options(joinedload(Team.parent).load_only(Team.name),
+                                           joinedload(Team.department).load_only(Department.name),
+                                           joinedload(Team.manager).load_only(Employee.name))
+
+STATUS_BADGE = {"queued": "secondary", "running": "info", "done": "success",
+                "failed": "danger", "cancelled": "light"}
+
+class JobModelView(ModelView):
+    """Hàng đợi công việc nền (app/jobs.py): xem tiến độ, thử lại việc lỗi, hủy việc chưa chạy."""
+    list_template = 'admin/job_list.html'
+    can_create = False
+    can_edit = False
+    can_view_details = True
+    column_list = ['id', 'kind', 'status', 'progress', 'attempts', 'user', 'created_at', 'finished_at']
+    column_details_list = ['id', 'kind', 'status', 'payload', 'progress', 'progress_note', 'attempts',
+                           'max_attempts', 'run_after', 'worker', 'heartbeat_at', 'user',
+                           'created_at', 'started_at', 'finished_at', 'result', 'error']
+    column_labels = {
+        'kind': 'Loại việc', 'status': 'Trạng thái', 'progress': 'Tiến độ', 'attempts': 'Lần thử',
+        'user': 'Người tạo', 'created_at': 'Tạo lúc', 'finished_at': 'Xong lúc',
+        'payload': 'Tham số', 'progress_note': 'Ghi chú tiến độ', 'max_attempts': 'Số lần thử tối đa',
+        'run_after': 'Chạy từ', 'worker': 'Worker', 'heartbeat_at': 'Heartbeat',
+        'started_at': 'Bắt đầu', 'result': 'Kết quả', 'error': 'Lỗi',
+    }
+    column_default_sort = ('id', True)
+    column_sortable_list = ['id', 'kind', 'status', 'created_at', 'finished_at']
+    column_filters = [
+        FilterEqual(Job.status, 'Trạng thái', options=list(jobs.STATUS_LABELS.items())),
+        FilterEqual(Job.kind, 'Loại việc', options=lambda: [(k, k) for k in sorted(jobs.TASKS)]),
+    ]
+    column_formatters = {
+        'status': lambda v, c, m, p: Markup(
+            f'<span class="badge badge-{STATUS_BADGE.get(m.status, "secondary")}">'
+            f'{jobs.STATUS_LABELS.get(m.status, m.status)}</span>'),
+        'progress': lambda v, c, m, p: f"{m.progress * 100:.0f}%" + (f" — {m.progress_note}" if m.progress_note else ""),
+        'attempts': lambda v, c, m, p: f"{m.attempts}/{m.max_attempts}",
+        'user': lambda v, c, m, p: (m.user.username if m.user else ''),
+    }
+    column_details_formatters = {
+        'error': lambda v, c, m, p: Markup(f"<pre>{Markup.escape(m.error or '')}</pre>"),
+    }
+    column_auto_select_related = False
+
+    def is_accessible(self):
+        return current_user.is_authenticated and current_user.role.value == "ADMIN"
+
+    def inaccessible_callback(self, name, **kwargs):
+        abort(403)
+
+    def get_query(self):
+        return super().get_query().options(joinedload(Job.user))
+
+    def status_counts(self):
+        """Số việc theo trạng thái (hiện ở đầu trang danh sách)."""
+        rows = db.session.execute(select(Job.status, func.count()).group_by(Job.status)).all()
+        return {status: n for status, n in rows}
+
+    @action('retry', 'Chạy lại', 'Đưa lại hàng đợi các việc lỗi / đã hủy đã chọn?')
+    def action_retry(self, ids):
+        n = jobs.retry(int(i) for i in ids)
+        flash(f'Đã đưa lại hàng đợi {n} việc.', 'success')
+
+    @action('cancel', 'Hủy', 'Hủy các việc đang chờ đã chọn?')
+    def action_cancel(self, ids):
+        n = jobs.cancel(int(i) for i in ids)
+        flash(f'Đã hủy {n} việc (việc đang chạy không bị dừng).', 'success')
+
+    @expose('/import-employees/', methods=('GET', 'POST'))
+    def import_employees_view(self):
+        """Tải lên file Excel danh sách nhân viên; worker nền đọc và thêm vào CSDL."""
+        return_url = url_for('.index_view')
+        if request.method == 'POST':
+            upload = request.files.get('file')
+            if not upload or not upload.filename.lower().endswith('.xlsx'):
+                flash('Vui lòng chọn file .xlsx.', 'error')
+                return redirect(url_for('.import_employees_view'))
+            path = jobs.upload_path('.xlsx')
+            upload.save(path)
+            job = jobs.enqueue("employees.import", {"path": path}, created_by=current_user.id)
+            db.session.commit()
+            flash(f'Đã đưa việc import #{job.id} vào hàng đợi.', 'success')
+            return redirect(return_url)
+        return self.render('admin/job_import.html', return_url=return_url)
+
+class ProfilerView(BaseView):
+    """Bật profiler lấy mẫu (app/profiler.py) cho 1 route / 1 phần request trong N giây, tải flame graph."""
+    def is_accessible(self):
+        return current_user.is_authenticated and current_user.role.value == "ADMIN"
+
+    def inaccessible_callback(self, name, **kwargs):
+        abort(403)
+
+    @expose('/')
+    def index(self):
+        endpoints = sorted(e for e in current_app.view_functions
+                           if e != "static" and not e.startswith(("profiler.", "admin.")))
+        session = profiler.find(request.args.get('id', '')) or next(iter(profiler.history()), None)
+        return self.render('admin/profiler.html', endpoints=endpoints, current=profiler.current(),
+                           sessions=profiler.history(), session=session,
+                           routes=profiler.route_rows(session) if session else [],
+                           frames=profiler.top_frames(session) if session else [],
+                           max_seconds=current_app.config.get('PROFILER_MAX_SECONDS', 300))
+
+    @expose('/start/', methods=('POST',))
+    def start_view(self):
+        try:
+            rate = float(request.form.get('rate') or 100) / 100
+            seconds = int(request.form.get('seconds') or 30)
+        except ValueError:
+            flash('Tỉ lệ / số giây không hợp lệ.', 'error')
+            return redirect(url_for('.index'))
+        try:
+            session = profiler.start(current_app._get_current_object(), request.form.get('endpoint') or None,
+                                     rate, seconds, started_by=current_user.username)
+        except RuntimeError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('.index'))
+        flash(f'Đã bật profiler trong {session.seconds} giây.', 'success')
+        return redirect(url_for('.index', id=session.id))
+
+    @expose('/stop/', methods=('POST',))
+    def stop_view(self):
+        session = profiler.stop()
+        return redirect(url_for('.index', id=session.id if session else None))
+
+    @expose('/<session_id>/folded.txt')
+    def folded_view(self, session_id):
+        """Dữ liệu flame graph (folded) của 1 phiên, lọc theo ?route=<endpoint> nếu có."""
+        session = profiler.find(session_id)
+        if session is None:
+            abort(404)
+        endpoint = request.args.get('route') or None
+        name = f"profile-{session.id}" + (f"-{endpoint}" if endpoint else "") + ".folded.txt"
+        return Response(profiler.folded(session, endpoint), mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename="{name}"'})
+
 def init_admin(app):
     admin.init_app(app)
     admin.add_view(EmployeeModelView(Employee, db.session, name='Nhân viên', endpoint="employee"))
-    admin.add_view(UserModelView(User, db.session, name='Tài khoản', endpoint="user"))
\ No newline at end of file
+    admin.add_view(TeamModelView(Team, db.session, name='Tổ/nhóm', endpoint="team"))
+    admin.add_view(UserModelView(User, db.session, name='Tài khoản', endpoint="user"))
+    admin.add_view(AbsenceModelView(Absence, db.session, name='Chuyên cần', endpoint="absence"))
+    admin.add_view(JobModelView(Job, db.session, name='Việc nền', endpoint="job"))
+    admin.add_view(ProfilerView(name='Profiler', endpoint="profiler"))
\ No newline at end of file
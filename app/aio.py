@@ -0,0 +1,140 @@
+# app/aio.py
+# Stack đọc bất đồng bộ (ASGI) chạy song song với app Flask (WSGI) cho dashboard / tích hợp
+# hỏi dữ liệu liên tục: chờ CSDL bằng asyncio nên không giữ worker đồng bộ nào.
+#   uvicorn asgi:app --port 5001      (reverse proxy chuyển GET /api/v1/<resource> sang đây)
+# Phục vụ GET /api/v1/<resource> — cùng tham số, cùng JSON với app/api.py (dùng chung list_query)
+# trên cùng models, bằng AsyncSession của SQLAlchemy. Chỉ đọc: không flush, không commit.
+# Đăng nhập: đọc cookie session của Flask (cùng SECRET_KEY) -> cần cùng domain với app chính;
+# quyền đọc theo vai trò / phòng giống app/api.py (read_scope).
+# CSDL: ASYNC_DATABASE_URL, mặc định suy từ DATABASE_REPLICA_URL rồi DATABASE_URL:
+#   mysql+pymysql -> mysql+aiomysql, sqlite -> sqlite+aiosqlite (chạy thử / test)
+import os
+import traceback
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.datastructures import MultiDict
+from .api import RESOURCES, ApiError, list_query, read_scope, page_payload, dumps
+from .dbrouting import engine_options, DEFAULT_DATABASE_URL
+from .models import User, Employee
+
+PREFIX = "/api/v1/"
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url(url):
+    """URL đồng bộ -> URL driver async tương ứng (giữ nguyên nếu đã là driver async)."""
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if u.get_driver_name() in ("aiomysql", "aiosqlite", "asyncpg") or backend not in ASYNC_DRIVERS:
+        return u
+    return u.set(drivername=ASYNC_DRIVERS[backend])
+
+def _database_url():
+    return (os.environ.get('ASYNC_DATABASE_URL') or os.environ.get('DATABASE_REPLICA_URL')
+            or os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL))
+
+
+class AsyncReadApp:
+    """Ứng dụng ASGI chỉ đọc; engine tạo lúc lifespan startup (hoặc request đầu tiên)."""
+    def __init__(self, flask_app, url=None):
+        self.flask_app = flask_app
+        self.url = async_url(url or _database_url())
+        self.engine = None
+        self.sessionmaker = None
+        self._serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self._cookie_name = flask_app.config["SESSION_COOKIE_NAME"]
+        self._max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    def startup(self):
+        if self.engine is None:
+            options = engine_options(self.url, "async")
+            # TimedQueuePool là pool đồng bộ: engine async tự chọn AsyncAdaptedQueuePool
+            options.pop("poolclass", None)
+            self.engine = create_async_engine(self.url, **options)
+            self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def shutdown(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            status, payload = await self._handle(scope)
+            body = dumps(payload)
+            await send({"type": "http.response.start", "status": status,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body",
+                        "body": b"" if scope["method"] == "HEAD" else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.startup()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _user_id(self, scope):
+        """user id trong cookie session của Flask (Flask-Login lưu ở khóa _user_id)."""
+        cookie = SimpleCookie()
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                cookie.load(value.decode("latin-1"))
+        morsel = cookie.get(self._cookie_name)
+        if morsel is None:
+            return None
+        try:
+            data = self._serializer.loads(morsel.value, max_age=self._max_age)
+        except BadSignature:
+            return None
+        try:
+            return int(data.get("_user_id"))
+        except (TypeError, ValueError):
+            return None
+
+    async def _handle(self, scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            return 405, {"error": "Chỉ hỗ trợ GET"}
+        path = scope["path"]
+        resource = path[len(PREFIX):].strip("/") if path.startswith(PREFIX) else None
+        if resource not in RESOURCES:
+            return 404, {"error": f"Không có tài nguyên '{resource or path}'"}
+        self.startup()
+        args = MultiDict(parse_qsl(scope["query_string"].decode(), keep_blank_values=True))
+        try:
+            user_id = self._user_id(scope)
+            async with self.sessionmaker() as session:
+                user = None if user_id is None else (await session.execute(
+                    select(User.role, Employee.department_id)
+                    .outerjoin(Employee, Employee.id == User.employee_id)
+                    .where(User.id == user_id))).first()
+                if user is None:
+                    return 401, {"error": "Chưa đăng nhập"}
+                dept_scope = read_scope(resource, user.role, user.department_id)
+                stmt, fields, cols, limit = list_query(resource, args, dept_scope)
+                rows = (await session.execute(stmt)).all()
+            return 200, page_payload(rows, fields, cols, limit)
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        except Exception:
+            self.flask_app.logger.error("Lỗi stack async %s\n%s", path, traceback.format_exc())
+            return 500, {"error": "Lỗi máy chủ"}
+
+
+def create_asgi_app(flask_app=None, url=None):
+    """App ASGI đọc; flask_app cấp SECRET_KEY / cấu hình cookie (mặc định: create_app())."""
+    if flask_app is None:
+        from . import create_app
+        flask_app = create_app()
+    return AsyncReadApp(flask_app, url)
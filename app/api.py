@@ -0,0 +1,315 @@
+# app/api.py
+# API JSON (v1) cho dashboard nội bộ:
+#   /api/v1/<resource>?ids=1,2,3&fields=id,name&cursor=...&limit=100
+# Truy vấn chỉ lấy đúng các cột được chọn (row tuple, không dựng ORM object).
+# Ghi dữ liệu: POST /api/v1/absences/roll-call (điểm danh cả ngày).
+# Đồng bộ tăng dần: GET /api/v1/changes?since=<token>.
+# Các danh sách /api/v1/<resource> đọc từ replica nếu có cấu hình (xem app/dbrouting.py);
+# change feed luôn đọc CSDL chính để không lỡ thay đổi do replica trễ.
+import base64
+import json
+from datetime import date, datetime
+from functools import wraps
+from flask import Blueprint, request, current_app
+from flask_login import current_user
+from sqlalchemy import select, Enum as SAEnum
+from . import db, utils, changes, cache, dbrouting
+from .dbrouting import replica_ok
+from .models import Employee, Department, Absence, EmployeeHistory, TaskAssessment, SystemRole
+
+try:   # serializer nhanh nếu có cài, không thì dùng json chuẩn
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_IDS = 1000
+
+# Tài nguyên -> (model, {tên trường: cột}, cột lọc theo nhân viên, cột ngày để lọc from/to)
+RESOURCES = {
+    "employees": (Employee, {
+        "id": Employee.id, "name": Employee.name, "year_of_birth": Employee.year_of_birth,
+        "position": Employee.position, "email": Employee.email, "phone": Employee.phone,
+        "department_id": Employee.department_id, "org_role": Employee.org_role,
+    }, None, None),
+    "departments": (Department, {
+        "id": Department.id, "name": Department.name,
+    }, None, None),
+    "absences": (Absence, {
+        "id": Absence.id, "employee_id": Absence.employee_id, "work_date": Absence.work_date,
+        "part": Absence.part, "is_permitted": Absence.is_permitted, "reason": Absence.reason,
+    }, Absence.employee_id, Absence.work_date),
+    "histories": (EmployeeHistory, {
+        "id": EmployeeHistory.id, "employee_id": EmployeeHistory.employee_id,
+        "effective_from": EmployeeHistory.effective_from, "effective_to": EmployeeHistory.effective_to,
+        "is_current": EmployeeHistory.is_current, "department_id": EmployeeHistory.department_id,
+        "position": EmployeeHistory.position, "org_role": EmployeeHistory.org_role,
+        "change_type": EmployeeHistory.change_type, "reason": EmployeeHistory.reason,
+        "source": EmployeeHistory.source, "changed_by": EmployeeHistory.changed_by,
+        "created_at": EmployeeHistory.created_at,
+    }, EmployeeHistory.employee_id, EmployeeHistory.effective_from),
+    "assessments": (TaskAssessment, {
+        "id": TaskAssessment.id, "employee_id": TaskAssessment.employee_id,
+        "score": TaskAssessment.score, "assessment_date": TaskAssessment.assessment_date,
+        "assessment_content": TaskAssessment.assessment_content,
+        "assessor_id": TaskAssessment.assessor_id,
+    }, TaskAssessment.employee_id, TaskAssessment.assessment_date),
+}
+# Dữ liệu nhân sự: chỉ ADMIN / HR đọc được, HR phòng chỉ thấy nhân viên phòng mình (như trang admin).
+# employees / departments là danh bạ, mọi người đăng nhập đều xem được (như trang /employees).
+HR_RESOURCES = {"absences", "histories", "assessments"}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def _json_default(v):
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    raise TypeError(f"Không serialize được {type(v).__name__}")
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default)
+    return json.dumps(payload, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+def _json_response(payload, status=200):
+    return current_app.response_class(dumps(payload), status=status, mimetype="application/json")
+
+@api.errorhandler(ApiError)
+def _handle_api_error(e):
+    return _json_response({"error": e.message}, e.status)
+
+def api_login_required(f):
+    """Như login_required nhưng trả 401 JSON thay vì chuyển hướng sang trang đăng nhập."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return _json_response({"error": "Chưa đăng nhập"}, 401)
+        return f(*args, **kwargs)
+    return wrapper
+
+
+# --- Tham số truy vấn (args: MultiDict, vd. request.args) ---
+def _int_list(args, name):
+    raw = args.get(name)
+    if not raw:
+        return None
+    try:
+        values = [int(x) for x in raw.split(",") if x.strip()]
+    except ValueError:
+        raise ApiError(f"Tham số '{name}' phải là danh sách số nguyên, cách nhau bởi dấu phẩy")
+    if len(values) > MAX_IDS:
+        raise ApiError(f"Tối đa {MAX_IDS} giá trị cho '{name}'")
+    return values
+
+def _date_arg(args, name):
+    raw = args.get(name)
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise ApiError(f"Tham số '{name}' phải có dạng YYYY-MM-DD")
+
+def _fields(args, columns):
+    raw = args.get("fields")
+    if not raw:
+        return list(columns)
+    names = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in names if f not in columns]
+    if unknown:
+        raise ApiError(f"Trường không hợp lệ: {', '.join(unknown)}. Có thể chọn: {', '.join(columns)}")
+    return list(dict.fromkeys(names))
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError("Cursor không hợp lệ")
+
+
+def read_scope(name, role, department_id):
+    """
+    Phạm vi đọc tài nguyên `name` của người dùng có vai trò `role` (SystemRole) thuộc phòng
+    `department_id`: None = không giới hạn, số = chỉ nhân viên phòng đó; không được đọc -> ApiError 403.
+    """
+    if name not in HR_RESOURCES or role in (SystemRole.ADMIN, SystemRole.HR_GENERAL):
+        return None
+    if role == SystemRole.HR_DEPARTMENT and department_id:
+        return department_id
+    raise ApiError("Không có quyền xem dữ liệu này", 403)
+
+def list_query(name, args, department_id=None):
+    """
+    Câu SELECT cho 1 trang của tài nguyên -> (stmt, fields, cols, limit); dùng chung cho
+    route đồng bộ bên dưới và stack async (app/aio.py).
+    department_id: phạm vi từ read_scope() (chỉ lấy dòng của nhân viên phòng đó).
+    Phân trang theo khóa (id > cursor ORDER BY id) nên trang sau không chậm dần như OFFSET.
+    Luôn lấy thêm cột id để sinh cursor, kể cả khi không nằm trong fields.
+    """
+    model, columns, employee_col, date_col = RESOURCES[name]
+    fields = _fields(args, columns)
+    limit = min(max(args.get("limit", DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+
+    cols = [columns[f] for f in fields]
+    stmt = select(model.id, *cols).order_by(model.id).limit(limit + 1)
+
+    ids = _int_list(args, "ids")
+    if ids is not None:
+        stmt = stmt.where(model.id.in_(ids))
+    if employee_col is not None and department_id is not None:
+        stmt = stmt.where(employee_col.in_(select(Employee.id).where(Employee.department_id == department_id)))
+    if employee_col is not None:
+        employee_ids = _int_list(args, "employee_ids")
+        if employee_ids is not None:
+            stmt = stmt.where(employee_col.in_(employee_ids))
+    if date_col is not None:
+        start, end = _date_arg(args, "from"), _date_arg(args, "to")
+        if start:
+            stmt = stmt.where(date_col >= start)
+        if end:
+            stmt = stmt.where(date_col <= end)
+    if name == "employees":
+        department_id = args.get("department_id", type=int)
+        if department_id:
+            stmt = stmt.where(Employee.department_id == department_id)
+    cursor = args.get("cursor")
+    if cursor:
+        stmt = stmt.where(model.id > decode_cursor(cursor))
+    return stmt, fields, cols, limit
+
+def page_payload(rows, fields, cols, limit):
+    """limit + 1 dòng đã đọc -> {"data", "next_cursor"}."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "data": _to_dicts(fields, cols, rows),
+        "next_cursor": encode_cursor(rows[-1][0]) if has_more else None,
+    }
+
+def list_resource(name):
+    employee = current_user.employee
+    scope = read_scope(name, current_user.role, employee.department_id if employee else None)
+    stmt, fields, cols, limit = list_query(name, request.args, scope)
+    return page_payload(db.session.execute(stmt).all(), fields, cols, limit)
+
+def _to_dicts(fields, cols, rows):
+    """Row (id, *cols) -> dict theo fields. Enum -> tên (ổn định hơn nhãn tiếng Việt)."""
+    enum_pos = [i for i, c in enumerate(cols, start=1) if isinstance(c.type, SAEnum)]
+    if not enum_pos:
+        return [dict(zip(fields, r[1:])) for r in rows]
+    data = []
+    for r in rows:
+        r = list(r)
+        for i in enum_pos:
+            if r[i] is not None:
+                r[i] = r[i].name
+        data.append(dict(zip(fields, r[1:])))
+    return data
+
+
+@api.route('/changes', methods=['GET'])
+@api_login_required
+def change_feed():
+    """
+    Thay đổi sau token `since` (bỏ trống = từ đầu), gộp theo từng dòng:
+    {"changes": {resource: {"upserts": [dòng hiện tại...], "deletes": [id...]}},
+     "token": token mới, "has_more": còn nữa thì gọi tiếp ngay với token mới}
+    Dữ liệu toàn cơ quan -> chỉ ADMIN / HR toàn cơ quan (tài khoản tích hợp lương, căng tin dùng vai trò này).
+    """
+    if current_user.role not in (SystemRole.ADMIN, SystemRole.HR_GENERAL):
+        raise ApiError("Không có quyền đọc nhật ký thay đổi", 403)
+    since = request.args.get("since")
+    since_id = decode_cursor(since) if since else 0
+    limit = min(max(request.args.get("limit", MAX_LIMIT, type=int), 1), MAX_LIMIT)
+
+    collapsed, last_id, has_more = changes.read_changes(since_id, limit)
+
+    result = {}
+    for resource, ids in collapsed.items():
+        model, columns, _, _ = RESOURCES[resource]
+        fields, cols = list(columns), list(columns.values())
+        upserts, deletes = ids["upserts"], set(ids["deletes"])
+        data = []
+        if upserts:
+            rows = db.session.execute(select(model.id, *cols).where(model.id.in_(upserts))
+                                      .order_by(model.id)).all()
+            data = _to_dicts(fields, cols, rows)
+            # Đã bị xóa sau đó (dòng xóa nằm ở lô sau) -> báo xóa luôn
+            deletes |= upserts - {r[0] for r in rows}
+        result[resource] = {"upserts": data, "deletes": sorted(deletes)}
+
+    return _json_response({"changes": result, "token": encode_cursor(last_id), "has_more": has_more})
+
+
+@api.route('/cache/stats', methods=['GET'])
+@api_login_required
+def cache_stats():
+    """Số lần hit/miss/loại bỏ của cache (của process đang phục vụ request)."""
+    if not current_user.is_admin:
+        raise ApiError("Chỉ quản trị viên", 403)
+    return _json_response(cache.stats())
+
+
+@api.route('/db/pool-stats', methods=['GET'])
+@api_login_required
+def pool_stats():
+    """Trạng thái pool kết nối + thời gian chờ lấy connection (giây) của từng CSDL."""
+    if not current_user.is_admin:
+        raise ApiError("Chỉ quản trị viên", 403)
+    return _json_response(dbrouting.pool_stats(db))
+
+
+@api.route('/<resource>', methods=['GET'])
+@replica_ok
+@api_login_required
+def list_view(resource):
+    if resource not in RESOURCES:
+        raise ApiError(f"Không có tài nguyên '{resource}'", 404)
+    return _json_response(list_resource(resource))
+
+
+@api.route('/absences/roll-call', methods=['POST'])
+@api_login_required
+def roll_call():
+    """
+    Body JSON: {"work_date": "YYYY-MM-DD", "delete_missing": false,
+                "entries": [{"employee_id", "part", "is_permitted", "reason"}, ...]}
+    """
+    if not current_user.can_manage_hr:
+        raise ApiError("Không có quyền ghi điểm danh", 403)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("entries"), list):
+        raise ApiError("Body phải là JSON có danh sách 'entries'")
+    try:
+        work_date = date.fromisoformat(payload.get("work_date") or "")
+    except (TypeError, ValueError):
+        raise ApiError("'work_date' phải có dạng YYYY-MM-DD")
+
+    scope_ids = None
+    if current_user.is_hr_department:
+        # HR phòng chỉ điểm danh được nhân viên phòng mình
+        dep_id = current_user.employee.department_id if current_user.employee else None
+        if not dep_id:
+            raise ApiError("Không có quyền ghi điểm danh", 403)
+        scope_ids = set(db.session.scalars(select(Employee.id).where(Employee.department_id == dep_id)))
+
+    try:
+        summary = utils.apply_roll_call(work_date, payload["entries"],
+                                        delete_missing=bool(payload.get("delete_missing")),
+                                        scope_ids=scope_ids)
+    except ValueError as e:
+        raise ApiError(str(e))
+    except PermissionError as e:
+        raise ApiError(str(e), 403)
+    return _json_response({"work_date": work_date, **summary})
@@ -0,0 +1,227 @@
+# app/archive.py
+# Lưu trữ dữ liệu "lạnh": các năm đã đóng của absences / employee_history được chuyển
+# ra file nén theo cột (gzip JSON), bảng chính chỉ giữ năm hiện tại và năm trước.
+import gzip
+import json
+import os
+from datetime import date
+from functools import lru_cache
+from types import SimpleNamespace
+from flask import current_app
+from sqlalchemy import delete, text
+from . import db, kpi
+from .models import Absence, AbsencePart, EmployeeHistory, OrgRole, MonthlyKpi
+
+# Số năm giữ trong bảng chính (năm hiện tại + năm trước)
+HOT_YEARS = 2
+
+ABSENCE_COLUMNS = ["id", "employee_id", "work_date", "part", "is_permitted", "reason"]
+HISTORY_COLUMNS = ["id", "employee_id", "effective_from", "effective_to", "department_id",
+                   "position", "org_role", "change_type", "reason", "source", "changed_by", "created_at"]
+
+
+def archive_dir():
+    base = current_app.config.get('ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+    office = db.session.info.get("office")
+    # File lưu trữ của văn phòng khác (app/shards.py) nằm trong thư mục con theo mã văn phòng
+    return os.path.join(base, office) if office else base
+
+def archive_path(table: str, year: int):
+    return os.path.join(archive_dir(), f"{table}_{year}.json.gz")
+
+def first_hot_year():
+    return date.today().year - HOT_YEARS + 1
+
+def is_cold(year: int) -> bool:
+    return year < first_hot_year()
+
+def archived_years(table: str):
+    d = archive_dir()
+    if not os.path.isdir(d):
+        return []
+    prefix = f"{table}_"
+    return sorted(int(f[len(prefix):-len(".json.gz")]) for f in os.listdir(d)
+                  if f.startswith(prefix) and f.endswith(".json.gz"))
+
+
+# --- Định dạng file: {"table", "year", "columns": {tên_cột: [giá trị...]}} ---
+def _encode(v):
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    if hasattr(v, "name") and hasattr(v, "value"):   # Enum -> tên
+        return v.name
+    return v.isoformat()                              # date / datetime
+
+def _write_columnar(path, table, year, columns, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {"table": table, "year": year,
+            "columns": {c: [_encode(getattr(r, c)) for r in rows] for c in columns}}
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=9) as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)   # ghi xong mới thay file cũ
+    _read_columnar.cache_clear()
+
+@lru_cache(maxsize=8)
+def _read_columnar(path, mtime):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)["columns"]
+
+def _load(table, year):
+    path = archive_path(table, year)
+    if not os.path.exists(path):
+        return {}
+    return _read_columnar(path, os.path.getmtime(path))
+
+def _to_date(s):
+    return date.fromisoformat(s[:10]) if s else None
+
+
+# --- Đọc dữ liệu đã lưu trữ ---
+def archived_absences(employee_id: int, start_day: date, end_day: date):
+    """Các ngày nghỉ đã lưu trữ của 1 nhân viên trong khoảng ngày (cùng thuộc tính với Absence)."""
+    result = []
+    for year in range(start_day.year, end_day.year + 1):
+        cols = _load("absences", year)
+        if not cols:
+            continue
+        lo, hi = start_day.isoformat(), end_day.isoformat()
+        for i, emp in enumerate(cols["employee_id"]):
+            d = cols["work_date"][i]
+            if emp == employee_id and lo <= d <= hi:
+                result.append(SimpleNamespace(
+                    id=cols["id"][i], employee_id=emp, work_date=_to_date(d),
+                    part=AbsencePart[cols["part"][i]], is_permitted=cols["is_permitted"][i],
+                    reason=cols["reason"][i]))
+    result.sort(key=lambda a: a.work_date)
+    return result
+
+def archived_histories(employee_id: int):
+    """Các kỳ lịch sử đã lưu trữ của 1 nhân viên (mọi năm)."""
+    result = []
+    for year in archived_years("employee_history"):
+        cols = _load("employee_history", year)
+        for i, emp in enumerate(cols["employee_id"]):
+            if emp != employee_id:
+                continue
+            role = cols["org_role"][i]
+            result.append(SimpleNamespace(
+                id=cols["id"][i], employee_id=emp,
+                effective_from=_to_date(cols["effective_from"][i]),
+                effective_to=_to_date(cols["effective_to"][i]),
+                department_id=cols["department_id"][i], position=cols["position"][i],
+                org_role=OrgRole[role] if role else None, change_type=cols["change_type"][i],
+                reason=cols["reason"][i], source=cols["source"][i],
+                changed_by=cols["changed_by"][i], is_current=None))
+    return result
+
+
+# --- Chuyển dữ liệu ra file ---
+def _merge(table, year, columns, rows):
+    """Gộp với file đã có (chạy lại lệnh lưu trữ không làm mất/nhân đôi dữ liệu)."""
+    old = _load(table, year)
+    by_id = {}
+    if old:
+        for i in range(len(old["id"])):
+            by_id[old["id"][i]] = SimpleNamespace(**{c: old[c][i] for c in columns})
+    for r in rows:
+        by_id[r.id] = r
+    return [by_id[k] for k in sorted(by_id)]
+
+def _mysql_partitions(table):
+    conn = db.session.connection()
+    if conn.dialect.name != "mysql":
+        return set()
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND PARTITION_NAME IS NOT NULL"),
+        {"t": table})
+    return {r[0] for r in rows}
+
+def archive_year(year: int, force=False):
+    """
+    Chuyển absences + employee_history đã đóng của `year` ra file lưu trữ.
+    KPI các tháng của năm được chốt trước khi xóa dữ liệu nguồn; sau đó kpi không tính lại năm này nữa.
+    Trả về (số dòng nghỉ, số kỳ lịch sử) đã chuyển.
+    Trên MySQL đã phân vùng, bước bỏ partition chạy sau cùng và không rollback được (ALTER TABLE tự
+    commit): lịch sử đã xóa trong transaction trước đó vẫn giữ nguyên. Lỗi giữa chừng -> chạy lại
+    lệnh (file lưu trữ gộp theo id, không nhân đôi).
+    """
+    if not is_cold(year) and not force:
+        raise ValueError(f"Năm {year} vẫn đang nằm trong vùng dữ liệu nóng.")
+
+    # 1) Chốt KPI các tháng chưa chốt (sau khi lưu trữ không tính lại từ SQL được nữa)
+    frozen = {m for (m,) in db.session.query(MonthlyKpi.month)
+              .filter(MonthlyKpi.year == year, MonthlyKpi.is_frozen.is_(True)).distinct()}
+    for m in range(1, 13):
+        if m not in frozen:
+            kpi.close_month(year, m)
+
+    start_day, end_day = date(year, 1, 1), date(year, 12, 31)
+
+    # 2) Ghi file trước, xóa khỏi bảng sau
+    absences = (Absence.query.with_entities(*[getattr(Absence, c) for c in ABSENCE_COLUMNS])
+                .filter(Absence.work_date >= start_day, Absence.work_date <= end_day)
+                .order_by(Absence.id).all())
+    histories = (EmployeeHistory.query.with_entities(*[getattr(EmployeeHistory, c) for c in HISTORY_COLUMNS])
+                 .filter(EmployeeHistory.effective_to.isnot(None),
+                         EmployeeHistory.effective_to >= start_day,
+                         EmployeeHistory.effective_to <= end_day)
+                 .order_by(EmployeeHistory.id).all())
+
+    if absences:
+        _write_columnar(archive_path("absences", year), "absences", year, ABSENCE_COLUMNS,
+                        _merge("absences", year, ABSENCE_COLUMNS, absences))
+    if histories:
+        _write_columnar(archive_path("employee_history", year), "employee_history", year,
+                        HISTORY_COLUMNS, _merge("employee_history", year, HISTORY_COLUMNS, histories))
+
+    # Không ghi change_log: dữ liệu chỉ chuyển sang file lưu trữ, hệ thống đồng bộ không cần xóa theo.
+    # Bộ đếm ngày nghỉ theo phòng của năm này cũng giữ nguyên (reconcile bỏ qua năm đã lưu trữ).
+    partitioned = f"p{year}" in _mysql_partitions("absences")
+    try:
+        if not partitioned:
+            db.session.execute(delete(Absence).where(Absence.work_date >= start_day,
+                                                     Absence.work_date <= end_day),
+                               execution_options={"synchronize_session": False})
+        if histories:
+            db.session.execute(delete(EmployeeHistory)
+                               .where(EmployeeHistory.id.in_([h.id for h in histories])),
+                               execution_options={"synchronize_session": False})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if partitioned:
+        # MySQL đã phân vùng theo năm: bỏ cả partition thay vì DELETE từng dòng
+        _drop_partition(year, len(absences))
+    return len(absences), len(histories)
+
+def _drop_partition(year: int, expected: int):
+    """
+    Bỏ partition p<year> của absences khi nó còn đúng `expected` dòng đã ghi ra file.
+    Khóa bảng trong lúc đếm + bỏ để không mất dòng ghi sau lúc đọc; ALTER TABLE tự commit.
+    """
+    conn = db.session.connection()
+    conn.execute(text("LOCK TABLES absences WRITE"))
+    try:
+        n = conn.execute(text(f"SELECT COUNT(*) FROM absences PARTITION (p{year})")).scalar()
+        if n != expected:
+            raise RuntimeError(f"Năm {year} có {n} dòng nghỉ, đã lưu trữ {expected}: dữ liệu vừa thay đổi, "
+                               f"chạy lại lệnh lưu trữ.")
+        conn.execute(text(f"ALTER TABLE absences DROP PARTITION p{year}"))
+    finally:
+        conn.execute(text("UNLOCK TABLES"))
+        db.session.commit()
+
+def add_mysql_partition(year: int):
+    """Tách partition cho năm mới khỏi pmax (chạy trước khi sang năm)."""
+    parts = _mysql_partitions("absences")
+    if not parts or f"p{year}" in parts:
+        return False
+    db.session.execute(text(
+        f"ALTER TABLE absences REORGANIZE PARTITION pmax INTO ("
+        f"PARTITION p{year} VALUES LESS THAN ({year + 1}), "
+        f"PARTITION pmax VALUES LESS THAN MAXVALUE)"))
+    db.session.commit()
+    return True
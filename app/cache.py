@@ -0,0 +1,275 @@
+# app/cache.py
+# Cache dùng chung cho các hàm đọc: @memoize(tags=...) + xóa theo tag sau khi commit.
+#   CACHE_BACKEND = 'local'  -> LRU + TTL trong process (mặc định)
+#                 = 'redis'  -> dùng chung giữa các worker (cần gói redis + CACHE_REDIS_URL)
+#                 = 'redis-stub' -> cùng cách lưu như redis nhưng trong bộ nhớ (chạy thử / test)
+# Giá trị được pickle khi lưu, chỉ cache giá trị thường / read model (app/readmodels.py), không
+# cache đối tượng ORM: với backend 'local', xóa tag chỉ có hiệu lực ở process đã commit, bản ORM
+# cũ ở worker khác gắn lại vào session sẽ ghi đè dữ liệu mới khi commit.
+import functools
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from . import db
+from .models import Employee, Department, Absence, TaskAssessment, Team
+
+_MISSING = object()
+
+
+class LocalCache:
+    """LRU có giới hạn số khóa, mỗi khóa có TTL và danh sách tag."""
+    def __init__(self, maxsize=2048, default_ttl=60):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()      # key -> (bytes, hết hạn, tags)
+        self._tags = {}                 # tag -> set(key)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    self._remove(key)
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return pickle.loads(item[0])
+
+    def set(self, key, value, ttl=None, tags=()):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (blob, time.monotonic() + (ttl or self.default_ttl), tuple(tags))
+            for t in tags:
+                self._tags.setdefault(t, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, tags = self._data.pop(key)
+        for t in tags:
+            keys = self._tags.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[t]
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            for t in tags:
+                for key in list(self._tags.get(t, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self):
+        return {"backend": "local", "size": len(self._data), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class RedisCache:
+    """Lưu trên Redis (hoặc đối tượng cùng giao diện): mỗi tag là 1 set chứa các khóa."""
+    def __init__(self, client, default_ttl=60, prefix="qlcv:"):
+        self.client = client
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        blob = self.client.get(self.prefix + key)
+        if blob is None:
+            self.misses += 1
+            return _MISSING
+        self.hits += 1
+        return pickle.loads(blob)
+
+    def set(self, key, value, ttl=None, tags=()):
+        ttl = ttl or self.default_ttl
+        self.client.set(self.prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=ttl)
+        for t in tags:
+            tag_key = self.prefix + "tag:" + t
+            self.client.sadd(tag_key, self.prefix + key)
+            self.client.expire(tag_key, ttl)
+
+    def invalidate_tags(self, tags):
+        for t in tags:
+            tag_key = self.prefix + "tag:" + t
+            keys = self.client.smembers(tag_key)
+            if keys:
+                self.client.delete(*keys)
+            self.client.delete(tag_key)
+
+    def clear(self):
+        for key in self.client.keys(self.prefix + "*"):
+            self.client.delete(key)
+
+    def stats(self):
+        # Redis tự loại khóa theo maxmemory-policy, không đếm được ở phía app
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses, "evictions": None}
+
+
+class LocalRedisStub:
+    """Phần nhỏ của API redis mà RedisCache dùng, lưu trong bộ nhớ (thay Redis khi test)."""
+    def __init__(self):
+        self._kv = {}       # key -> (value, hết hạn)
+        self._sets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._kv.get(key)
+            if item is None or (item[1] and item[1] < time.monotonic()):
+                self._kv.pop(key, None)
+                return None
+            return item[0]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._kv[key] = (value, time.monotonic() + ex if ex else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            for k in keys:
+                self._kv.pop(k, None)
+                self._sets.pop(k, None)
+
+    def sadd(self, key, *members):
+        with self._lock:
+            self._sets.setdefault(key, set()).update(members)
+
+    def smembers(self, key):
+        with self._lock:
+            return set(self._sets.get(key, ()))
+
+    def expire(self, key, seconds):
+        pass   # set tag chỉ là chỉ mục, khóa thật vẫn có TTL riêng
+
+    def keys(self, pattern):
+        prefix = pattern.rstrip("*")
+        with self._lock:
+            return [k for k in list(self._kv) + list(self._sets) if k.startswith(prefix)]
+
+
+_backend = LocalCache()
+
+def init_cache(app):
+    global _backend
+    kind = app.config.get('CACHE_BACKEND', 'local')
+    ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+    if kind == 'redis':
+        import redis   # chỉ cần khi cấu hình dùng Redis
+        _backend = RedisCache(redis.Redis.from_url(app.config['CACHE_REDIS_URL']), ttl)
+    elif kind == 'redis-stub':
+        _backend = RedisCache(LocalRedisStub(), ttl)
+    else:
+        _backend = LocalCache(app.config.get('CACHE_MAXSIZE', 2048), ttl)
+
+def backend():
+    return _backend
+
+def stats():
+    return _backend.stats()
+
+def invalidate_tags(*tags):
+    _backend.invalidate_tags(tags)
+
+
+def memoize(tags=None, ttl=None, key=None):
+    """
+    Cache kết quả hàm theo tham số.
+    tags: hàm nhận cùng tham số -> list tag (vd. ["employee:5"]); xóa tag là xóa mọi kết quả gắn tag đó.
+    key:  hàm nhận cùng tham số -> phần khóa (mặc định: toàn bộ tham số); dùng để bỏ qua tham số session.
+    Kết quả không được là đối tượng ORM (TypeError) — dùng tuple / read model.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            part = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            office = db.session.info.get("office")   # đang đọc CSDL văn phòng khác (app/shards.py)
+            cache_key = f"{name}@{office}:{part!r}" if office else f"{name}:{part!r}"
+            value = _backend.get(cache_key)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                if _is_orm(value):
+                    raise TypeError(f"{name}: không cache đối tượng ORM, trả về read model")
+                _backend.set(cache_key, value, _fill_ttl(ttl), tags(*args, **kwargs) if tags else ())
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def _fill_ttl(ttl):
+    """Kết quả đọc từ replica (có thể trễ) chỉ giữ trong khoảng REPLICA_STICKY_SECONDS."""
+    if not db.session.info.get("use_replica"):
+        return ttl
+    return min(ttl or _backend.default_ttl, current_app.config.get('REPLICA_STICKY_SECONDS', 10))
+
+def _is_orm(value):
+    if isinstance(value, (list, tuple)):
+        return any(isinstance(v, db.Model) for v in value)
+    return isinstance(value, db.Model)
+
+
+# --- Xóa tag theo commit ---
+def tag_on_commit(session, *tags):
+    """Ghi nhận tag cần xóa khi transaction commit (dùng cho các câu lệnh bulk không qua flush)."""
+    session.info.setdefault("cache_tags", set()).update(tags)
+
+def month_tag(employee_id, d):
+    return f"absences:{employee_id}:{d.year:04d}-{d.month:02d}"
+
+def _old(obj, attr):
+    h = get_history(obj, attr)
+    return h.deleted[0] if h.deleted else None
+
+def _tags_for(obj):
+    if isinstance(obj, Employee):
+        return {"employees", f"employee:{obj.id}", f"dept:{obj.department_id}",
+                f"dept:{_old(obj, 'department_id')}"}
+    if isinstance(obj, Department):
+        return {"departments", f"dept:{obj.id}"}
+    if isinstance(obj, Absence):
+        tags = {month_tag(obj.employee_id, obj.work_date)} if obj.work_date else set()
+        old_date, old_emp = _old(obj, "work_date"), _old(obj, "employee_id")
+        if old_date or old_emp:
+            tags.add(month_tag(old_emp or obj.employee_id, old_date or obj.work_date))
+        return tags
+    if isinstance(obj, TaskAssessment):
+        return {"assessments"}
+    if isinstance(obj, Team):
+        return {"teams"}
+    return set()
+
+@event.listens_for(Session, "after_flush")
+def _collect_tags(session, flush_context):
+    tags = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tags |= _tags_for(obj)
+    if tags:
+        session.info.setdefault("cache_tags", set()).update(tags)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    tags = session.info.pop("cache_tags", None)
+    if tags:
+        _backend.invalidate_tags(tags)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tags(session):
+    session.info.pop("cache_tags", None)
@@ -0,0 +1,97 @@
+# app/changes.py
+# Nhật ký thay đổi (change_log) để hệ thống khác (lương, căng tin...) đồng bộ theo token:
+# mỗi lần flush ghi lại (bảng, id, I/U/D); client gọi /api/v1/changes?since=<token>.
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, insert, select, delete, func
+from sqlalchemy.orm import Session
+from . import db
+from .models import Employee, Absence, EmployeeHistory, TaskAssessment, ChangeLog
+
+# Model -> tên tài nguyên (trùng với tên trong API)
+RESOURCE_OF = {
+    Employee: "employees",
+    Absence: "absences",
+    EmployeeHistory: "histories",
+    TaskAssessment: "assessments",
+}
+
+
+def record_changes(conn, resource: str, ids, op: str):
+    """
+    Ghi nhật ký cho các câu lệnh bulk (Core) không đi qua flush của ORM.
+    conn: Connection hoặc Session đang trong transaction ghi dữ liệu.
+    """
+    now = datetime.now()
+    rows = [{"resource": resource, "row_id": i, "op": op, "changed_at": now} for i in ids]
+    if rows:
+        conn.execute(insert(ChangeLog.__table__), rows)
+
+@event.listens_for(Session, "after_flush")
+def _log_flush(session, flush_context):
+    now = datetime.now()
+    rows = []
+    for objs, op in ((session.new, "I"), (session.dirty, "U"), (session.deleted, "D")):
+        for obj in objs:
+            resource = RESOURCE_OF.get(type(obj))
+            if resource is None:
+                continue
+            if op == "U" and not session.is_modified(obj, include_collections=False):
+                continue
+            rows.append({"resource": resource, "row_id": obj.id, "op": op, "changed_at": now})
+    if rows:
+        session.connection().execute(insert(ChangeLog.__table__), rows)
+
+
+def read_changes(since: int, limit: int):
+    """
+    Đọc tối đa `limit` dòng nhật ký sau token `since`, gộp theo (tài nguyên, id) lấy thao tác cuối.
+    Trả về ({resource: {"upserts": set(id), "deletes": set(id)}}, token mới, còn nữa không).
+    Bỏ qua các dòng mới ghi trong vài giây gần nhất: transaction cấp id nhỏ hơn có thể
+    commit sau transaction cấp id lớn hơn, đợi một chút để client không bỏ sót.
+    """
+    lag = current_app.config.get('CHANGE_FEED_LAG_SECONDS', 5)
+    rows = db.session.execute(
+        select(ChangeLog.id, ChangeLog.resource, ChangeLog.row_id, ChangeLog.op)
+        .where(ChangeLog.id > since,
+               ChangeLog.changed_at <= datetime.now() - timedelta(seconds=lag))
+        .order_by(ChangeLog.id)
+        .limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for r in rows:
+        latest[(r.resource, r.row_id)] = r.op
+    result = {}
+    for (resource, row_id), op in latest.items():
+        bucket = result.setdefault(resource, {"upserts": set(), "deletes": set()})
+        bucket["deletes" if op == "D" else "upserts"].add(row_id)
+    return result, (rows[-1].id if rows else since), has_more
+
+
+def compact(older_than_days=None):
+    """
+    Gộp phần nhật ký cũ: chỉ giữ dòng mới nhất của mỗi (tài nguyên, id).
+    Client giữ token cũ vẫn đồng bộ đúng (vẫn thấy trạng thái cuối của từng dòng),
+    còn kích thước nhật ký phần cũ chỉ còn tỉ lệ với số dòng dữ liệu.
+    Quét cả bảng -> chạy theo lịch (cron: flask changes compact, hoặc việc nền "changes.compact"),
+    không chạy trong request.
+    """
+    days = older_than_days if older_than_days is not None else \
+        current_app.config.get('CHANGE_LOG_COMPACT_DAYS', 7)
+    cutoff = datetime.now() - timedelta(days=days)
+    # Bọc thêm 1 lớp subquery để MySQL cho phép DELETE tham chiếu chính bảng đó
+    keep = (select(func.max(ChangeLog.id).label("id"))
+            .group_by(ChangeLog.resource, ChangeLog.row_id)
+            .subquery())
+    try:
+        result = db.session.execute(
+            delete(ChangeLog).where(ChangeLog.changed_at < cutoff,
+                                    ChangeLog.id.not_in(select(keep.c.id))),
+            execution_options={"synchronize_session": False})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result.rowcount
@@ -0,0 +1,282 @@
+# app/commands.py
+# Lệnh CLI chạy theo lịch (cron) hoặc thủ công: flask kpi close --month 09-2025
+import click
+import json
+from flask.cli import AppGroup, with_appcontext
+from datetime import date
+from sqlalchemy import func, select
+from . import db, utils, kpi, history, archive, reports, changes, counters, plans, dbrouting, startup, jobs, shards, teams
+from .models import Absence, Job
+
+kpi_cli = AppGroup('kpi', help='KPI tổng hợp hàng tháng (chuyên cần + đánh giá).')
+
+def _parse_month_or_previous(month_str):
+    """'mm-yyyy' -> (year, month); bỏ trống -> tháng trước (dùng khi chạy đầu tháng)."""
+    if month_str:
+        return utils.parse_month(month_str)
+    today = date.today()
+    return (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
+
+@kpi_cli.command('compute')
+@click.option('--month', help="Tháng dạng mm-yyyy (mặc định: tháng trước).")
+@click.option('--force', is_flag=True, help="Tính lại cả tháng đã chốt (vẫn giữ trạng thái chốt).")
+def compute_cmd(month, force):
+    """Tính KPI tháng cho toàn cơ quan (chưa chốt)."""
+    y, m = _parse_month_or_previous(month)
+    try:
+        n = kpi.compute_monthly_kpi(y, m, force=force)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Đã tính KPI {m:02d}/{y} cho {n} nhân viên.")
+
+@kpi_cli.command('close')
+@click.option('--month', help="Tháng dạng mm-yyyy (mặc định: tháng trước).")
+def close_cmd(month):
+    """Chốt KPI tháng: tính cho toàn cơ quan và khóa kết quả."""
+    y, m = _parse_month_or_previous(month)
+    n = kpi.close_month(y, m)
+    click.echo(f"Đã chốt KPI {m:02d}/{y} cho {n} nhân viên.")
+    created = reports.generate_month_reports(y, m)
+    click.echo(f"Đã sinh {created} báo cáo Phụ lục 4.")
+
+@kpi_cli.command('refresh')
+def refresh_cmd():
+    """Tính lại KPI cho các nhân viên có nghỉ/đánh giá thay đổi sau khi đã tính."""
+    n = kpi.refresh_dirty_kpis()
+    click.echo(f"Đã tính lại {n} dòng KPI.")
+
+history_cli = AppGroup('history', help='Lịch sử nhân sự (employee_history).')
+
+@history_cli.command('check')
+@click.option('--fix', is_flag=True, help="Sửa các kỳ chồng lấn/chưa đóng.")
+def history_check_cmd(fix):
+    """Kiểm tra tính nhất quán các kỳ hiệu lực (chạy định kỳ bằng cron)."""
+    problems = history.check_history(fix=fix)
+    for emp_id, hist_id, msg in problems:
+        click.echo(f"NV {emp_id} / kỳ {hist_id}: {msg}")
+    status = "đã sửa" if fix else "phát hiện"
+    click.echo(f"Tổng cộng {status} {len(problems)} lỗi.")
+
+archive_cli = AppGroup('archive', help='Lưu trữ dữ liệu các năm đã đóng.')
+
+@archive_cli.command('run')
+@click.option('--year', type=int, help="Năm cần lưu trữ (mặc định: mọi năm ngoài vùng nóng).")
+@click.option('--force', is_flag=True, help="Cho phép lưu trữ cả năm còn trong vùng nóng.")
+def archive_run_cmd(year, force):
+    """Chuyển absences / employee_history của năm đã đóng ra file nén."""
+    if year:
+        years = [year]
+    else:
+        oldest = db.session.query(func.min(Absence.work_date)).scalar()
+        years = list(range(oldest.year, archive.first_hot_year())) if oldest else []
+    for y in years:
+        try:
+            n_abs, n_hist = archive.archive_year(y, force=force)
+        except (ValueError, RuntimeError) as e:
+            raise click.ClickException(str(e))
+        click.echo(f"{y}: đã lưu trữ {n_abs} ngày nghỉ, {n_hist} kỳ lịch sử.")
+
+@archive_cli.command('list')
+def archive_list_cmd():
+    """Liệt kê các năm đã lưu trữ."""
+    for table in ("absences", "employee_history"):
+        years = archive.archived_years(table)
+        click.echo(f"{table}: {', '.join(map(str, years)) or '-'}")
+
+@archive_cli.command('add-partition')
+@click.option('--year', type=int, help="Năm cần thêm partition (mặc định: năm sau).")
+def archive_add_partition_cmd(year):
+    """(MySQL) Thêm partition theo năm cho bảng absences."""
+    year = year or date.today().year + 1
+    if archive.add_mysql_partition(year):
+        click.echo(f"Đã thêm partition p{year}.")
+    else:
+        click.echo(f"Partition p{year} đã có hoặc CSDL không phân vùng.")
+
+report_cli = AppGroup('report', help='Báo cáo Phụ lục 4 hàng tháng.')
+
+@report_cli.command('generate')
+@click.option('--month', help="Tháng dạng mm-yyyy (mặc định: tháng trước).")
+@click.option('--department', type=int, help="Chỉ sinh cho 1 phòng (mặc định: toàn cơ quan + từng phòng).")
+@click.option('--force', is_flag=True, help="Sinh lại kể cả khi dữ liệu chưa đổi.")
+def report_generate_cmd(month, department, force):
+    """Sinh báo cáo tháng (bỏ qua các bản đã cập nhật)."""
+    y, m = _parse_month_or_previous(month)
+    if department:
+        path, created = reports.generate_report(y, m, department, force)
+        click.echo(f"{'Đã sinh' if created else 'Không đổi'}: {path}")
+    else:
+        created = reports.generate_month_reports(y, m, force)
+        click.echo(f"Đã sinh {created} báo cáo {m:02d}/{y}.")
+
+changes_cli = AppGroup('changes', help='Nhật ký thay đổi (change feed).')
+
+@changes_cli.command('compact')
+@click.option('--days', type=int, help="Gộp nhật ký cũ hơn số ngày này (mặc định: CHANGE_LOG_COMPACT_DAYS).")
+def changes_compact_cmd(days):
+    """Chỉ giữ thay đổi mới nhất của mỗi dòng trong phần nhật ký cũ."""
+    n = changes.compact(days)
+    click.echo(f"Đã gộp, xóa {n} dòng nhật ký.")
+
+counters_cli = AppGroup('counters', help='Bộ đếm sĩ số / ngày nghỉ theo phòng.')
+
+@counters_cli.command('reconcile')
+def counters_reconcile_cmd():
+    """Đối chiếu bộ đếm với dữ liệu gốc và sửa sai lệch (chạy định kỳ bằng cron)."""
+    n = counters.reconcile()
+    click.echo(f"Đã sửa {n} dòng bộ đếm.")
+
+teams_cli = AppGroup('teams', help='Cây tổ/nhóm (teams + bảng bao đóng team_closure).')
+
+@teams_cli.command('rebuild')
+def teams_rebuild_cmd():
+    """Dựng lại bảng bao đóng từ parent_id (sau khi sửa dữ liệu trực tiếp trong CSDL)."""
+    n = teams.rebuild_closure()
+    click.echo(f"Đã dựng lại {n} dòng team_closure.")
+
+plans_cli = AppGroup('plans', help='Kiểm tra kế hoạch truy vấn (EXPLAIN) của các trang chính.')
+
+@plans_cli.command('check')
+def plans_check_cmd():
+    """EXPLAIN các truy vấn nóng; thoát mã 1 nếu có câu quét toàn bảng / filesort."""
+    failed = plans.check(echo=click.echo)
+    if failed:
+        raise SystemExit(1)
+
+replica_cli = AppGroup('replica', help='CSDL bản sao chỉ đọc (DATABASE_REPLICA_URL).')
+
+@replica_cli.command('sync')
+def replica_sync_cmd():
+    """Chép CSDL chính sang replica — chỉ dùng khi chạy thử với 2 file SQLite."""
+    dbrouting.sync_sqlite_replica(db)
+    click.echo("Đã chép CSDL chính sang replica.")
+
+offices_cli = AppGroup('offices', help='Các văn phòng (OFFICE_CODE / OFFICE_DATABASES).')
+
+@offices_cli.command('list')
+def offices_list_cmd():
+    """Các văn phòng đã cấu hình và sĩ số (kiểm tra kết nối từng shard)."""
+    results, errors = shards.fan_out(counters.headcount)
+    for code in shards.offices():
+        url = shards.engine_for(code).url.render_as_string(hide_password=True)
+        status = f"{results[code]} người" if code in results else f"LỖI: {errors[code]}"
+        click.echo(f"{code:<10} {status:<20} {url}")
+    if errors:
+        raise SystemExit(1)
+
+@offices_cli.command('create-schema')
+def offices_create_schema_cmd():
+    """Tạo bảng trên CSDL các văn phòng khác — chỉ dùng khi chạy thử với các file SQLite."""
+    for code in shards.offices()[1:]:
+        engine = shards.engine_for(code)
+        if engine.dialect.name != "sqlite":
+            raise click.ClickException(f"{code}: chỉ hỗ trợ SQLite; CSDL thật dùng "
+                                       f"DATABASE_URL=<url văn phòng> flask db upgrade.")
+        db.metadata.create_all(engine)
+        click.echo(f"{code}: đã tạo bảng.")
+
+@offices_cli.command('summary')
+@click.option('--month', help="Tháng dạng mm-yyyy (mặc định: tháng hiện tại).")
+def offices_summary_cmd(month):
+    """Sĩ số + KPI tháng của từng văn phòng và toàn hệ thống."""
+    y, m = utils.parse_month(month)
+    rows, total, errors = shards.org_summary(y, m)
+
+    def fmt(value):
+        return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+    click.echo(f"{'Văn phòng':<12} {'Sĩ số':>6} {'Nghỉ':>8} {'KPI TB':>8} {'TH TB':>8}")
+    for code, t in rows + [("Tổng", total)]:
+        if t is None:
+            click.echo(f"{code:<12} LỖI: {errors[code]}")
+            continue
+        click.echo(f"{code:<12} {t.headcount:>6} {t.days_off:>8g} {fmt(t.avg_attendance)} {fmt(t.avg_composite)}")
+    if errors:
+        raise SystemExit(1)
+
+@click.command('worker')
+@click.option('--processes', type=int, help="Số process chạy việc song song (mặc định: JOBS_WORKERS; 0 = chạy tuần tự).")
+@click.option('--poll', type=float, help="Số giây giữa 2 lần hỏi hàng đợi (mặc định: JOBS_POLL_SECONDS).")
+@click.option('--once', is_flag=True, help="Chạy hết các việc đang đến hạn rồi thoát (dùng với cron).")
+@with_appcontext
+def worker_cmd(processes, poll, once):
+    """Chạy các việc nền trong bảng jobs."""
+    jobs.run_worker(processes=processes, poll=poll, once=once, echo=click.echo)
+
+jobs_cli = AppGroup('jobs', help='Hàng đợi công việc nền (chạy bằng flask worker).')
+
+@jobs_cli.command('enqueue')
+@click.argument('kind')
+@click.option('--payload', default='{}', help='Tham số dạng JSON, vd. \'{"year": 2025, "month": 9}\'.')
+def jobs_enqueue_cmd(kind, payload):
+    """Thêm 1 việc vào hàng đợi."""
+    try:
+        job = jobs.enqueue(kind, json.loads(payload))
+    except (ValueError, TypeError) as e:
+        raise click.BadParameter(str(e))
+    db.session.commit()
+    click.echo(f"Đã thêm việc #{job.id} ({kind}).")
+
+@jobs_cli.command('list')
+@click.option('--status', type=click.Choice(sorted(jobs.STATUS_LABELS)), help="Chỉ liệt kê trạng thái này.")
+@click.option('--limit', type=int, default=20, show_default=True)
+def jobs_list_cmd(status, limit):
+    """Các việc gần nhất."""
+    q = select(Job).order_by(Job.id.desc()).limit(limit)
+    if status:
+        q = q.where(Job.status == status)
+    for job in db.session.scalars(q):
+        note = f" — {job.progress_note}" if job.progress_note else ""
+        click.echo(f"#{job.id:<6} {job.kind:<20} {job.status:<10} {job.progress * 100:3.0f}% "
+                   f"lần {job.attempts}/{job.max_attempts}{note}")
+
+@jobs_cli.command('tasks')
+def jobs_tasks_cmd():
+    """Các loại việc đã đăng ký."""
+    for name in sorted(jobs.TASKS):
+        click.echo(name)
+
+@click.command('startup-profile')
+@click.option('--runs', type=int, default=3, show_default=True, help="Số lần khởi động để lấy trung bình.")
+@click.option('--top', type=int, default=15, show_default=True, help="Số gói import tốn thời gian nhất cần in.")
+@click.option('--save-baseline', is_flag=True, help="Ghi kết quả làm mốc vào benchmarks/baseline.json.")
+@click.option('--max-regression', type=float, default=0.2, show_default=True,
+              help="Thoát mã 1 nếu tổng thời gian vượt mốc quá tỉ lệ này.")
+def startup_profile_cmd(runs, top, save_baseline, max_regression):
+    """Đo thời gian khởi động: import theo gói + từng bước trong create_app."""
+    result = startup.profile(runs=runs)
+    click.echo(f"Khởi động: {result['total_s'] * 1000:.0f} ms (import {result['import_s'] * 1000:.0f} ms, "
+               f"create_app {result['create_app_s'] * 1000:.0f} ms) — trung bình {runs} lần")
+    click.echo("Import theo gói (self time):")
+    for name, sec in sorted(result["packages"].items(), key=lambda kv: -kv[1])[:top]:
+        click.echo(f"  {name:<24} {sec * 1000:8.1f} ms")
+    click.echo("create_app theo bước:")
+    for name, sec in result["steps"].items():
+        click.echo(f"  {name:<24} {sec * 1000:8.1f} ms")
+
+    summary = {k: round(result[k], 4) for k in ("total_s", "import_s", "create_app_s")}
+    if save_baseline:
+        startup.save_baseline("startup", summary)
+        click.echo(f"Đã ghi mốc vào {startup.BASELINE_PATH}.")
+        return
+    base = startup.load_baseline().get("startup")
+    if base:
+        ratio = result["total_s"] / base["total_s"] - 1
+        click.echo(f"So với mốc {base['total_s'] * 1000:.0f} ms: {ratio:+.0%}")
+        if ratio > max_regression:
+            raise SystemExit(1)
+
+def init_commands(app):
+    app.cli.add_command(kpi_cli)
+    app.cli.add_command(history_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(report_cli)
+    app.cli.add_command(changes_cli)
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(teams_cli)
+    app.cli.add_command(plans_cli)
+    app.cli.add_command(replica_cli)
+    app.cli.add_command(offices_cli)
+    app.cli.add_command(startup_profile_cmd)
+    app.cli.add_command(worker_cmd)
+    app.cli.add_command(jobs_cli)
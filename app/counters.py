@@ -0,0 +1,280 @@
+# app/counters.py
+# Bộ đếm phi chuẩn hóa theo phòng (bảng department_counters), đọc thay cho COUNT(*):
+#   - sĩ số theo OrgRole:             (phòng, 'MEMBER' | 'TEAM_LEAD' | 'DEPT_HEAD', '')
+#   - ngày nghỉ theo tháng:           (phòng, 'permitted' | 'unpermitted', 'yyyy-mm')
+# Cập nhật trong cùng transaction với thao tác ghi (before_flush lấy giá trị cũ, after_flush
+# cộng/trừ bằng upsert nguyên tử); các câu lệnh bulk gọi rebuild_periods(); reconcile() chạy
+# định kỳ (flask counters reconcile) để sửa sai lệch nếu có.
+# Ngày nghỉ của các năm đã lưu trữ (archive) không còn trong bảng absences nên được giữ nguyên.
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import event, select, delete, insert, func, extract, tuple_, and_, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from . import db, archive
+from .cache import memoize, tag_on_commit
+from .models import (Employee, Department, Absence, AbsencePart, OrgRole,
+                     DepartmentCounter)
+
+T = DepartmentCounter.__table__
+NO_DEPARTMENT = 0
+ABSENCE_METRICS = ("permitted", "unpermitted")
+
+
+def period_of(d):
+    return f"{d.year:04d}-{d.month:02d}"
+
+def _day_value(part):
+    return 1.0 if part == AbsencePart.FULL else 0.5
+
+def _dept(department_id):
+    return department_id or NO_DEPARTMENT
+
+
+# --- Đọc (đều được cache, tag "counters" bị xóa khi bộ đếm đổi) ---
+@memoize(tags=lambda: ["counters"])
+def headcounts():
+    """{department_id (0 = chưa phân tổ): {tên OrgRole: số người}}."""
+    out = defaultdict(dict)
+    rows = db.session.execute(select(T.c.department_id, T.c.metric, T.c.value)
+                              .where(T.c.period == "")).all()
+    for dep_id, metric, value in rows:
+        out[dep_id][metric] = int(value)
+    return dict(out)
+
+def headcount(department_id=None, role=None):
+    """Sĩ số toàn cơ quan / 1 phòng, có thể lọc theo OrgRole — không truy vấn bảng employees."""
+    counts = headcounts()
+    depts = [department_id] if department_id else counts.keys()
+    roles = [role.name] if role else [r.name for r in OrgRole]
+    return sum(counts.get(d, {}).get(r, 0) for d in depts for r in roles)
+
+@memoize(tags=lambda year, month: ["counters"])
+def absence_totals(year, month):
+    """{department_id: {"permitted", "unpermitted", "total"}} (đơn vị ngày) của tháng."""
+    out = {}
+    rows = db.session.execute(select(T.c.department_id, T.c.metric, T.c.value)
+                              .where(T.c.period == f"{year:04d}-{month:02d}")).all()
+    for dep_id, metric, value in rows:
+        out.setdefault(dep_id, {"permitted": 0.0, "unpermitted": 0.0, "total": 0.0})
+        out[dep_id][metric] = value
+        out[dep_id]["total"] += value
+    return out
+
+@memoize(tags=lambda: ["departments"])
+def _departments():
+    return db.session.execute(select(Department.id, Department.name).order_by(Department.name)).all()
+
+def department_options():
+    """[(id, tên, sĩ số)] cho dropdown lọc phòng ban (1 truy vấn nhỏ, thường lấy từ cache)."""
+    return [(dep_id, name, headcount(dep_id)) for dep_id, name in _departments()]
+
+
+# --- Ghi ---
+def _upsert_add(conn, deltas):
+    """Cộng dồn {(phòng, metric, period): giá trị} bằng 1 câu upsert (executemany)."""
+    rows = [{"department_id": d, "metric": m, "period": p, "value": v}
+            for (d, m, p), v in deltas.items() if v]
+    if not rows:
+        return
+    if conn.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(T)
+        stmt = stmt.on_duplicate_key_update(value=T.c.value + stmt.inserted.value)
+    else:
+        if conn.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(T)
+        stmt = stmt.on_conflict_do_update(index_elements=[T.c.department_id, T.c.metric, T.c.period],
+                                          set_={"value": T.c.value + stmt.excluded.value})
+    conn.execute(stmt, rows)
+
+def _absence_truth(conn, where):
+    """Tổng ngày nghỉ tính lại từ bảng absences: {(phòng, metric, period): giá trị}."""
+    rows = conn.execute(
+        select(Employee.department_id,
+               extract("year", Absence.work_date), extract("month", Absence.work_date),
+               Absence.part, Absence.is_permitted, func.count())
+        .join(Employee, Employee.id == Absence.employee_id)
+        .where(*where)
+        .group_by(Employee.department_id,
+                  extract("year", Absence.work_date), extract("month", Absence.work_date),
+                  Absence.part, Absence.is_permitted)).all()
+    truth = defaultdict(float)
+    for dep_id, y, m, part, permitted, n in rows:
+        key = (_dept(dep_id), ABSENCE_METRICS[0 if permitted else 1], f"{int(y):04d}-{int(m):02d}")
+        truth[key] += n * _day_value(part)
+    return truth
+
+def _month_ranges(periods):
+    """Các tháng (year, month) -> khoảng [ngày đầu, ngày đầu tháng kế) (tháng liền nhau gộp lại)."""
+    ranges = []
+    for y, m in sorted(periods):
+        start = date(y, m, 1)
+        end = date(y + m // 12, m % 12 + 1, 1)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+def rebuild_periods(session, months):
+    """
+    Tính lại ngày nghỉ các tháng (year, month) trong transaction hiện tại.
+    Dùng sau các câu lệnh bulk (Core) không đi qua flush của ORM.
+    Như reconcile(): khóa các dòng bộ đếm của các tháng trước rồi mới đếm lại, phần chênh lệch
+    được cộng bằng _upsert_add — không xóa dòng nên không mất phần transaction khác vừa cộng.
+    """
+    periods = sorted({(y, m) for y, m in months})
+    if not periods:
+        return
+    conn = session.connection()
+    current = {(d, m, p): v for d, m, p, v in conn.execute(
+        select(T).where(T.c.metric.in_(ABSENCE_METRICS),
+                        T.c.period.in_([f"{y:04d}-{m:02d}" for y, m in periods]))
+        .with_for_update())}
+    # Lọc theo khoảng ngày (dùng được index work_date), không theo EXTRACT(...)
+    truth = _absence_truth(conn, [or_(*(and_(Absence.work_date >= start, Absence.work_date < end)
+                                        for start, end in _month_ranges(periods)))])
+    deltas = {k: truth.get(k, 0) - current.get(k, 0) for k in set(current) | set(truth)}
+    if any(abs(v) > 1e-9 for v in deltas.values()):
+        _upsert_add(conn, deltas)
+        tag_on_commit(session, "counters")
+
+def reconcile():
+    """
+    Đối chiếu toàn bộ bộ đếm với dữ liệu gốc và ghi lại phần sai lệch.
+    Khóa các dòng bộ đếm trước khi đọc dữ liệu gốc: transaction ghi đang dở sẽ chờ tới khi
+    đối chiếu xong rồi mới cộng phần của nó, nên không mất cập nhật.
+    Trả về số dòng bộ đếm đã sửa.
+    """
+    try:
+        conn = db.session.connection()
+        current = {(d, m, p): v for d, m, p, v in conn.execute(select(T).with_for_update())}
+
+        truth = defaultdict(float)
+        for dep_id, role, n in conn.execute(
+                select(Employee.department_id, Employee.org_role, func.count())
+                .group_by(Employee.department_id, Employee.org_role)):
+            truth[(_dept(dep_id), role.name, "")] += n
+        frozen = {f"{y:04d}-" for y in archive.archived_years("absences")}
+        truth.update(_absence_truth(conn, []))
+
+        def in_scope(key):
+            return not (key[2] and key[2][:5] in frozen)
+
+        wrong = {k for k in set(current) | set(truth)
+                 if in_scope(k) and abs(current.get(k, 0) - truth.get(k, 0)) > 1e-9}
+        if wrong:
+            conn.execute(delete(T).where(tuple_(T.c.department_id, T.c.metric, T.c.period)
+                                         .in_(sorted(wrong))))
+            rows = [{"department_id": d, "metric": m, "period": p, "value": truth[(d, m, p)]}
+                    for d, m, p in sorted(wrong) if truth.get((d, m, p))]
+            if rows:
+                conn.execute(insert(T), rows)
+            tag_on_commit(db.session, "counters")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(wrong)
+
+
+# --- Cập nhật theo flush ---
+def _role_name(role):
+    return role.name if isinstance(role, OrgRole) else role
+
+def _dept_changed(obj):
+    return get_history(obj, "department_id").has_changes() or get_history(obj, "department").has_changes()
+
+@event.listens_for(Session, "before_flush")
+def _capture_old(session, flush_context, instances):
+    """Giá trị cũ lấy thẳng từ CSDL (chưa bị flush đổi) cho các dòng sửa / xóa."""
+    emp_ids = [o.id for o in list(session.dirty) + list(session.deleted)
+               if isinstance(o, Employee) and o.id is not None]
+    abs_ids = [o.id for o in list(session.dirty) + list(session.deleted)
+               if isinstance(o, Absence) and o.id is not None]
+    if not emp_ids and not abs_ids:
+        return
+    conn = session.connection()
+    old = session.info.setdefault("counter_old", {"emp": {}, "abs": {}, "moved": {}})
+    if emp_ids:
+        for emp_id, dep_id, role in conn.execute(
+                select(Employee.id, Employee.department_id, Employee.org_role)
+                .where(Employee.id.in_(emp_ids))):
+            old["emp"].setdefault(emp_id, (_dept(dep_id), _role_name(role)))
+        # Nhân viên chuyển phòng: ngày nghỉ (trong bảng) chuyển theo sang phòng mới
+        moving = [o.id for o in session.dirty if isinstance(o, Employee) and o.id in old["emp"]
+                  and _dept_changed(o) and o.id not in old["moved"]]
+        if moving:
+            for emp_id, d, part, permitted in conn.execute(
+                    select(Absence.employee_id, Absence.work_date, Absence.part, Absence.is_permitted)
+                    .where(Absence.employee_id.in_(moving))):
+                old["moved"].setdefault(emp_id, []).append((d, part, permitted))
+            for emp_id in moving:
+                old["moved"].setdefault(emp_id, [])
+    if abs_ids:
+        for row in conn.execute(
+                select(Absence.id, Absence.employee_id, Absence.work_date, Absence.part,
+                       Absence.is_permitted, Employee.department_id)
+                .outerjoin(Employee, Employee.id == Absence.employee_id)
+                .where(Absence.id.in_(abs_ids))):
+            old["abs"].setdefault(row[0], tuple(row[1:]))
+
+@event.listens_for(Session, "after_flush")
+def _apply_deltas(session, flush_context):
+    old = session.info.pop("counter_old", {"emp": {}, "abs": {}, "moved": {}})
+    deltas = defaultdict(float)
+    new_abs, old_abs = [], []    # (employee_id, work_date, part, is_permitted, phòng cũ)
+
+    for obj in session.new:
+        if isinstance(obj, Employee):
+            deltas[(_dept(obj.department_id), _role_name(obj.org_role), "")] += 1
+        elif isinstance(obj, Absence):
+            new_abs.append((obj.employee_id, obj.work_date, obj.part, obj.is_permitted, None))
+    for obj in session.deleted:
+        if isinstance(obj, Employee) and obj.id in old["emp"]:
+            dep_id, role = old["emp"][obj.id]
+            deltas[(dep_id, role, "")] -= 1
+        elif isinstance(obj, Absence) and obj.id in old["abs"]:
+            old_abs.append(old["abs"][obj.id])
+    for obj in session.dirty:
+        if isinstance(obj, Employee) and obj.id in old["emp"]:
+            dep_id, role = old["emp"][obj.id]
+            cur = (_dept(obj.department_id), _role_name(obj.org_role))
+            if cur != (dep_id, role):
+                deltas[(dep_id, role, "")] -= 1
+                deltas[(cur[0], cur[1], "")] += 1
+            if cur[0] != dep_id:
+                for d, part, permitted in old["moved"].get(obj.id, ()):
+                    metric = ABSENCE_METRICS[0 if permitted else 1]
+                    deltas[(dep_id, metric, period_of(d))] -= _day_value(part)
+                    deltas[(cur[0], metric, period_of(d))] += _day_value(part)
+        elif isinstance(obj, Absence) and obj.id in old["abs"]:
+            before = old["abs"][obj.id]
+            after = (obj.employee_id, obj.work_date, obj.part, obj.is_permitted)
+            if before[:4] != after:
+                old_abs.append(before)
+                new_abs.append(after + (None,))
+
+    if new_abs or old_abs:
+        # Ngày nghỉ tính theo phòng hiện tại của nhân viên (sau flush); nhân viên đã bị xóa
+        # thì dùng phòng cũ. Phần đã có trước khi chuyển phòng đã được dời ở trên.
+        conn = session.connection()
+        emp_ids = {r[0] for r in new_abs + old_abs}
+        dept_of = dict(conn.execute(select(Employee.id, Employee.department_id)
+                                    .where(Employee.id.in_(emp_ids))).all())
+        for rows, sign in ((new_abs, 1), (old_abs, -1)):
+            for emp_id, d, part, permitted, old_dep in rows:
+                dep_id = _dept(dept_of[emp_id]) if emp_id in dept_of else _dept(old_dep)
+                deltas[(dep_id, ABSENCE_METRICS[0 if permitted else 1], period_of(d))] += sign * _day_value(part)
+
+    if any(deltas.values()):
+        _upsert_add(session.connection(), deltas)
+        tag_on_commit(session, "counters")
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("counter_old", None)
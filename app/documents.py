@@ -0,0 +1,156 @@
+# app/documents.py
+# Trộn thư (mail-merge) tờ khai Mẫu số 08-MST (TT86/2024/TT-BTC) cho nhiều nhân viên.
+# File mẫu có chỗ trống dạng {{name}}, {{name_upper}}, {{day}}... (xem employee_fields).
+# Chạy ở worker nền (task "documents.tt86" trong app/jobs.py): mỗi file DOCX được dựng trong
+# process pool, ghi vào 1 file ZIP theo thứ tự tài liệu nào xong trước thì ghi trước.
+import io
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from xml.sax.saxutils import escape, unescape
+from flask import current_app
+from . import readmodels
+from .models import Employee, normalize_search
+
+TEMPLATE_NAME = "mau-so-8-mst-tt86.docx"
+
+# Các phần XML có thể chứa nội dung cần trộn
+_PART_RE = re.compile(r"^word/(document|header\d*|footer\d*)\.xml$")
+_PARA_RE = re.compile(r"<w:p[ >].*?</w:p>", re.S)
+_TEXT_RE = re.compile(r"<w:t(?: [^>]*)?>([^<]*)</w:t>|<w:t/>")
+_FIELD_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def template_path():
+    return current_app.config.get('DOCX_TT86_TEMPLATE') or \
+        os.path.join(current_app.static_folder, 'images', TEMPLATE_NAME)
+
+def employee_fields(employee, department_name=None, on_date=None):
+    """Các trường trộn của 1 nhân viên (dict thuần để gửi sang process con)."""
+    d = on_date or date.today()
+    return {
+        "id": employee.id,
+        "name": employee.name or "",
+        "name_upper": (employee.name or "").upper(),
+        "position": employee.position or "",
+        "department": department_name or "",
+        "email": employee.email or "",
+        "phone": employee.phone or "",
+        "birth_date": employee.year_of_birth.strftime('%d/%m/%Y') if employee.year_of_birth else "",
+        "day": d.day, "month": d.month, "year": d.year,
+    }
+
+def document_name(fields):
+    slug = re.sub(r"[^a-z0-9]+", "-", normalize_search(fields["name"])).strip("-")
+    return f"08-MST_{fields['id']:05d}_{slug or 'nhan-vien'}.docx"
+
+
+# --- Dựng 1 tài liệu (chạy trong process con) ---
+def _rewrite_paragraph(para, fields):
+    texts = list(_TEXT_RE.finditer(para))
+    if not texts:
+        return para
+    old = "".join(unescape(m.group(1) or "") for m in texts)
+    new = _FIELD_RE.sub(lambda m: str(fields.get(m.group(1), "")), old)
+    if new == old:
+        return para
+
+    # Dồn toàn bộ nội dung mới vào run đầu tiên, giữ nguyên định dạng của run đó
+    out, pos = [], 0
+    for i, m in enumerate(texts):
+        out.append(para[pos:m.start()])
+        out.append(f'<w:t xml:space="preserve">{escape(new)}</w:t>' if i == 0 else "<w:t></w:t>")
+        pos = m.end()
+    out.append(para[pos:])
+    return "".join(out)
+
+def merge_xml(xml, fields):
+    return _PARA_RE.sub(lambda m: _rewrite_paragraph(m.group(0), fields), xml)
+
+def render_docx(template_parts, fields):
+    """template_parts: [(ZipInfo, bytes)] của file mẫu -> bytes DOCX đã trộn."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as out:
+        for info, data in template_parts:
+            if _PART_RE.match(info.filename):
+                data = merge_xml(data.decode("utf-8"), fields).encode("utf-8")
+            out.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED)
+    return buf.getvalue()
+
+def read_template(path):
+    with zipfile.ZipFile(path) as z:
+        return [(info, z.read(info)) for info in z.infolist()]
+
+_worker_template = None
+
+def _init_worker(path):
+    # Mỗi process con đọc file mẫu 1 lần
+    global _worker_template
+    _worker_template = read_template(path)
+
+def _render_in_worker(fields):
+    return render_docx(_worker_template, fields)
+
+
+def select_employees(department_id=None, keyword=None, employee_ids=None):
+    """Danh sách EmployeeRow (có tên phòng) theo cùng bộ lọc với trang danh sách nhân viên."""
+    q = readmodels.employee_query(keyword, department_id, employee_ids)
+    return readmodels.employees(q.order_by(Employee.id))
+
+def output_path(job_id):
+    """File ZIP kết quả của 1 việc (thư mục dùng chung giữa web và worker)."""
+    folder = current_app.config.get('JOBS_UPLOAD_DIR') or os.path.join(current_app.instance_path, 'jobs')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"tt86_{job_id}.zip")
+
+def remove_old_outputs(max_age=86400):
+    """Xóa các file ZIP kết quả cũ hơn max_age giây."""
+    folder = os.path.dirname(output_path(0))
+    cutoff = time.time() - max_age
+    for entry in os.scandir(folder):
+        if entry.name.startswith("tt86_") and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def write_tt86_zip(dest, fields_list, path=None, workers=None, progress=None):
+    """
+    Ghi file ZIP chứa tờ khai của các nhân viên ra `dest` (ghi file tạm rồi đổi tên).
+    Việc dựng DOCX chạy ở process pool riêng của lần gọi này (DOCX_WORKERS, 0 = tuần tự),
+    đóng lại khi xong -> không có pool dùng chung giữa các việc.
+    progress(số đã xong, tổng) được gọi sau mỗi tài liệu.
+    """
+    path = path or template_path()
+    if workers is None:
+        workers = current_app.config.get('DOCX_WORKERS', os.cpu_count() or 1)
+    names = [document_name(f) for f in fields_list]
+    total = len(names)
+    tmp = dest + ".tmp"
+    # DOCX đã nén sẵn -> ZIP ngoài chỉ cần lưu (STORED)
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:
+        if workers <= 0:
+            # Không dùng pool (debug / môi trường không cho tạo process)
+            template = read_template(path)
+            for i, (name, fields) in enumerate(zip(names, fields_list), start=1):
+                zf.writestr(name, render_docx(template, fields))
+                if progress:
+                    progress(i, total)
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, total) or 1, initializer=_init_worker,
+                                     initargs=(path,)) as pool:
+                futures = {pool.submit(_render_in_worker, f): name for name, f in zip(names, fields_list)}
+                try:
+                    for i, fut in enumerate(as_completed(futures), start=1):
+                        zf.writestr(futures[fut], fut.result())
+                        if progress:
+                            progress(i, total)
+                finally:
+                    # Lỗi giữa chừng -> bỏ các tài liệu chưa dựng
+                    for fut in futures:
+                        fut.cancel()
+    os.replace(tmp, dest)
+    return total
@@ -1,8 +1,10 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from sqlalchemy import CheckConstraint
-from wtforms import StringField, SubmitField
-from wtforms.validators import DataRequired, Email, Length
+from wtforms import Form, StringField, SubmitField, IntegerField, FloatField, DateField, FieldList, FormField
+from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional
+from wtforms.widgets import HiddenInput, NumberInput
+from datetime import date
 
 class ProfileUpdateForm(FlaskForm):
     name = StringField('Họ và tên', validators=[DataRequired(), Length(min=2, max=100)])
@@ -16,8 +18,23 @@ class ProfileUpdateForm(FlaskForm):
 
 # Tạo form đánh giá nhiệm vụ
 class TaskAssessmentForm(FlaskForm):
-    employee_id = StringField('ID Nhân viên', validators=[DataRequired()])
+    employee_id = IntegerField('ID Nhân viên', validators=[DataRequired()])
     assessment_content = StringField('Nội dung đánh giá', validators=[DataRequired()])
-    score = StringField('Điểm số', validators=[DataRequired()])
-    assessment_date = StringField('Ngày đánh giá', validators=[DataRequired()])
+    score = FloatField('Điểm số', widget=NumberInput(step='0.5', min=0, max=100),
+                       validators=[DataRequired(), NumberRange(min=0, max=100, message='Điểm phải từ 0 đến 100')])
+    assessment_date = DateField('Ngày đánh giá', validators=[DataRequired()], default=date.today)
     submit = SubmitField('Gửi đánh giá')
+
+# Một dòng trong bảng đánh giá hàng loạt (không cần CSRF riêng)
+class AssessmentRowForm(Form):
+    employee_id = IntegerField(widget=HiddenInput(), validators=[DataRequired()])
+    # Để trống = không đánh giá nhân viên này
+    score = FloatField('Điểm số', widget=NumberInput(step='0.5', min=0, max=100),
+                       validators=[Optional(), NumberRange(min=0, max=100, message='Điểm phải từ 0 đến 100')])
+    assessment_content = StringField('Nhận xét', validators=[Optional(), Length(max=1000)])
+
+# Form đánh giá cả tổ/phòng trong một lần gửi
+class BatchAssessmentForm(FlaskForm):
+    assessment_date = DateField('Ngày đánh giá', validators=[DataRequired()], default=date.today)
+    rows = FieldList(FormField(AssessmentRowForm))
+    submit = SubmitField('Lưu đánh giá')
@@ -0,0 +1,92 @@
+# app/history.py
+# Quản lý các kỳ hiệu lực trong employee_history (mỗi nhân viên chỉ 1 kỳ mở)
+from datetime import date
+from . import db
+from .models import EmployeeHistory
+
+
+def current_period(employee_id: int):
+    """Kỳ đang mở của nhân viên, tra bằng unique index (employee_id, is_current)."""
+    return EmployeeHistory.query.filter_by(employee_id=employee_id, is_current=True).first()
+
+def open_period(employee_id: int, department_id, position, org_role, change_type,
+                reason=None, source="admin", changed_by="system", current=None, on_date=None):
+    """
+    Đóng kỳ hiện hành (nếu có) rồi mở kỳ mới, trong cùng transaction của session.
+    `current`: kỳ hiện hành đã tra sẵn (tránh truy vấn lại); False = chắc chắn chưa có kỳ nào.
+    """
+    on_date = on_date or date.today()
+    if current is None:
+        current = current_period(employee_id)
+    if current:
+        current.effective_to = on_date
+        current.is_current = None
+        # Flush trước để không vi phạm uq_hist_emp_current khi chèn kỳ mới
+        db.session.flush([current])
+
+    period = EmployeeHistory(
+        employee_id=employee_id,
+        effective_from=on_date,
+        is_current=True,
+        department_id=department_id,
+        position=position,
+        org_role=org_role,
+        change_type=change_type,
+        reason=reason,
+        source=source,
+        changed_by=changed_by,
+    )
+    db.session.add(period)
+    return period
+
+def check_history(fix=False):
+    """
+    Kiểm tra (và sửa nếu fix=True) các kỳ chồng lấn / chưa đóng:
+    - kỳ trước chưa đóng hoặc kết thúc sau ngày bắt đầu kỳ sau -> đóng tại ngày bắt đầu kỳ sau
+    - chỉ kỳ cuối cùng được mở và được đánh dấu is_current
+    Trả về danh sách (employee_id, history_id, mô tả lỗi).
+    """
+    problems = []
+    rows = (EmployeeHistory.query
+            .order_by(EmployeeHistory.employee_id, EmployeeHistory.effective_from, EmployeeHistory.id)
+            .all())
+
+    def check_employee(periods):
+        # Đặt lại cờ is_current trước để tránh trùng unique khi đổi kỳ hiện hành
+        to_clear = [p for p in periods[:-1] if p.is_current]
+        for p in to_clear:
+            problems.append((p.employee_id, p.id, "kỳ cũ vẫn được đánh dấu hiện hành"))
+            if fix:
+                p.is_current = None
+        if fix and to_clear:
+            db.session.flush(to_clear)
+
+        for prev, nxt in zip(periods, periods[1:]):
+            if prev.effective_to is None or prev.effective_to > nxt.effective_from:
+                problems.append((prev.employee_id, prev.id, "kỳ chưa đóng hoặc chồng lấn kỳ sau"))
+                if fix:
+                    prev.effective_to = nxt.effective_from
+
+        last = periods[-1]
+        if last.effective_to is None and not last.is_current:
+            problems.append((last.employee_id, last.id, "kỳ mở chưa được đánh dấu hiện hành"))
+            if fix:
+                last.is_current = True
+        elif last.effective_to is not None and last.is_current:
+            problems.append((last.employee_id, last.id, "kỳ đã đóng nhưng vẫn đánh dấu hiện hành"))
+            if fix:
+                last.is_current = None
+
+    batch, emp_id = [], None
+    for h in rows:
+        if h.employee_id != emp_id and batch:
+            check_employee(batch)
+            batch = []
+        emp_id = h.employee_id
+        batch.append(h)
+    if batch:
+        check_employee(batch)
+
+    if fix:
+        db.session.commit()
+    return problems
@@ -0,0 +1,386 @@
+# app/jobs.py
+# Hàng đợi công việc nền lưu trong bảng `jobs` (bền: worker dừng / khởi động lại không mất việc):
+#   enqueue("kpi.compute", {"year": 2025, "month": 9})  -> từ route / CLI (flask jobs enqueue ...)
+#   flask worker --processes 4                          -> lấy việc, chạy ở process pool
+# Mỗi task là hàm đăng ký bằng @task("tên"), nhận JobContext (báo tiến độ) + tham số trong payload.
+# Lỗi -> thử lại sau JOBS_RETRY_SECONDS * 2^(lần thử - 1) giây, hết lượt -> failed.
+# JobError = lỗi không thử lại (tham số sai, thiếu file...).
+# Worker chết giữa chừng: việc "running" không có heartbeat quá JOBS_STALE_SECONDS được đưa lại hàng đợi.
+import inspect
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from . import db
+from .models import Job
+
+TASKS = {}   # tên -> (hàm, số lần thử tối đa)
+
+STATUS_LABELS = {
+    "queued": "Chờ chạy", "running": "Đang chạy", "done": "Xong",
+    "failed": "Lỗi", "cancelled": "Đã hủy",
+}
+
+
+class JobError(Exception):
+    """Lỗi không nên thử lại."""
+
+
+def task(name, max_attempts=3):
+    def decorator(fn):
+        TASKS[name] = (fn, max_attempts)
+        return fn
+    return decorator
+
+
+class JobContext:
+    """Truyền vào task: báo tiến độ (ghi thẳng vào bảng jobs, ngoài transaction của task)."""
+    MIN_INTERVAL = 0.5
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last = 0.0
+
+    def progress(self, done, total=None, note=None):
+        fraction = min(max(done / total if total else done, 0.0), 1.0)
+        now = time.monotonic()
+        if fraction < 1.0 and now - self._last < self.MIN_INTERVAL:
+            return
+        self._last = now
+        with db.engine.begin() as conn:
+            conn.execute(update(Job).where(Job.id == self.job_id).values(
+                progress=fraction, progress_note=(note or "")[:200] or None, heartbeat_at=datetime.now()))
+
+
+# --- Đưa việc vào hàng đợi ---
+def _dump(payload):
+    return json.dumps(payload or {}, sort_keys=True, ensure_ascii=False, default=str)
+
+def enqueue(kind, payload=None, created_by=None, max_attempts=None, unique=False, delay=0):
+    """
+    Thêm việc vào db.session (người gọi commit, cùng transaction với dữ liệu liên quan).
+    unique=True: đã có việc cùng loại + cùng payload đang chờ / đang chạy thì trả về việc đó.
+    """
+    if kind not in TASKS:
+        raise ValueError(f"Không có task '{kind}'")
+    body = _dump(payload)
+    if unique:
+        existing = db.session.scalar(select(Job).where(
+            Job.kind == kind, Job.payload == body, Job.status.in_(("queued", "running"))).limit(1))
+        if existing is not None:
+            return existing
+    job = Job(kind=kind, payload=body, created_by=created_by,
+              max_attempts=max_attempts or TASKS[kind][1],
+              run_after=datetime.now() + timedelta(seconds=delay))
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+def upload_path(suffix):
+    """Chỗ lưu file tải lên chờ worker xử lý (thư mục dùng chung giữa web và worker)."""
+    folder = current_app.config.get('JOBS_UPLOAD_DIR') or os.path.join(current_app.instance_path, 'jobs')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{secrets.token_hex(8)}{suffix}")
+
+
+# --- Thao tác trên hàng đợi (worker + trang admin) ---
+def claim(worker_id, limit):
+    """Nhận tối đa `limit` việc đến hạn; UPDATE có điều kiện status nên 2 worker không nhận trùng."""
+    now = datetime.now()
+    ids = db.session.scalars(
+        select(Job.id).where(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.id).limit(limit).with_for_update(skip_locked=True)).all()
+    claimed = []
+    for job_id in ids:
+        res = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == "queued")
+            .values(status="running", attempts=Job.attempts + 1, worker=worker_id,
+                    started_at=now, heartbeat_at=now, progress=0, progress_note=None))
+        if res.rowcount:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+def _retry_delay(attempts):
+    return current_app.config.get('JOBS_RETRY_SECONDS', 30) * 2 ** max(attempts - 1, 0)
+
+def finish(job_id, outcome, value):
+    """Ghi kết quả 1 lần chạy: ok -> done; error -> thử lại hoặc failed; fatal -> failed."""
+    job = db.session.get(Job, job_id)
+    now = datetime.now()
+    job.worker = None
+    if outcome == "ok":
+        job.status, job.progress, job.finished_at = "done", 1.0, now
+        job.result = _dump(value) if value is not None else None
+        job.error = None
+    elif outcome == "error" and job.attempts < job.max_attempts:
+        job.status, job.error = "queued", value
+        job.run_after = now + timedelta(seconds=_retry_delay(job.attempts))
+    else:
+        job.status, job.error, job.finished_at = "failed", value, now
+    db.session.commit()
+
+def heartbeat(job_ids):
+    if job_ids:
+        db.session.execute(update(Job).where(Job.id.in_(list(job_ids)))
+                           .values(heartbeat_at=datetime.now()))
+        db.session.commit()
+
+def requeue_stale(seconds=None):
+    """Việc 'running' mất heartbeat (worker chết) -> tính là 1 lần lỗi."""
+    seconds = seconds or current_app.config.get('JOBS_STALE_SECONDS', 300)
+    stale = db.session.scalars(select(Job.id).where(
+        Job.status == "running", Job.heartbeat_at < datetime.now() - timedelta(seconds=seconds))).all()
+    for job_id in stale:
+        finish(job_id, "error", f"Worker không phản hồi quá {seconds} giây")
+    return len(stale)
+
+def retry(job_ids):
+    """Đưa lại hàng đợi các việc failed / cancelled (reset số lần thử)."""
+    res = db.session.execute(
+        update(Job).where(Job.id.in_(list(job_ids)), Job.status.in_(("failed", "cancelled")))
+        .values(status="queued", attempts=0, run_after=datetime.now(), finished_at=None))
+    db.session.commit()
+    return res.rowcount
+
+def cancel(job_ids):
+    """Hủy các việc chưa chạy (việc đang chạy không dừng giữa chừng)."""
+    res = db.session.execute(
+        update(Job).where(Job.id.in_(list(job_ids)), Job.status == "queued")
+        .values(status="cancelled", finished_at=datetime.now()))
+    db.session.commit()
+    return res.rowcount
+
+
+# --- Chạy 1 việc (trong process con hoặc ngay trong process worker) ---
+def execute(job_id):
+    """Chạy task của việc -> (outcome, value): ('ok', kết quả) / ('error' | 'fatal', thông báo lỗi)."""
+    job = db.session.get(Job, job_id)
+    kind, payload = job.kind, json.loads(job.payload or "{}")
+    entry = TASKS.get(kind)
+    db.session.rollback()
+    try:
+        if entry is None:
+            raise JobError(f"Không có task '{kind}'")
+        ctx = JobContext(job_id)
+        try:
+            inspect.signature(entry[0]).bind(ctx, **payload)
+        except TypeError as e:
+            raise JobError(f"Payload không khớp task '{kind}': {e}")
+        return "ok", entry[0](ctx, **payload)
+    except JobError as e:
+        db.session.rollback()
+        return "fatal", str(e)
+    except Exception:
+        db.session.rollback()
+        return "error", traceback.format_exc()
+    finally:
+        db.session.remove()
+
+_child_app = None
+
+def _init_child():
+    global _child_app
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # Ctrl+C do process cha xử lý (dừng êm)
+    from . import create_app
+    _child_app = create_app()
+
+def _execute_in_child(job_id):
+    with _child_app.app_context():
+        return execute(job_id)
+
+
+def run_worker(processes=None, poll=None, once=False, echo=print):
+    """
+    Vòng lặp worker: nhận việc khi còn chỗ trong pool, ghi kết quả khi xong, gửi heartbeat.
+    processes=0: chạy tuần tự ngay trong process này (debug). once=True: dừng khi hết việc đến hạn.
+    SIGTERM / Ctrl+C: không nhận việc mới, chờ các việc đang chạy xong rồi thoát.
+    """
+    app = current_app._get_current_object()
+    processes = app.config.get('JOBS_WORKERS', os.cpu_count() or 1) if processes is None else processes
+    poll = poll or app.config.get('JOBS_POLL_SECONDS', 1.0)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"[:64]
+    stopping = []
+
+    def _stop(signum, frame):
+        if not stopping:
+            echo("Đang dừng: chờ các việc đang chạy xong...")
+        stopping.append(signum)
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    n = requeue_stale()
+    if n:
+        echo(f"Đưa lại hàng đợi {n} việc của worker đã dừng.")
+    echo(f"Worker {worker_id}: {processes or 'không dùng'} process, hỏi hàng đợi mỗi {poll}s.")
+
+    if processes <= 0:
+        while not stopping:
+            ids = claim(worker_id, 1)
+            if not ids:
+                if once:
+                    break
+                time.sleep(poll)
+                continue
+            outcome, value = execute(ids[0])
+            finish(ids[0], outcome, value)
+            echo(f"#{ids[0]}: {outcome}")
+        return
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=processes, initializer=_init_child,
+                                   mp_context=multiprocessing.get_context("spawn"))
+
+    pool = new_pool()
+    running = {}   # future -> job id
+    last_stale_check = time.monotonic()
+    try:
+        while running or not stopping:
+            free = processes - len(running)
+            if free > 0 and not stopping:
+                for job_id in claim(worker_id, free):
+                    running[pool.submit(_execute_in_child, job_id)] = job_id
+            if not running:
+                if once:
+                    break
+                time.sleep(poll)
+                continue
+
+            done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            broken = False
+            for fut in done:
+                job_id = running.pop(fut)
+                try:
+                    outcome, value = fut.result()
+                except BrokenProcessPool:
+                    # Process con chết (hết bộ nhớ, bị kill...) -> tính là 1 lần lỗi
+                    outcome, value, broken = "error", "Process chạy việc bị dừng đột ngột", True
+                finish(job_id, outcome, value)
+                echo(f"#{job_id}: {outcome}")
+            if broken:
+                for fut, job_id in running.items():
+                    finish(job_id, "error", "Process chạy việc bị dừng đột ngột")
+                running.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = new_pool()
+
+            heartbeat(running.values())
+            if time.monotonic() - last_stale_check > app.config.get('JOBS_STALE_SECONDS', 300):
+                requeue_stale()
+                last_stale_check = time.monotonic()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# --- Các task ---
+@task("kpi.compute")
+def _kpi_compute(ctx, year, month, close=False, force=False):
+    from . import kpi
+    try:
+        rows = kpi.close_month(year, month) if close else kpi.compute_monthly_kpi(year, month, force=force)
+    except ValueError as e:   # tháng đã chốt -> thử lại cũng vậy
+        raise JobError(str(e))
+    return {"rows": rows}
+
+@task("kpi.refresh")
+def _kpi_refresh(ctx):
+    from . import kpi
+    return {"rows": kpi.refresh_dirty_kpis()}
+
+@task("changes.compact")
+def _changes_compact(ctx, older_than_days=None):
+    from . import changes
+    return {"deleted": changes.compact(older_than_days)}
+
+@task("reports.generate")
+def _reports_generate(ctx, year, month, department_id=None, force=False, all_departments=False):
+    from . import reports
+    if all_departments:
+        return {"created": reports.generate_month_reports(year, month, force)}
+    path, created = reports.generate_report(year, month, department_id, force)
+    return {"file": path, "created": created}
+
+@task("documents.tt86", max_attempts=1)
+def _documents_tt86(ctx, employee_ids, on_date, download_name=None):
+    """ZIP tờ khai 08-MST của các nhân viên -> documents.output_path(job id) (route tải về đọc từ đó)."""
+    from . import documents
+    rows = documents.select_employees(employee_ids=employee_ids)
+    if not rows:
+        raise JobError("Không còn nhân viên nào trong danh sách")
+    d = datetime.strptime(on_date, '%Y-%m-%d').date()
+    fields = [documents.employee_fields(e, e.department_name, d) for e in rows]
+    n = documents.write_tt86_zip(documents.output_path(ctx.job_id), fields,
+                                 progress=lambda i, total: ctx.progress(i, total, f"Đã dựng {i}/{total} tờ khai"))
+    return {"documents": n}
+
+@task("employees.import", max_attempts=1)
+def _employees_import(ctx, path, delete_file=True):
+    """
+    File Excel cùng dạng DSDLTT.xlsx (dòng đầu là tên cột):
+    name, year_of_birth, position, email, phone, department_id.
+    """
+    from openpyxl import load_workbook
+    from .models import Employee
+    if not os.path.exists(path):
+        raise JobError(f"Không tìm thấy file {path}")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        missing = {"name", "position"} - set(header)
+        if missing:
+            raise JobError(f"Thiếu cột: {', '.join(sorted(missing))}")
+        total = max((ws.max_row or 1) - 1, 1)
+        created = 0
+        for i, values in enumerate(rows, start=1):
+            r = dict(zip(header, values))
+            if not r.get("name"):
+                continue
+            born = r.get("year_of_birth")
+            if born is not None and not isinstance(born, datetime):
+                try:
+                    born = datetime.strptime(str(born), '%Y-%m-%d')
+                except ValueError:
+                    born = None
+            db.session.add(Employee(
+                name=str(r["name"]).strip(), year_of_birth=born, position=str(r.get("position") or ""),
+                email=r.get("email") or None, phone=str(r["phone"]) if r.get("phone") else None,
+                department_id=int(r["department_id"]) if r.get("department_id") else None))
+            created += 1
+            if i % 50 == 0:
+                ctx.progress(i, total, f"Đã đọc {i}/{total} dòng")
+    finally:
+        wb.close()
+    db.session.commit()
+    ctx.progress(1.0, note=f"Đã thêm {created} nhân viên")
+    if delete_file:
+        os.remove(path)
+    return {"created": created}
+
+@task("avatar.process")
+def _avatar_process(ctx, employee_id, path, ext):
+    from .models import Employee
+    from .utils import process_avatar, remove_avatar
+    employee = db.session.get(Employee, employee_id)
+    if employee is None:
+        raise JobError(f"Không có nhân viên #{employee_id}")
+    if not os.path.exists(path):
+        raise JobError(f"Không tìm thấy ảnh {path}")
+    with open(path, "rb") as f:
+        new_url = process_avatar(f, ext)
+    old_url = employee.avatar_url
+    employee.avatar_url = new_url
+    db.session.commit()
+    remove_avatar(old_url)
+    os.remove(path)
+    return {"avatar_url": new_url}
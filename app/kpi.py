@@ -0,0 +1,232 @@
+# app/kpi.py
+# KPI tổng hợp hàng tháng = chuyên cần (absences) + đánh giá nhiệm vụ (task_assessments)
+from flask import current_app
+from sqlalchemy import select, func, case, delete, insert, update, literal, event, union_all
+from sqlalchemy.orm.attributes import get_history
+from calendar import monthrange
+from datetime import date, datetime
+from . import db, readmodels
+from .models import Employee, Absence, AbsencePart, TaskAssessment, MonthlyKpi
+
+
+def get_weights():
+    """Trọng số (chuyên cần, đánh giá) lấy từ cấu hình app."""
+    return (float(current_app.config.get('KPI_ATTENDANCE_WEIGHT', 0.5)),
+            float(current_app.config.get('KPI_ASSESSMENT_WEIGHT', 0.5)))
+
+def attendance_score(permitted: float, unpermitted: float) -> float:
+    """Cùng công thức với trang KPI: 100 - 2*Có phép - 10*Không phép, giới hạn 0..100."""
+    score = 100 - 2 * permitted - 10 * unpermitted
+    return max(0, min(100, round(score, 2)))
+
+def composite_score(att_score: float, assess_score, weights=None) -> float:
+    """Điểm tổng hợp; chưa có đánh giá thì lấy nguyên điểm chuyên cần."""
+    w_att, w_ass = weights or get_weights()
+    if assess_score is None or (w_att + w_ass) == 0:
+        return att_score
+    return round((w_att * att_score + w_ass * assess_score) / (w_att + w_ass), 2)
+
+def _kpi_select(year: int, month: int, employee_ids=None, frozen=False):
+    """
+    1 câu SELECT tính KPI cho toàn bộ (hoặc 1 tập) nhân viên trong tháng.
+    Điểm được tính ngay trong SQL để có thể INSERT ... SELECT thẳng vào monthly_kpis.
+    """
+    start_day = date(year, month, 1)
+    end_day = date(year, month, monthrange(year, month)[1])
+    w_att, w_ass = get_weights()
+
+    day_val = case((Absence.part == AbsencePart.FULL, 1.0), else_=0.5)
+    att = (select(Absence.employee_id,
+                  func.sum(day_val).label("total"),
+                  func.sum(case((Absence.is_permitted.is_(True), day_val), else_=0.0)).label("permitted"),
+                  func.sum(case((Absence.is_permitted.is_(True), 0.0), else_=day_val)).label("unpermitted"))
+           .where(Absence.work_date >= start_day, Absence.work_date <= end_day)
+           .group_by(Absence.employee_id)
+           .subquery())
+
+    ass = (select(TaskAssessment.employee_id,
+                  func.avg(TaskAssessment.score).label("score"))
+           .where(TaskAssessment.assessment_date >= start_day,
+                  TaskAssessment.assessment_date <= end_day)
+           .group_by(TaskAssessment.employee_id)
+           .subquery())
+
+    permitted = func.coalesce(att.c.permitted, 0.0)
+    unpermitted = func.coalesce(att.c.unpermitted, 0.0)
+    raw = 100 - 2 * permitted - 10 * unpermitted
+    att_score = case((raw < 0, 0.0), (raw > 100, 100.0), else_=raw)
+
+    if w_att + w_ass == 0:
+        comp = att_score
+    else:
+        comp = case(
+            (ass.c.score.is_(None), att_score),
+            else_=(w_att * att_score + w_ass * ass.c.score) / (w_att + w_ass))
+
+    stmt = (select(
+                Employee.id.label("employee_id"),
+                literal(year).label("year"),
+                literal(month).label("month"),
+                func.coalesce(att.c.total, 0.0).label("total_days_off"),
+                permitted.label("permitted_days_off"),
+                unpermitted.label("unpermitted_days_off"),
+                att_score.label("attendance_score"),
+                ass.c.score.label("assessment_score"),
+                func.round(comp, 2).label("composite_score"),
+                literal(w_att).label("attendance_weight"),
+                literal(w_ass).label("assessment_weight"),
+                literal(frozen).label("is_frozen"),
+                literal(False).label("is_dirty"),
+                literal(datetime.now()).label("computed_at"))
+            .select_from(Employee)
+            .outerjoin(att, att.c.employee_id == Employee.id)
+            .outerjoin(ass, ass.c.employee_id == Employee.id))
+    if employee_ids is not None:
+        stmt = stmt.where(Employee.id.in_(list(employee_ids)))
+    return stmt
+
+_KPI_COLUMNS = ["employee_id", "year", "month",
+                "total_days_off", "permitted_days_off", "unpermitted_days_off",
+                "attendance_score", "assessment_score", "composite_score",
+                "attendance_weight", "assessment_weight",
+                "is_frozen", "is_dirty", "computed_at"]
+
+def compute_monthly_kpi(year: int, month: int, employee_ids=None, frozen=False, force=False):
+    """
+    Tính lại KPI tháng bằng DELETE + INSERT ... SELECT trong 1 transaction.
+    employee_ids=None -> toàn cơ quan. Trả về số dòng đã ghi.
+    Tháng đã chốt: raise ValueError, trừ khi force=True (tính lại nhưng vẫn giữ trạng thái chốt).
+    Năm đã lưu trữ (ngày nghỉ không còn trong SQL): luôn raise ValueError.
+    """
+    session = db.session
+    if year in _archived_years():
+        raise ValueError(f"Năm {year} đã lưu trữ, KPI đã chốt không tính lại được.")
+    if not frozen:
+        is_frozen = session.scalar(
+            select(MonthlyKpi.id).where(MonthlyKpi.year == year, MonthlyKpi.month == month,
+                                        MonthlyKpi.is_frozen.is_(True)).limit(1)) is not None
+        if is_frozen and not force:
+            raise ValueError(f"KPI {month:02d}/{year} đã chốt; dùng --force để tính lại.")
+        frozen = is_frozen
+    try:
+        q = delete(MonthlyKpi).where(MonthlyKpi.year == year, MonthlyKpi.month == month)
+        if employee_ids is not None:
+            q = q.where(MonthlyKpi.employee_id.in_(list(employee_ids)))
+        session.execute(q, execution_options={"synchronize_session": False})
+
+        result = session.execute(
+            insert(MonthlyKpi).from_select(_KPI_COLUMNS, _kpi_select(year, month, employee_ids, frozen)))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return result.rowcount
+
+def _archived_years():
+    from . import archive
+    return set(archive.archived_years("absences"))
+
+def close_month(year: int, month: int):
+    """Chốt tháng: tính cho toàn cơ quan và đánh dấu is_frozen."""
+    return compute_monthly_kpi(year, month, frozen=True)
+
+def refresh_dirty_kpis():
+    """
+    Chỉ tính lại các nhân viên có nghỉ/đánh giá thay đổi sau khi đã tính KPI.
+    Giữ nguyên trạng thái chốt (is_frozen) của từng tháng; bỏ qua năm đã lưu trữ (giữ số đã chốt).
+    """
+    archived = _archived_years()
+    dirty = (db.session.query(MonthlyKpi.year, MonthlyKpi.month,
+                              MonthlyKpi.employee_id, MonthlyKpi.is_frozen)
+             .filter(MonthlyKpi.is_dirty.is_(True))
+             .all())
+
+    groups = {}
+    for r in dirty:
+        if r.year in archived:
+            continue
+        groups.setdefault((r.year, r.month, r.is_frozen), []).append(r.employee_id)
+
+    total = 0
+    for (y, m, frozen), emp_ids in groups.items():
+        total += compute_monthly_kpi(y, m, employee_ids=emp_ids, frozen=frozen)
+    return total
+
+def _usable(year: int, month: int):
+    """Điều kiện dòng monthly_kpis dùng được: không dirty; năm đã lưu trữ thì dùng cả dòng dirty."""
+    cond = [MonthlyKpi.year == year, MonthlyKpi.month == month]
+    if year not in _archived_years():
+        cond.append(MonthlyKpi.is_dirty.is_(False))
+    return cond
+
+def get_monthly_kpis(employee_ids, year: int, month: int):
+    """
+    KPI của 1 trang nhân viên -> {employee_id: KpiRow}.
+    Đọc từ monthly_kpis; nhân viên chưa tính hoặc bị dirty thì tính trực tiếp (1 truy vấn chung).
+    Năm đã lưu trữ: dòng đã chốt dùng nguyên (kể cả dirty), chỉ tính trực tiếp nhân viên chưa có dòng.
+    """
+    if not employee_ids:
+        return {}
+    q = (select(*readmodels.KPI_COLUMNS)
+         .where(*_usable(year, month), MonthlyKpi.employee_id.in_(list(employee_ids))))
+    result = readmodels.kpi_rows(db.session.execute(q))
+
+    missing = [i for i in employee_ids if i not in result]
+    if missing:
+        result.update(readmodels.kpi_rows(db.session.execute(_kpi_select(year, month, missing))))
+    return result
+
+def monthly_kpi_source(year: int, month: int, employee_ids):
+    """
+    Subquery KPI tháng (cột như KpiRow) của các nhân viên trong `employee_ids` (subquery 1 cột),
+    để gộp tiếp bằng SQL. Cùng nguồn với get_monthly_kpis: trước hết tìm nhân viên chưa có dòng
+    dùng được (chưa tính / dirty) và chỉ tính trực tiếp họ, ghép với monthly_kpis bằng UNION ALL.
+    """
+    usable = _usable(year, month)
+    stored = select(*readmodels.KPI_COLUMNS).where(*usable, MonthlyKpi.employee_id.in_(employee_ids))
+    missing = db.session.execute(
+        select(Employee.id).where(Employee.id.in_(employee_ids),
+                                  ~select(MonthlyKpi.id).where(*usable, MonthlyKpi.employee_id == Employee.id)
+                                  .exists())).scalars().all()
+    if not missing:
+        return stored.subquery()
+    computed = _kpi_select(year, month, missing).subquery()
+    return union_all(stored, select(*(computed.c[f] for f in readmodels.KpiRow._fields))).subquery()
+
+def mark_kpi_dirty(conn, employee_ids, months):
+    """Đánh dấu dirty các dòng KPI của (nhân viên, tháng) bị ảnh hưởng; chưa có dòng thì bỏ qua."""
+    employee_ids = list(employee_ids)
+    for y, m in set(months):
+        conn.execute(update(MonthlyKpi.__table__)
+                     .where(MonthlyKpi.employee_id.in_(employee_ids),
+                            MonthlyKpi.year == y, MonthlyKpi.month == m)
+                     .values(is_dirty=True))
+
+
+# --- Theo dõi thay đổi dữ liệu nguồn ---
+def _changed_months(target, date_attr):
+    months = set()
+    d = getattr(target, date_attr)
+    if d:
+        months.add((d.year, d.month))
+    # Đổi ngày -> tháng cũ cũng bị ảnh hưởng
+    for old in get_history(target, date_attr).deleted or ():
+        if old:
+            months.add((old.year, old.month))
+    return months
+
+def _changed_employees(target):
+    # Chuyển dòng sang nhân viên khác -> KPI của người cũ cũng bị ảnh hưởng
+    return {target.employee_id, *(get_history(target, "employee_id").deleted or ())} - {None}
+
+@event.listens_for(Absence, "after_insert")
+@event.listens_for(Absence, "after_update")
+@event.listens_for(Absence, "after_delete")
+def _on_absence_change(mapper, connection, target):
+    mark_kpi_dirty(connection, _changed_employees(target), _changed_months(target, "work_date"))
+
+@event.listens_for(TaskAssessment, "after_insert")
+@event.listens_for(TaskAssessment, "after_update")
+@event.listens_for(TaskAssessment, "after_delete")
+def _on_assessment_change(mapper, connection, target):
+    mark_kpi_dirty(connection, _changed_employees(target), _changed_months(target, "assessment_date"))
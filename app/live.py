@@ -0,0 +1,177 @@
+# app/live.py
+# Bộ đếm chuyên cần "hôm nay" theo phòng, giữ trong bộ nhớ của process:
+# - nạp từ CSDL 1 lần (đầu ngày / khi bị đánh dấu cũ / định kỳ, xem ensure_fresh),
+# - cộng trừ trực tiếp khi có Absence được commit qua ORM,
+# - đẩy xuống trình duyệt bằng server-sent events (xem routes.live_today_stream).
+import json
+import threading
+import time
+from datetime import date
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from . import db
+from .models import Absence, AbsencePart, Employee, Department
+
+_lock = threading.Condition()
+_state = {
+    "day": None,          # ngày của bộ đếm
+    "stale": True,        # cần nạp lại từ CSDL
+    "loaded_at": 0.0,
+    "version": 0,         # tăng mỗi lần số liệu đổi (SSE dựa vào đây)
+    "counts": {},         # department_id -> [tổng ngày nghỉ, có phép, không phép]
+    "departments": {},    # department_id -> tên
+    "emp_dept": {},       # employee_id -> department_id
+    "streams": 0,         # số stream SSE đang mở (mỗi stream giữ 1 luồng của server WSGI)
+}
+
+
+def _day_value(part):
+    return 1.0 if part == AbsencePart.FULL else 0.5
+
+def _reload(today):
+    """3 truy vấn nhỏ, dùng connection riêng để không giữ session của request / SSE."""
+    with db.engine.connect() as conn:
+        departments = dict(conn.execute(select(Department.id, Department.name)).all())
+        emp_dept = dict(conn.execute(select(Employee.id, Employee.department_id)).all())
+        rows = conn.execute(select(Absence.employee_id, Absence.part, Absence.is_permitted)
+                            .where(Absence.work_date == today)).all()
+    counts = {}
+    for emp_id, part, permitted in rows:
+        c = counts.setdefault(emp_dept.get(emp_id), [0.0, 0.0, 0.0])
+        v = _day_value(part)
+        c[0] += v
+        c[1 if permitted else 2] += v
+    with _lock:
+        _state.update(day=today, stale=False, loaded_at=time.monotonic(),
+                      counts=counts, departments=departments, emp_dept=emp_dept)
+        _state["version"] += 1
+        _lock.notify_all()
+
+def ensure_fresh(resync_seconds=60):
+    """Nạp lại nếu sang ngày mới, bị đánh dấu cũ hoặc quá hạn đồng bộ (các process khác có thể đã ghi)."""
+    today = date.today()
+    with _lock:
+        fresh = (_state["day"] == today and not _state["stale"]
+                 and time.monotonic() - _state["loaded_at"] < resync_seconds)
+    if not fresh:
+        _reload(today)
+
+def snapshot():
+    """(version, [{department_id, department, absent, permitted, unpermitted}]) — không truy vấn CSDL."""
+    with _lock:
+        rows = []
+        for dep_id, name in sorted(_state["departments"].items(), key=lambda d: d[1]):
+            c = _state["counts"].get(dep_id, [0.0, 0.0, 0.0])
+            rows.append({"department_id": dep_id, "department": name,
+                         "absent": c[0], "permitted": c[1], "unpermitted": c[2]})
+        c = _state["counts"].get(None)
+        if c:
+            rows.append({"department_id": None, "department": "Chưa phân tổ",
+                         "absent": c[0], "permitted": c[1], "unpermitted": c[2]})
+        return _state["version"], rows
+
+def wait_for_change(version, timeout):
+    """Chờ tới khi số liệu khác `version` hoặc hết timeout; trả về version hiện tại."""
+    with _lock:
+        _lock.wait_for(lambda: _state["version"] != version, timeout=timeout)
+        return _state["version"]
+
+def open_stream(limit):
+    """Giữ 1 suất stream SSE; False nếu process đã có đủ `limit` stream đang mở."""
+    with _lock:
+        if _state["streams"] >= limit:
+            return False
+        _state["streams"] += 1
+        return True
+
+def close_stream():
+    with _lock:
+        _state["streams"] -= 1
+
+def sse_message(version, rows):
+    return f"id: {version}\ndata: {json.dumps(rows, ensure_ascii=False)}\n\n"
+
+
+def mark_stale(session):
+    """Các câu lệnh bulk (Core) không qua flush: nạp lại bộ đếm sau khi commit."""
+    session.info["live_stale"] = True
+
+
+# --- Cập nhật theo commit ---
+_UNKNOWN = object()
+
+def _old_values(obj, attrs):
+    """Giá trị trước flush; không biết được (thuộc tính chưa nạp) -> _UNKNOWN."""
+    out = []
+    for a in attrs:
+        h = get_history(obj, a)
+        if h.deleted:
+            out.append(h.deleted[0])
+        elif h.unchanged:
+            out.append(h.unchanged[0])
+        else:
+            return _UNKNOWN
+    return out
+
+_ABS_ATTRS = ("employee_id", "work_date", "part", "is_permitted")
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    today = date.today()
+    deltas = session.info.setdefault("live_deltas", [])
+    for obj in session.new:
+        if isinstance(obj, Absence):
+            if obj.work_date == today:
+                deltas.append((obj.employee_id, obj.part, obj.is_permitted, +1))
+        elif isinstance(obj, (Employee, Department)):
+            session.info["live_stale"] = True
+    for obj in session.deleted:
+        if isinstance(obj, Absence):
+            old = _old_values(obj, _ABS_ATTRS)
+            if old is _UNKNOWN:
+                session.info["live_stale"] = True
+            elif old[1] == today:
+                deltas.append((old[0], old[2], old[3], -1))
+        elif isinstance(obj, (Employee, Department)):
+            session.info["live_stale"] = True
+    for obj in session.dirty:
+        if isinstance(obj, Absence) and session.is_modified(obj, include_collections=False):
+            old = _old_values(obj, _ABS_ATTRS)
+            if old is _UNKNOWN:
+                session.info["live_stale"] = True
+                continue
+            if old[1] == today:
+                deltas.append((old[0], old[2], old[3], -1))
+            if obj.work_date == today:
+                deltas.append((obj.employee_id, obj.part, obj.is_permitted, +1))
+        elif isinstance(obj, Employee) and get_history(obj, "department_id").has_changes():
+            session.info["live_stale"] = True
+        elif isinstance(obj, Department) and get_history(obj, "name").has_changes():
+            session.info["live_stale"] = True
+
+@event.listens_for(Session, "after_commit")
+def _apply(session):
+    deltas = session.info.pop("live_deltas", None)
+    stale = session.info.pop("live_stale", False)
+    if not deltas and not stale:
+        return
+    with _lock:
+        if _state["day"] != date.today():
+            return   # chưa nạp hoặc đã sang ngày -> lần đọc sau sẽ nạp lại
+        if stale:
+            _state["stale"] = True
+        else:
+            for emp_id, part, permitted, sign in deltas:
+                dep_id = _state["emp_dept"].get(emp_id, None)
+                c = _state["counts"].setdefault(dep_id, [0.0, 0.0, 0.0])
+                v = sign * _day_value(part)
+                c[0] += v
+                c[1 if permitted else 2] += v
+        _state["version"] += 1
+        _lock.notify_all()
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("live_deltas", None)
+    session.info.pop("live_stale", None)
@@ -6,11 +6,14 @@ from datetime import datetime, date
 from enum import Enum as PyEnum
 from sqlalchemy import (
     CheckConstraint, Column, Integer, String, Text, DateTime, Date, ForeignKey,
-    Boolean, UniqueConstraint, Index, Float
+    Boolean, UniqueConstraint, Index, Float, BigInteger
 )
-from sqlalchemy.orm import relationship
-from sqlalchemy import Enum as SAEnum
+from sqlalchemy.orm import relationship, column_property
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy import Enum as SAEnum, event
 from . import db
+import re
+import unicodedata
 
 # ==== Base ====
 class BaseModel(db.Model):
@@ -63,6 +66,7 @@ class User(UserMixin, BaseModel):
         - Admin có thể quản lý mọi người.
         - Trưởng phòng (DEPT_HEAD) có thể quản lý mọi nhân viên trong phòng của mình.
         - Tổ trưởng (TEAM_LEAD) có thể quản lý các Nhân viên (MEMBER) trong phòng của mình.
+        - Người phụ trách 1 tổ (Team.manager) quản lý mọi người trong tổ đó và các tổ con.
         - Người dùng không thể tự quản lý chính mình.
         """
         if not self.is_authenticated or not other_employee:
@@ -80,6 +84,12 @@ class User(UserMixin, BaseModel):
         if self.employee.id == other_employee.id:
             return False
 
+        # Phụ trách tổ tổ tiên của tổ người kia (1 truy vấn trên bảng bao đóng, mọi độ sâu)
+        if other_employee.team_id:
+            from .teams import manages_team   # tránh import vòng
+            if manages_team(self.employee.id, other_employee.team_id):
+                return True
+
         # Kiểm tra xem có cùng phòng ban không
         is_in_same_dept = self.employee.department_id and \
                           self.employee.department_id == other_employee.department_id
@@ -105,6 +115,9 @@ class EmployeeHistory(db.Model):
 
     effective_from = Column(Date, nullable=False)
     effective_to   = Column(Date, nullable=True)  # NULL = còn hiệu lực
+    # True = kỳ hiện hành, NULL = đã đóng. Unique (employee_id, is_current) đảm bảo
+    # mỗi nhân viên chỉ có 1 kỳ mở (NULL không bị tính trùng) và tra cứu bằng index.
+    is_current     = Column(Boolean, nullable=True)
 
     # snapshot các trường đang có trong Employee
     department_id  = Column(Integer, index=True)
@@ -118,8 +131,26 @@ class EmployeeHistory(db.Model):
 
     __table_args__ = (
         Index("ix_hist_emp_from", "employee_id", "effective_from"),
+        UniqueConstraint("employee_id", "is_current", name="uq_hist_emp_current"),
+        # Lưu trữ theo năm lọc các kỳ đã đóng theo effective_to
+        Index("ix_hist_effective_to", "effective_to"),
     )
 
+def normalize_search(text) -> str:
+    """Bỏ dấu tiếng Việt + chữ thường, dùng cho tìm kiếm không phân biệt dấu."""
+    s = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    s = unicodedata.normalize('NFD', s)
+    s = ''.join(c for c in s if unicodedata.category(c) != 'Mn')
+    return ' '.join(s.lower().split())
+
+def search_terms(search_key) -> set:
+    """Các từ khóa của 1 search_key: từng từ + các phần chữ/số của từ (vd. email nv1@vpdk.vn -> nv1, vpdk, vn)."""
+    terms = set()
+    for word in (search_key or '').split():
+        terms.add(word[:100])
+        terms.update(p[:100] for p in re.split(r'[^a-z0-9]+', word) if p)
+    return terms
+
 # ==== Employee ====
 class Employee(BaseModel):
     __tablename__ = 'employees'
@@ -130,10 +161,18 @@ class Employee(BaseModel):
     email = Column(String(100))
     phone = Column(String(15), nullable=True)
     avatar_url = Column(String(255), nullable=True)
-    department_id = Column(Integer, ForeignKey('departments.id'), nullable=True)
+    # active_history: tag cache của phòng cũ (cache._tags_for) cần giá trị cũ cả khi đối tượng đã expire
+    department_id = column_property(Column(Integer, ForeignKey('departments.id'), nullable=True, index=True),
+                                    active_history=True)
+    # Tổ/nhóm trực thuộc (cây nhiều cấp, xem Team / TeamClosure)
+    team_id = Column(Integer, ForeignKey('teams.id', ondelete="SET NULL"), nullable=True, index=True)
     org_role = Column(SAEnum(OrgRole), nullable=False, default=OrgRole.MEMBER, index=True)
+    # Khóa tìm kiếm: tên + chức vụ + email + điện thoại đã bỏ dấu (tự cập nhật khi lưu);
+    # tìm theo tiền tố từng từ qua bảng employee_search_terms
+    search_key = Column(String(400), nullable=True)
     user = db.relationship("User", backref="employee", uselist=False, cascade="all, delete")
     department = relationship('Department', back_populates='employees', lazy=True)
+    team = relationship('Team', foreign_keys=[team_id], back_populates='members', lazy=True)
     job_details = relationship('JobDetail', back_populates='employee', lazy=True)
     histories = relationship("EmployeeHistory", backref="employee", lazy="dynamic", cascade="all")
     task_assessments = relationship("TaskAssessment", back_populates="employee", lazy="dynamic", cascade="all")
@@ -151,9 +190,54 @@ class Employee(BaseModel):
         lazy='selectin'
     )
 
+    def build_search_key(self) -> str:
+        return normalize_search(' '.join(filter(None, [self.name, self.position, self.email, self.phone])))
+
+    __table_args__ = (
+        # Danh sách theo phòng sắp theo tên (KPI tổng quan) / toàn cơ quan sắp theo tên
+        Index("ix_emp_dept_name", "department_id", "name"),
+        Index("ix_emp_name", "name"),
+    )
+
     def __str__(self):
         return self.name
 
+@event.listens_for(Employee, "before_insert")
+@event.listens_for(Employee, "before_update")
+def _update_search_key(mapper, connection, target):
+    target.search_key = target.build_search_key()
+
+class EmployeeSearchTerm(db.Model):
+    """
+    1 từ khóa của search_key / 1 dòng: tìm "term%" theo tiền tố dùng được index (term, employee_id),
+    khác với search_key LIKE '%term%' luôn phải quét cả bảng. Cập nhật cùng flush khi lưu nhân viên.
+    """
+    __tablename__ = 'employee_search_terms'
+
+    employee_id = Column(Integer, ForeignKey('employees.id', ondelete="CASCADE"), primary_key=True)
+    term = Column(String(100), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_search_terms_term", "term", "employee_id"),
+    )
+
+@event.listens_for(Employee, "after_insert")
+@event.listens_for(Employee, "after_update")
+def _sync_search_terms(mapper, connection, target):
+    hist = get_history(target, 'search_key')
+    if not hist.added or list(hist.added) == list(hist.deleted):
+        return
+    table = EmployeeSearchTerm.__table__
+    connection.execute(table.delete().where(table.c.employee_id == target.id))
+    terms = search_terms(target.search_key)
+    if terms:
+        connection.execute(table.insert(), [{"employee_id": target.id, "term": t} for t in terms])
+
+@event.listens_for(Employee, "after_delete")
+def _delete_search_terms(mapper, connection, target):
+    table = EmployeeSearchTerm.__table__
+    connection.execute(table.delete().where(table.c.employee_id == target.id))
+
 # ==== Department ====
 class Department(BaseModel):
     __tablename__ = 'departments'
@@ -166,6 +250,43 @@ class Department(BaseModel):
     def __str__(self):
         return self.name
 
+# ==== Team (tổ/nhóm lồng nhau nhiều cấp) ====
+class Team(BaseModel):
+    __tablename__ = 'teams'
+
+    name = Column(String(100), nullable=False)
+    department_id = Column(Integer, ForeignKey('departments.id'), nullable=True, index=True)
+    parent_id = Column(Integer, ForeignKey('teams.id'), nullable=True, index=True)
+    # Người phụ trách: quản lý mọi nhân viên thuộc tổ này và các tổ con (app/teams.py)
+    manager_id = Column(Integer, ForeignKey('employees.id', ondelete="SET NULL", use_alter=True,
+                                            name="fk_teams_manager_id"), nullable=True, index=True)
+
+    parent = relationship('Team', remote_side='Team.id', back_populates='children')
+    children = relationship('Team', back_populates='parent')
+    department = relationship('Department')
+    manager = relationship('Employee', foreign_keys=[manager_id])
+    members = relationship('Employee', foreign_keys='Employee.team_id', back_populates='team')
+
+    def __str__(self):
+        return self.name
+
+class TeamClosure(db.Model):
+    """
+    Bảng bao đóng của cây tổ: mỗi cặp (tổ tổ tiên, tổ con cháu) kể cả (tổ, chính nó, 0).
+    "Mọi người dưới quyền" / KPI cả nhánh = 1 phép join theo index, không đệ quy theo độ sâu.
+    Cập nhật trong cùng flush khi thêm / chuyển / xóa tổ (app/teams.py).
+    """
+    __tablename__ = 'team_closure'
+
+    ancestor_id = Column(Integer, ForeignKey('teams.id', ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey('teams.id', ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Tra tổ tiên của 1 tổ (kiểm tra quyền, chuyển nhánh)
+        Index("ix_closure_descendant", "descendant_id", "depth"),
+    )
+
 # ==== JobDetail ====
 class JobDetail(BaseModel):
     __tablename__ = 'job_details'
@@ -185,13 +306,16 @@ class JobDetail(BaseModel):
 class TaskAssessment(BaseModel):
     __tablename__ = 'task_assessments'
     # Khóa ngoại liên kết với nhân viên
-    employee_id = Column(Integer, ForeignKey('employees.id'), nullable=False, index=True)
+    # active_history: gán lại trên đối tượng đã expire (sau commit) vẫn nạp giá trị cũ, để
+    # kpi / cache thấy cả nhân viên / tháng cũ qua get_history
+    employee_id = column_property(Column(Integer, ForeignKey('employees.id'), nullable=False, index=True),
+                                  active_history=True)
     # Nội dung chi tiết về việc đánh giá
     assessment_content = Column(Text, nullable=True)
     # Điểm số hoặc xếp loại
     score = Column(Float, nullable=False) # Có thể dùng Integer hoặc Float
     # Ngày đánh giá
-    assessment_date = Column(Date, nullable=False, default=date.today)
+    assessment_date = column_property(Column(Date, nullable=False, default=date.today), active_history=True)
     # Người đánh giá (có thể là tên hoặc ID của người quản lý)
     assessor_id = Column(Integer, nullable=False)
      # Thiết lập quan hệ ngược lại với bảng Employee
@@ -203,6 +327,8 @@ class TaskAssessment(BaseModel):
     __table_args__ = (
         # Đảm bảo điểm số nằm trong khoảng từ 0 đến 100
         CheckConstraint('score >= 0.0 AND score <= 100.0', name='score_range_check'),
+        # Thống kê theo khoảng ngày cho toàn cơ quan chỉ đọc index (không đọc bảng)
+        Index('ix_ta_date_emp_score', 'assessment_date', 'employee_id', 'score'),
     )
     def __str__(self):
         return f"Đánh giá cho {self.employee_id} - {self.task_title} vào ngày {self.assessment_date}"
@@ -216,10 +342,14 @@ class AbsencePart(PyEnum):
 class Absence(BaseModel):
     __tablename__ = 'absences'
 
-    employee_id = Column(Integer, ForeignKey('employees.id'), nullable=False, index=True)
+    # Trên MySQL bảng được phân vùng theo YEAR(work_date) nên FK thật bị bỏ
+    # (xem migration c41e8d2a6b95); ràng buộc vẫn giữ ở ORM qua cascade của Employee.absences
+    # active_history (cả work_date): như TaskAssessment, get_history luôn có nhân viên / ngày cũ
+    employee_id = column_property(Column(Integer, ForeignKey('employees.id'), nullable=False, index=True),
+                                  active_history=True)
 
     # Dùng Date + default là callable date.today (mỗi lần insert lấy ngày hiện tại)
-    work_date   = Column(Date, nullable=False, index=True, default=date.today)
+    work_date   = column_property(Column(Date, nullable=False, default=date.today), active_history=True)
 
     part = Column(SAEnum(AbsencePart), nullable=False, default=AbsencePart.FULL)
     is_permitted = Column(Boolean, nullable=False, default=False)
@@ -228,10 +358,109 @@ class Absence(BaseModel):
     employee = relationship('Employee', back_populates='absences', lazy='joined')
 
     __table_args__ = (
+        # Cũng là index cho tra cứu theo nhân viên + khoảng ngày
         UniqueConstraint('employee_id', 'work_date', 'part', name='uq_abs_employee_date_part'),
+        # Tổng hợp theo ngày/tháng cho toàn cơ quan (KPI, bộ đếm, chuyên cần hôm nay) chỉ đọc index;
+        # thay cho index đơn trên work_date
+        Index('ix_abs_date_emp_cover', 'work_date', 'employee_id', 'part', 'is_permitted'),
     )
 
     def __str__(self):
         label = "Có phép" if self.is_permitted else "Không phép"
         return f"{self.employee_id} - {self.work_date} - {self.part.value} - {label}"
-    
\ No newline at end of file
+    
+
+# ==== KPI tổng hợp hàng tháng (chuyên cần + đánh giá) ====
+class MonthlyKpi(BaseModel):
+    __tablename__ = 'monthly_kpis'
+
+    employee_id = Column(Integer, ForeignKey('employees.id', ondelete="CASCADE"), nullable=False)
+    year  = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+
+    # Số liệu chuyên cần trong tháng
+    total_days_off       = Column(Float, nullable=False, default=0)
+    permitted_days_off   = Column(Float, nullable=False, default=0)
+    unpermitted_days_off = Column(Float, nullable=False, default=0)
+
+    attendance_score = Column(Float, nullable=False)
+    assessment_score = Column(Float, nullable=True)   # NULL = chưa có đánh giá trong tháng
+    composite_score  = Column(Float, nullable=False)
+
+    # Trọng số dùng khi tính (lưu lại để đối chiếu nếu cấu hình thay đổi)
+    attendance_weight = Column(Float, nullable=False)
+    assessment_weight = Column(Float, nullable=False)
+
+    is_frozen   = Column(Boolean, nullable=False, default=False)  # đã chốt tháng
+    is_dirty    = Column(Boolean, nullable=False, default=False)  # dữ liệu nguồn đổi sau khi tính
+    computed_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    employee = relationship('Employee', lazy=True)
+
+    __table_args__ = (
+        UniqueConstraint('employee_id', 'year', 'month', name='uq_kpi_employee_year_month'),
+        Index('ix_kpi_year_month', 'year', 'month'),
+    )
+
+    def __str__(self):
+        return f"{self.employee_id} - {self.month:02d}/{self.year} - {self.composite_score}"
+
+
+# ==== Nhật ký thay đổi (change feed cho hệ thống khác đồng bộ) ====
+class ChangeLog(db.Model):
+    __tablename__ = 'change_log'
+
+    # id tăng dần = token đồng bộ
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    resource = Column(String(20), nullable=False)   # employees / absences / histories / assessments
+    row_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)          # I / U / D
+    changed_at = Column(DateTime, nullable=False, default=datetime.now, index=True)
+
+    __table_args__ = (
+        Index('ix_change_resource_row', 'resource', 'row_id'),
+    )
+
+
+# ==== Bộ đếm theo phòng (phi chuẩn hóa, xem app/counters.py) ====
+class DepartmentCounter(db.Model):
+    __tablename__ = 'department_counters'
+
+    department_id = Column(Integer, primary_key=True, autoincrement=False)  # 0 = chưa phân tổ
+    # Sĩ số: tên OrgRole (MEMBER / TEAM_LEAD / DEPT_HEAD), period = ''
+    # Ngày nghỉ: 'permitted' / 'unpermitted', period = 'yyyy-mm'
+    metric = Column(String(20), primary_key=True)
+    period = Column(String(7), primary_key=True, default='')
+    value = Column(Float, nullable=False, default=0)
+
+
+# ==== Hàng đợi công việc nền (xem app/jobs.py, chạy bằng `flask worker`) ====
+class Job(BaseModel):
+    __tablename__ = 'jobs'
+
+    kind = Column(String(50), nullable=False)          # tên task đã đăng ký, vd. kpi.compute
+    payload = Column(Text, nullable=False, default='{}')   # JSON tham số (sort_keys -> so trùng được)
+    # queued -> running -> done / failed (hết lượt thử) / cancelled
+    status = Column(String(10), nullable=False, default='queued')
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, nullable=False, default=datetime.now)   # lùi lại khi thử lại
+    progress = Column(Float, nullable=False, default=0)   # 0..1
+    progress_note = Column(String(200), nullable=True)
+    result = Column(Text, nullable=True)                  # JSON giá trị trả về
+    error = Column(Text, nullable=True)                   # traceback lần lỗi gần nhất
+    worker = Column(String(64), nullable=True)            # host:pid của worker đang chạy
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_by = Column(Integer, ForeignKey('users.id', ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    user = relationship('User', lazy=True)
+
+    __table_args__ = (
+        Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} ({self.status})"
@@ -0,0 +1,144 @@
+# app/plans.py
+# Kiểm tra kế hoạch truy vấn (flask plans check): chạy các trang / hàm "nóng" trên dữ liệu
+# hiện có, ghi lại mọi câu SELECT, chạy EXPLAIN cho từng câu và báo lỗi nếu có câu
+# quét toàn bảng hoặc phải sắp xếp tạm (filesort) — dùng sau mỗi migration / đổi truy vấn.
+# Hỗ trợ MySQL (EXPLAIN) và SQLite (EXPLAIN QUERY PLAN).
+import re
+from datetime import date
+from urllib.parse import quote
+from flask import current_app
+from sqlalchemy import event, select, func
+from . import db, cache
+from .models import Employee, Department, User, SystemRole, Absence, Team
+
+# Bảng nhỏ (vài chục dòng) được phép quét toàn bộ
+SMALL_TABLES = {"departments", "department_counters", "users", "teams"}
+
+# Câu được chấp nhận dù có sắp xếp tạm: tên -> (mẫu đầu câu SQL, lý do)
+ALLOWED = {
+    "utils.assessment_analytics": (
+        re.compile(r"^SELECT anon_1\.employee_id, anon_1\.latest_score"),
+        "cume_dist() theo phòng chạy trên kết quả đã gộp, 1 dòng / nhân viên"),
+    "api keyset": (
+        re.compile(r"^SELECT absences\.id, .* WHERE absences\.employee_id IN .* ORDER BY absences\.id LIMIT"),
+        "chỉ sắp xếp các dòng đã lọc theo nhân viên bằng index"),
+    "lọc theo tổ": (
+        re.compile(r"^SELECT employees\.id .* JOIN team_closure ON .* WHERE team_closure\.ancestor_id = \? ORDER BY"),
+        "nhân viên của cả nhánh (nhiều tổ) lấy qua index team_closure + team_id, chỉ sắp xếp các dòng đó"),
+}
+
+
+def scenarios():
+    """(tên, hàm nhận test client) — các đường đọc chính của utils / routes / admin / api."""
+    today = date.today()
+    emp_id = db.session.scalar(select(Absence.employee_id).order_by(Absence.id.desc()).limit(1)) \
+        or db.session.scalar(select(Employee.id).limit(1))
+    dep_id = db.session.scalar(select(Department.id).order_by(Department.id).limit(1))
+    last = db.session.scalar(select(func.max(Absence.work_date))) or today
+    month = f"{last.month:02d}-{last.year}"
+    team_id = db.session.scalar(select(Team.id).where(Team.parent_id.is_(None)).limit(1))
+    # 2 từ đầu trong tên của 1 nhân viên, từ sau chỉ gõ 2 ký tự đầu (tìm theo tiền tố)
+    words = (db.session.scalar(select(Employee.name).where(Employee.id == emp_id)) or "a").split()
+    search = " ".join(words[:1] + [w[:2] for w in words[1:2]])
+
+    def get(url):
+        return lambda c: c.get(url)
+
+    by_team = [("kpi summary by team", get(f"/summary/all?month={month}&team_id={team_id}"))] if team_id else []
+    return by_team + [
+        ("index", get("/")),
+        ("employees", get("/employees")),
+        ("employees by department", get(f"/employees?category_id={dep_id}")),
+        ("employee detail", get(f"/employees/{emp_id}")),
+        ("kpi summary", get(f"/summary/all?month={month}")),
+        ("kpi summary by department", get(f"/summary/all?month={month}&department_id={dep_id}")),
+        ("kpi detail", get(f"/kpi_detail/{emp_id}?month={month}")),
+        ("batch assessment", get("/assessments/batch")),
+        ("admin employees", get("/admin/employee/")),
+        ("admin employee search", get(f"/admin/employee/?search={quote(search)}")),
+        ("admin absences", get("/admin/absence/")),
+        ("api absences of employee", get(f"/api/v1/absences?employee_ids={emp_id}"
+                                         f"&from={last.replace(day=1)}&to={last}")),
+        ("api histories", get(f"/api/v1/histories?employee_ids={emp_id}")),
+    ]
+
+
+def explain(conn, sql, params):
+    """
+    Các dòng kế hoạch truy vấn (chuỗi) + danh sách vấn đề phát hiện được.
+    Danh sách phân trang không lọc (LIMIT, không WHERE) chỉ đọc N dòng đầu -> không tính là quét toàn bảng.
+    """
+    problems = []
+    tables = set(db.metadata.tables) - SMALL_TABLES
+    flat = " ".join(sql.split()).upper()
+    paged_listing = " LIMIT " in flat and " WHERE " not in flat
+    if conn.dialect.name == "mysql":
+        rows = conn.exec_driver_sql("EXPLAIN " + sql, params).mappings().all()
+        lines = [f"{r['table']}: type={r['type']} key={r['key']} extra={r['Extra']}" for r in rows]
+        for r in rows:
+            if r["type"] == "ALL" and r["table"] in tables and not paged_listing:
+                problems.append(f"quét toàn bảng {r['table']}")
+            if "filesort" in (r["Extra"] or ""):
+                problems.append(f"filesort trên {r['table']}")
+    else:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).all()
+        lines = [r[-1] for r in rows]
+        for detail in lines:
+            m = re.match(r"SCAN (\w+)", detail)
+            if m and "INDEX" not in detail and m.group(1) in tables and not paged_listing:
+                problems.append(f"quét toàn bảng {m.group(1)}")
+            if "TEMP B-TREE FOR ORDER BY" in detail:
+                problems.append("sắp xếp tạm (ORDER BY không theo index)")
+    return lines, problems
+
+
+def _allowed(sql):
+    flat = " ".join(sql.split())
+    return any(pattern.match(flat) for pattern, _ in ALLOWED.values())
+
+
+def check(echo=print):
+    """Chạy các kịch bản, EXPLAIN mọi câu SELECT đã ghi lại. Trả về số câu có vấn đề."""
+    app = current_app._get_current_object()
+    admin_id = db.session.scalar(select(User.id).where(User.role == SystemRole.ADMIN).limit(1))
+    if admin_id is None:
+        raise RuntimeError("Cần ít nhất 1 tài khoản ADMIN để chạy các trang.")
+
+    captured = {}    # sql -> (kịch bản, params)
+    current = {"name": None}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            captured.setdefault(statement, (current["name"], parameters))
+
+    engine = db.engine
+    runs = scenarios()
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["_user_id"] = str(admin_id)
+        s["_fresh"] = True
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for name, run in runs:
+            current["name"] = name
+            cache.backend().clear()   # không để cache che mất truy vấn
+            resp = run(client)
+            if resp.status_code >= 400:
+                echo(f"[{name}] HTTP {resp.status_code}")
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    failed = 0
+    with engine.connect() as conn:
+        for sql, (name, params) in captured.items():
+            if _allowed(sql):
+                continue
+            lines, problems = explain(conn, sql, params)
+            if problems:
+                failed += 1
+                echo(f"FAIL [{name}] {'; '.join(sorted(set(problems)))}")
+                echo("  " + " ".join(sql.split()))
+                for line in lines:
+                    echo("    " + line)
+    echo(f"Đã kiểm tra {len(captured)} câu truy vấn, {failed} câu có vấn đề.")
+    return failed
@@ -0,0 +1,224 @@
+# app/profiler.py
+# Profiler lấy mẫu theo yêu cầu cho route đang chạy thật (ADMIN bật ở /admin/profiler/):
+#   - chọn 1 endpoint (vd. main.kpi_absence_summary_all, employee.edit_view) hoặc mọi route,
+#     tỉ lệ request được đo (0..1) và số giây; hết giờ tự tắt
+#   - 1 luồng nền mỗi PROFILER_INTERVAL_MS đọc stack (sys._current_frames) của các luồng đang phục
+#     vụ request được chọn, cộng dồn theo stack -> dữ liệu flame graph dạng "folded"
+#     (flamegraph.pl, speedscope.app, inferno đọc được), gốc mỗi stack là tên endpoint
+#   - thời gian SQL: mẫu rơi vào lúc đang chạy câu SQL được cắt ở frame đầu tiên của SQLAlchemy và
+#     gắn lá "[SQL SELECT bảng]" -> thấy dòng code nào của route gọi câu SQL; tổng số câu / thời
+#     gian SQL của từng route đo bằng event của Engine
+# Khi tắt không tốn gì: signal request_started / request_tearing_down và event SQL chỉ được gắn
+# trong lúc có phiên đo, gỡ ra khi dừng. Số liệu là của process đang phục vụ request bật phiên đo
+# (gunicorn nhiều worker: mỗi worker profile riêng).
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime
+from flask import request, request_started, request_tearing_down
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_lock = threading.Lock()
+_current = None             # ProfileSession đang chạy, None = tắt
+_history = deque(maxlen=5)  # các phiên đã xong (mới nhất cuối)
+
+_SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+[`"\[]?(\w+)', re.IGNORECASE)
+# Frame đầu tiên thuộc các gói này (tính từ route) là chỗ bắt đầu câu SQL
+_SQL_MODULES = ("sqlalchemy.", "flask_sqlalchemy.", "pymysql.", "sqlite3")
+
+
+class ProfileSession:
+    """1 phiên đo: cấu hình + các stack đã gom + số liệu theo route."""
+    def __init__(self, endpoint, rate, seconds, interval_ms, started_by):
+        self.id = uuid.uuid4().hex[:8]
+        self.endpoint = endpoint or None   # None = mọi route
+        self.rate = rate
+        self.seconds = seconds
+        self.interval = interval_ms / 1000
+        self.started_by = started_by
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.deadline = time.monotonic() + seconds
+        self.stacks = Counter()   # "endpoint;frame;...;frame" -> số mẫu
+        self.routes = {}          # endpoint -> {requests, wall, sql_count, sql_time, samples}
+        # thread id -> [endpoint, nhãn SQL đang chạy | None, lúc bắt đầu câu SQL, lúc bắt đầu request]
+        self.active = {}
+        self.stopped = threading.Event()
+
+    @property
+    def running(self):
+        return not self.stopped.is_set()
+
+    def route(self, endpoint):
+        return self.routes.setdefault(endpoint, {"requests": 0, "wall": 0.0, "sql_count": 0,
+                                                 "sql_time": 0.0, "samples": 0})
+
+    def total_samples(self):
+        return sum(self.stacks.values())
+
+
+# --- Bật / tắt ---
+def current():
+    return _current
+
+def history():
+    """Các phiên gần đây, mới nhất trước (gồm cả phiên đang chạy)."""
+    sessions = list(_history)
+    if _current is not None:
+        sessions.append(_current)
+    return sessions[::-1]
+
+def find(session_id):
+    return next((s for s in history() if s.id == session_id), None)
+
+def start(app, endpoint=None, rate=1.0, seconds=30, started_by=None):
+    """Bắt đầu 1 phiên đo (chỉ 1 phiên 1 lúc); trả về ProfileSession."""
+    global _current
+    seconds = min(max(seconds, 1), app.config.get('PROFILER_MAX_SECONDS', 300))
+    rate = min(max(rate, 0.0), 1.0)
+    with _lock:
+        if _current is not None:
+            raise RuntimeError("Đang có phiên profile chạy, dừng phiên đó trước.")
+        session = _current = ProfileSession(endpoint, rate, seconds,
+                                            app.config.get('PROFILER_INTERVAL_MS', 5), started_by)
+    request_started.connect(_on_request_started, app, weak=False)
+    request_tearing_down.connect(_on_request_finished, app, weak=False)
+    event.listen(Engine, "before_cursor_execute", _before_sql)
+    event.listen(Engine, "after_cursor_execute", _after_sql)
+    threading.Thread(target=_sample, args=(session, app), name="profiler", daemon=True).start()
+    return session
+
+def stop(app=None):
+    """Dừng phiên đang chạy (nếu có), gỡ mọi hook; trả về phiên vừa dừng."""
+    global _current
+    with _lock:
+        session, _current = _current, None
+        if session is None:
+            return None
+        session.stopped.set()
+        session.finished_at = datetime.now()
+        _history.append(session)
+    request_started.disconnect(_on_request_started)
+    request_tearing_down.disconnect(_on_request_finished)
+    event.remove(Engine, "before_cursor_execute", _before_sql)
+    event.remove(Engine, "after_cursor_execute", _after_sql)
+    return session
+
+
+# --- Hook (chỉ được gắn trong lúc đo) ---
+def _on_request_started(sender, **extra):
+    session = _current
+    endpoint = request.endpoint
+    if (session is None or endpoint is None or endpoint.startswith("profiler.")
+            or (session.endpoint and endpoint != session.endpoint) or random.random() >= session.rate):
+        return
+    session.active[threading.get_ident()] = [endpoint, None, 0.0, time.perf_counter()]
+
+def _on_request_finished(sender, **extra):
+    session = _current
+    state = session.active.pop(threading.get_ident(), None) if session else None
+    if state is None:
+        return
+    stats = session.route(state[0])
+    stats["requests"] += 1
+    stats["wall"] += time.perf_counter() - state[3]
+
+def _sql_label(statement):
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+    table = _SQL_TABLE.search(statement)
+    return f"[SQL {verb} {table.group(1)}]" if table else f"[SQL {verb}]"
+
+def _before_sql(conn, cursor, statement, parameters, context, executemany):
+    session = _current
+    state = session.active.get(threading.get_ident()) if session else None
+    if state is not None:
+        state[1], state[2] = _sql_label(statement), time.perf_counter()
+
+def _after_sql(conn, cursor, statement, parameters, context, executemany):
+    session = _current
+    state = session.active.get(threading.get_ident()) if session else None
+    if state is None or state[1] is None:
+        return
+    stats = session.route(state[0])
+    stats["sql_count"] += 1
+    stats["sql_time"] += time.perf_counter() - state[2]
+    state[1] = None
+
+
+# --- Luồng lấy mẫu ---
+def _frame_name(frame):
+    module = frame.f_globals.get('__name__')
+    if module is None:   # code của template Jinja: dùng tên file template
+        module = os.path.basename(frame.f_code.co_filename)
+    return f"{module}:{frame.f_code.co_qualname}"
+
+def _folded(frame, sql_label):
+    """Stack từ frame xử lý request tới lá (bỏ phần server / WSGI phía trên Flask)."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        if frame.f_code.co_name == "full_dispatch_request":
+            break
+        frame = frame.f_back
+    names.reverse()
+    if sql_label:
+        cut = next((i for i, n in enumerate(names) if n.startswith(_SQL_MODULES)), len(names))
+        names = names[:cut] + [sql_label]
+    return names
+
+def _sample(session, app):
+    me = threading.get_ident()
+    while not session.stopped.wait(session.interval):
+        if time.monotonic() >= session.deadline:
+            stop(app)
+            return
+        if not session.active:
+            continue
+        frames = sys._current_frames()
+        for tid, state in list(session.active.items()):
+            frame = frames.get(tid)
+            if frame is None or tid == me:
+                continue
+            endpoint, sql_label = state[0], state[1]
+            session.stacks[";".join([endpoint] + _folded(frame, sql_label))] += 1
+            session.route(endpoint)["samples"] += 1
+        del frames
+
+
+# --- Kết quả ---
+def folded(session, endpoint=None):
+    """Văn bản "stack số_mẫu" mỗi dòng (định dạng folded của flamegraph.pl)."""
+    lines = [f"{stack} {n}" for stack, n in sorted(session.stacks.items())
+             if endpoint is None or stack.split(";", 1)[0] == endpoint]
+    return "\n".join(lines) + "\n"
+
+def route_rows(session):
+    """[(endpoint, số liệu)] sắp theo số mẫu giảm dần; thời gian đổi sang ms."""
+    rows = []
+    for endpoint, s in session.routes.items():
+        n = s["requests"]
+        rows.append((endpoint, {
+            "requests": n, "samples": s["samples"],
+            "avg_ms": s["wall"] / n * 1000 if n else None,
+            "sql_count": s["sql_count"], "sql_ms": s["sql_time"] * 1000,
+            "sql_share": s["sql_time"] / s["wall"] if s["wall"] else None,
+        }))
+    return sorted(rows, key=lambda r: -r[1]["samples"])
+
+def top_frames(session, limit=20):
+    """[(frame, mẫu tự thân, mẫu gộp)] — tự thân = frame là lá của stack."""
+    own, total = Counter(), Counter()
+    for stack, n in session.stacks.items():
+        frames = stack.split(";")[1:]
+        if not frames:
+            continue
+        own[frames[-1]] += n
+        for name in set(frames):
+            total[name] += n
+    return [(name, n, total[name]) for name, n in own.most_common(limit)]
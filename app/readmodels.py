@@ -0,0 +1,105 @@
+# app/readmodels.py
+# Read model cho các trang danh sách / KPI / xuất file: tuple có tên dựng thẳng từ dòng kết quả
+# chỉ gồm các cột cần hiển thị. Không qua identity map, không trạng thái quan hệ, không
+# selectin absences như khi lấy nguyên đối tượng Employee — chỉ dùng để đọc, không sửa / commit.
+from datetime import datetime, date
+from typing import NamedTuple, Optional
+from sqlalchemy import select
+from . import db
+from .models import Employee, Department, EmployeeHistory, MonthlyKpi, OrgRole, TeamClosure
+
+
+class EmployeeRow(NamedTuple):
+    id: int
+    name: str
+    position: str
+    email: Optional[str]
+    phone: Optional[str]
+    year_of_birth: Optional[datetime]
+    org_role: Optional[OrgRole]
+    department_id: Optional[int]
+    department_name: Optional[str]
+    avatar_url: Optional[str]
+
+# Thứ tự cột trùng thứ tự trường của EmployeeRow
+EMPLOYEE_COLUMNS = (Employee.id, Employee.name, Employee.position, Employee.email, Employee.phone,
+                    Employee.year_of_birth, Employee.org_role, Employee.department_id,
+                    Department.name, Employee.avatar_url)
+
+
+class KpiRow(NamedTuple):
+    """Cùng tên thuộc tính với MonthlyKpi (các chỗ đọc KPI dùng được cả hai)."""
+    employee_id: int
+    total_days_off: float
+    permitted_days_off: float
+    unpermitted_days_off: float
+    attendance_score: float
+    assessment_score: Optional[float]
+    composite_score: float
+    is_frozen: bool
+
+KPI_COLUMNS = tuple(getattr(MonthlyKpi, f) for f in KpiRow._fields)
+
+
+class KpiSummaryRow(NamedTuple):
+    """1 dòng trang KPI tổng quan."""
+    employee: EmployeeRow
+    total: float
+    permitted: float
+    unpermitted: float
+    kpi_score: float
+    composite_score: float
+    is_frozen: bool
+    assessment: Optional[object]   # dòng của utils.assessment_analytics hoặc None
+
+
+class HistoryRow(NamedTuple):
+    id: int
+    employee_id: int
+    effective_from: date
+    effective_to: Optional[date]
+    department_id: Optional[int]
+    position: Optional[str]
+    org_role: Optional[OrgRole]
+    change_type: Optional[str]
+    reason: Optional[str]
+
+HISTORY_COLUMNS = tuple(getattr(EmployeeHistory, f) for f in HistoryRow._fields)
+
+
+def employee_query(keyword=None, department_id=None, employee_ids=None, team_id=None):
+    """
+    Query (có .paginate của Flask-SQLAlchemy) trả về dòng theo EMPLOYEE_COLUMNS; đổi bằng employees().
+    team_id: nhân viên của tổ đó và mọi tổ con (join bảng bao đóng team_closure).
+    """
+    q = (db.session.query(*EMPLOYEE_COLUMNS)
+         .outerjoin(Department, Department.id == Employee.department_id))
+    if keyword:
+        q = q.filter(Employee.name.ilike(f"%{keyword.strip()}%"))
+    if department_id:
+        q = q.filter(Employee.department_id == department_id)
+    if team_id:
+        q = (q.join(TeamClosure, TeamClosure.descendant_id == Employee.team_id)
+             .filter(TeamClosure.ancestor_id == team_id))
+    if employee_ids:
+        q = q.filter(Employee.id.in_(list(employee_ids)))
+    return q
+
+def employees(rows):
+    return [EmployeeRow._make(r) for r in rows]
+
+def kpi_rows(rows):
+    """Dòng có các cột tên như KpiRow (monthly_kpis hoặc kpi._kpi_select) -> {employee_id: KpiRow}."""
+    result = {}
+    for r in rows:
+        m = r._mapping
+        row = KpiRow._make(m[f] for f in KpiRow._fields)
+        result[row.employee_id] = row
+    return result
+
+def histories(employee_id):
+    """Các kỳ lịch sử (mới nhất trước) của 1 nhân viên."""
+    rows = db.session.execute(
+        select(*HISTORY_COLUMNS).where(EmployeeHistory.employee_id == employee_id)
+        .order_by(EmployeeHistory.effective_from.desc(), EmployeeHistory.id.desc()))
+    return [HistoryRow._make(r) for r in rows]
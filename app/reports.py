@@ -0,0 +1,249 @@
+# app/reports.py
+# Báo cáo tháng theo mẫu "Phụ lục 4" (xlsx), sinh sẵn khi chốt tháng và lưu theo phiên bản.
+import hashlib
+import json
+import os
+from calendar import monthrange
+from contextlib import contextmanager
+from copy import copy
+from datetime import date, datetime
+from flask import current_app
+from . import db, kpi, readmodels
+from .models import Department, OrgRole
+
+TEMPLATE_NAME = "Phụ lục 4-06.8.2025.xlsx"
+HEADER_ROWS = 11          # dòng 1..11: tiêu đề + tên cột
+SUMMARY_ROW = 12          # dòng "A - Văn phòng Đăng ký tỉnh"
+GROUP_STYLE_ROW = 13      # dòng nhóm (I, II, ...)
+EMPLOYEE_STYLE_ROW = 14   # dòng nhân viên
+LAST_COL = 21             # cột U (Ghi chú)
+
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X",
+         "XI", "XII", "XIII", "XIV", "XV", "XVI", "XVII", "XVIII", "XIX", "XX"]
+
+# Thứ tự trong mỗi phòng: lãnh đạo trước
+ROLE_ORDER = {OrgRole.DEPT_HEAD: 0, OrgRole.TEAM_LEAD: 1, OrgRole.MEMBER: 2}
+
+
+def template_path():
+    return current_app.config.get('REPORT_TEMPLATE') or \
+        os.path.join(os.path.dirname(current_app.root_path), TEMPLATE_NAME)
+
+def reports_dir():
+    return current_app.config.get('REPORT_DIR') or os.path.join(current_app.instance_path, 'reports')
+
+def _scope_name(department_id):
+    return f"dept-{department_id}" if department_id else "all"
+
+def _month_dir(year, month, department_id):
+    return os.path.join(reports_dir(), _scope_name(department_id), f"{year:04d}-{month:02d}")
+
+def _load_manifest(folder):
+    path = os.path.join(folder, "manifest.json")
+    if not os.path.exists(path):
+        return {"versions": []}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_manifest(folder, manifest):
+    tmp = os.path.join(folder, "manifest.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(folder, "manifest.json"))
+
+
+def fingerprint(year: int, month: int, department_id=None, groups=None) -> str:
+    """
+    Dấu vân tay dữ liệu của báo cáo = hash đúng các giá trị được in ra: phòng, tên, ngày sinh,
+    chức vụ, vai trò, ngày nghỉ và KPI tổng hợp (gồm cả điểm đánh giá) của từng người.
+    Đổi tên / vai trò, thêm ngày nghỉ hay đánh giá... đều đổi giá trị.
+    groups: kết quả _report_rows đã có (tránh đọc lại khi vừa dùng để sinh báo cáo).
+    """
+    if groups is None:
+        groups = _report_rows(year, month, department_id)
+    h = hashlib.sha1()
+    for dep_name, members in groups:
+        h.update(repr(dep_name).encode())
+        for e, k in members:
+            row = (e.name, e.year_of_birth, e.position, e.org_role and e.org_role.name,
+                   k and (k.permitted_days_off, k.unpermitted_days_off, k.composite_score))
+            h.update(repr(row).encode())
+    return h.hexdigest()
+
+@contextmanager
+def _manifest_lock(folder):
+    """Khóa file giữa các process (web, flask worker, cron) trong lúc sinh bản mới + ghi manifest."""
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "manifest.lock"), "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _report_rows(year, month, department_id):
+    """Danh sách (tên phòng, [nhân viên + KPI]) theo thứ tự trong báo cáo."""
+    employees = readmodels.employees(readmodels.employee_query(department_id=department_id))
+    kpis = kpi.get_monthly_kpis([e.id for e in employees], year, month)
+
+    groups = {}
+    for e in employees:
+        groups.setdefault(e.department_name or "Chưa phân tổ", []).append(e)
+    result = []
+    for name in sorted(groups):
+        members = sorted(groups[name], key=lambda e: (ROLE_ORDER.get(e.org_role, 9), e.name))
+        result.append((name, [(e, kpis.get(e.id)) for e in members]))
+    return result
+
+def _copy_row_style(ws, src_styles, row, height=None):
+    for col, style in enumerate(src_styles, start=1):
+        ws.cell(row=row, column=col)._style = copy(style)
+    if height:
+        ws.row_dimensions[row].height = height
+
+def render_report(year: int, month: int, department_id=None, path=None, groups=None):
+    """Điền mẫu Phụ lục 4 cho tháng / phòng và lưu ra `path`."""
+    from openpyxl import load_workbook   # chỉ nạp khi thật sự sinh báo cáo
+
+    wb = load_workbook(template_path())
+    for extra in wb.worksheets[1:]:
+        wb.remove(extra)
+    ws = wb.worksheets[0]
+
+    # Lưu lại định dạng các dòng mẫu rồi xóa toàn bộ dữ liệu cũ
+    summary_style = [ws.cell(SUMMARY_ROW, c)._style for c in range(1, LAST_COL + 1)]
+    group_style = [ws.cell(GROUP_STYLE_ROW, c)._style for c in range(1, LAST_COL + 1)]
+    emp_style = [ws.cell(EMPLOYEE_STYLE_ROW, c)._style for c in range(1, LAST_COL + 1)]
+    emp_height = ws.row_dimensions[EMPLOYEE_STYLE_ROW].height
+    footer_row = next((r for r in range(ws.max_row, HEADER_ROWS, -1)
+                       if ws.cell(r, 2).value == "Tổng cộng"), None)
+    footer_styles = []
+    if footer_row:
+        footer_styles = [[ws.cell(r, c)._style for c in range(1, LAST_COL + 1)]
+                         for r in range(footer_row, footer_row + 3)]
+
+    for rng in list(ws.merged_cells.ranges):
+        if rng.min_row > HEADER_ROWS:
+            ws.unmerge_cells(str(rng))
+    ws.delete_rows(HEADER_ROWS + 1, ws.max_row - HEADER_ROWS)
+    # Các ô tính phụ bên phải vùng in (cột W..) không dùng nữa
+    for row in ws.iter_rows(min_row=1, max_row=HEADER_ROWS, min_col=LAST_COL + 2):
+        for cell in row:
+            cell.value = None
+
+    end_day = date(year, month, monthrange(year, month)[1])
+    ws.cell(6, 1).value = f"(Số liệu thống kê cập nhật tính đến ngày {end_day.strftime('%d/%m/%Y')})"
+
+    if groups is None:
+        groups = _report_rows(year, month, department_id)
+    total = sum(len(members) for _, members in groups)
+
+    r = SUMMARY_ROW
+    _copy_row_style(ws, summary_style, r)
+    ws.cell(r, 1).value = "A"
+    ws.cell(r, 2).value = groups[0][0] if department_id and groups else "Văn phòng Đăng ký đất đai"
+    ws.cell(r, 10).value = total
+
+    for gi, (dep_name, members) in enumerate(groups):
+        r += 1
+        _copy_row_style(ws, group_style, r)
+        ws.cell(r, 1).value = ROMAN[gi] if gi < len(ROMAN) else str(gi + 1)
+        ws.cell(r, 2).value = dep_name
+        ws.cell(r, 10).value = len(members)
+
+        for i, (e, k) in enumerate(members, start=1):
+            r += 1
+            _copy_row_style(ws, emp_style, r, emp_height)
+            ws.cell(r, 1).value = i
+            ws.cell(r, 2).value = e.name
+            ws.cell(r, 3).value = e.year_of_birth.strftime('%d/%m/%Y') if e.year_of_birth else None
+            ws.cell(r, 10).value = e.position
+            ws.cell(r, 11).value = e.org_role.value if e.org_role else None
+            if k is not None:
+                ws.cell(r, 21).value = (f"Nghỉ có phép: {k.permitted_days_off:g}; "
+                                        f"không phép: {k.unpermitted_days_off:g}; "
+                                        f"KPI: {k.composite_score:g}")
+
+    # Dòng tổng + chữ ký
+    r += 1
+    if footer_styles:
+        for offset, styles in enumerate(footer_styles):
+            _copy_row_style(ws, styles, r + offset)
+    ws.cell(r, 2).value = "Tổng cộng"
+    ws.cell(r, 10).value = total
+    ws.merge_cells(start_row=r, start_column=2, end_row=r, end_column=3)
+    ws.cell(r + 1, 14).value = f"Đắk Lắk, ngày {end_day.day:02d} tháng {month:02d} năm {year}"
+    ws.merge_cells(start_row=r + 1, start_column=14, end_row=r + 1, end_column=20)
+    ws.cell(r + 2, 2).value = "Người lập"
+    ws.cell(r + 2, 14).value = "Thủ trưởng đơn vị"
+    ws.merge_cells(start_row=r + 2, start_column=2, end_row=r + 2, end_column=3)
+    ws.merge_cells(start_row=r + 2, start_column=14, end_row=r + 2, end_column=19)
+
+    wb.save(path)
+    return path
+
+
+def latest_report(year: int, month: int, department_id=None):
+    """Bản mới nhất (dict trong manifest) hoặc None."""
+    versions = _load_manifest(_month_dir(year, month, department_id))["versions"]
+    return versions[-1] if versions else None
+
+def report_file(year: int, month: int, department_id=None, entry=None):
+    entry = entry or latest_report(year, month, department_id)
+    return os.path.join(_month_dir(year, month, department_id), entry["file"]) if entry else None
+
+def current_report(year: int, month: int, department_id=None):
+    """File của bản mới nhất nếu dữ liệu nguồn chưa đổi từ lúc sinh, không thì None."""
+    latest = latest_report(year, month, department_id)
+    if latest is None or latest["fingerprint"] != fingerprint(year, month, department_id):
+        return None
+    path = report_file(year, month, department_id, latest)
+    return path if os.path.exists(path) else None
+
+def generate_report(year: int, month: int, department_id=None, force=False):
+    """
+    Sinh bản mới nếu dữ liệu nguồn đã đổi so với bản mới nhất (hoặc force).
+    Trả về (đường dẫn file, True nếu vừa sinh mới).
+    Chạy trong khóa của thư mục tháng: 2 lần sinh cùng lúc không ghi đè manifest của nhau,
+    lần sau thấy bản vừa sinh đã khớp thì dùng luôn.
+    """
+    folder = _month_dir(year, month, department_id)
+    groups = _report_rows(year, month, department_id)
+    fp = fingerprint(year, month, department_id, groups)
+    with _manifest_lock(folder):
+        manifest = _load_manifest(folder)
+        latest = manifest["versions"][-1] if manifest["versions"] else None
+        if latest and latest["fingerprint"] == fp and not force \
+                and os.path.exists(os.path.join(folder, latest["file"])):
+            return os.path.join(folder, latest["file"]), False
+
+        version = (latest["version"] + 1) if latest else 1
+        filename = f"v{version}.xlsx"
+        tmp = os.path.join(folder, filename + ".tmp")
+        render_report(year, month, department_id, tmp, groups)
+        os.replace(tmp, os.path.join(folder, filename))
+
+        manifest["versions"].append({
+            "version": version, "file": filename, "fingerprint": fp,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        _save_manifest(folder, manifest)
+    return os.path.join(folder, filename), True
+
+def generate_month_reports(year: int, month: int, force=False):
+    """Sinh báo cáo toàn cơ quan + từng phòng (chỉ những bản có dữ liệu thay đổi)."""
+    results = [generate_report(year, month, None, force)]
+    for (dep_id,) in db.session.query(Department.id).order_by(Department.id):
+        results.append(generate_report(year, month, dep_id, force))
+    return sum(1 for _, created in results if created)
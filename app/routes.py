@@ -1,12 +1,15 @@
-from flask import Blueprint, render_template, request, current_app, abort, flash, redirect, url_for
+from flask import Blueprint, render_template, request, current_app, abort, flash, redirect, url_for, send_file, Response, session
 from flask_login import login_user, logout_user, current_user, login_required
-from app.models import Employee, Department, Absence, EmployeeHistory, TaskAssessment
-from . import db, utils, login
-from .forms import ProfileUpdateForm, TaskAssessmentForm
-from .utils import save_picture
+from app.models import Employee, Department, Absence, TaskAssessment, Job
+from . import db, utils, login, kpi, archive, reports, documents, live, counters, jobs, readmodels, shards, teams
+from .forms import ProfileUpdateForm, TaskAssessmentForm, BatchAssessmentForm
+from .dbrouting import replica_ok
+from .shards import office_ok
+import json
+import os
+import time
 from datetime import date
 from calendar import monthrange
-import os
 
 main = Blueprint('main', __name__)
 # Trong file routes của blueprint 'main'
@@ -40,48 +43,118 @@ def logout():
     return redirect(url_for('main.login'))
 
 
+def _can_view_live(user):
+    return user.can_manage_hr or bool(user.employee and user.employee.is_manager)
+
 @main.route('/')
 @login_required
 def index():
-    return render_template('index.html')
+    live_rows = None
+    if _can_view_live(current_user):
+        # Số liệu lấy từ bộ đếm trong bộ nhớ, chỉ truy vấn CSDL khi cần nạp lại
+        live.ensure_fresh(current_app.config.get('LIVE_RESYNC_SECONDS', 60))
+        _, live_rows = live.snapshot()
+    month_rows = None
+    if current_user.can_manage_hr:
+        # Sĩ số + ngày nghỉ trong tháng theo phòng, đọc từ bộ đếm (không quét employees/absences)
+        today = date.today()
+        totals = counters.absence_totals(today.year, today.month)
+        month_rows = [{"department": name, "headcount": n,
+                       "days_off": totals.get(dep_id, {}).get("total", 0.0)}
+                      for dep_id, name, n in counters.department_options()]
+    return render_template('index.html', live_rows=live_rows, month_rows=month_rows, today=date.today())
+
+@main.route('/live/today/stream')
+@login_required
+def live_today_stream():
+    """
+    Server-sent events: gửi bảng chuyên cần hôm nay mỗi khi số liệu đổi.
+    Mỗi stream giữ 1 luồng của server WSGI nên: đóng sau LIVE_STREAM_MAX_SECONDS (trình duyệt tự
+    kết nối lại sau `retry`), tối đa LIVE_MAX_STREAMS stream mỗi process — quá thì chỉ gửi số liệu
+    hiện tại rồi đóng ngay, trình duyệt hỏi lại sau LIVE_BUSY_RETRY_MS (thành polling).
+    """
+    if not _can_view_live(current_user):
+        abort(403)
+    app = current_app._get_current_object()
+    resync = app.config.get('LIVE_RESYNC_SECONDS', 60)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    live.ensure_fresh(resync)
+    if not live.open_stream(app.config.get('LIVE_MAX_STREAMS', 2)):
+        version, rows = live.snapshot()
+        busy = f"retry: {app.config.get('LIVE_BUSY_RETRY_MS', 30000)}\n\n" + live.sse_message(version, rows)
+        return Response(busy, mimetype='text/event-stream', headers=headers)
+
+    deadline = time.monotonic() + app.config.get('LIVE_STREAM_MAX_SECONDS', 60)
+
+    def generate():
+        last_rows = None
+        yield "retry: 5000\n\n"
+        while True:
+            with app.app_context():
+                live.ensure_fresh(resync)
+            version, rows = live.snapshot()
+            if rows != last_rows:
+                last_rows = rows
+                yield live.sse_message(version, rows)
+            else:
+                yield ": ping\n\n"   # giữ kết nối qua proxy
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            live.wait_for_change(version, timeout=min(15, remaining))
+
+    response = Response(generate(), mimetype='text/event-stream', headers=headers)
+    # call_on_close chạy cả khi client ngắt trước lúc generator bắt đầu
+    response.call_on_close(live.close_stream)
+    return response
 
 @main.route('/employees')
+@replica_ok
+@office_ok
 @login_required
 def list_employees():
     page = request.args.get('page', 1, type=int)
     kw = request.args.get('keyword', type=str)
     department_id = request.args.get('category_id', type=int)
 
-    q = Employee.query
-    if kw:
-        q = q.filter(Employee.name.ilike(f"%{kw.strip()}%"))
-    if department_id:
-        q = q.filter(Employee.department_id == department_id)
-
-    q = q.order_by(Employee.id.asc())
+    # Chỉ lấy các cột hiển thị (readmodels.EmployeeRow), không dựng đối tượng Employee
+    q = readmodels.employee_query(kw, department_id).order_by(Employee.id.asc())
 
     per_page = current_app.config.get('PAGE_SIZE', 10)
-    pagination = q.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = _paginate(q, page, per_page, department_id, counted=not kw)
+    pagination.items = readmodels.employees(pagination.items)
 
     return render_template(
         'employees.html',
         employees=pagination.items,
         pagination=pagination,
-        departments=Department.query.all(),
+        departments=counters.department_options(),
         selected_department=department_id
     )
 
+def _paginate(q, page, per_page, department_id, counted):
+    """Không tìm theo từ khóa: tổng số lấy từ bộ đếm theo phòng thay cho COUNT(*)."""
+    if not counted:
+        return q.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = q.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.total = counters.headcount(department_id)
+    return pagination
+
 @main.route("/employees/<int:employee_id>")
+@office_ok
 @login_required
 def employee_detail(employee_id):
     employee = utils.get_employee_by_id(employee_id)
-    histories = (EmployeeHistory.query
-                .filter_by(employee_id=employee_id)
-                .order_by(EmployeeHistory.effective_from.desc(),
-                        EmployeeHistory.id.desc())
-                .all())
     if not employee:
         abort(404)
+    histories = readmodels.histories(employee_id)
+    # Chỉ đọc file lưu trữ khi người dùng yêu cầu xem lịch sử cũ
+    show_archived = request.args.get('archived', type=int) == 1
+    has_archived = bool(archive.archived_years('employee_history'))
+    if show_archived:
+        histories = sorted(histories + archive.archived_histories(employee_id),
+                           key=lambda h: (h.effective_from, h.id), reverse=True)
 
     avatar_url = url_for(
         'static',
@@ -93,10 +166,13 @@ def employee_detail(employee_id):
     return render_template(
         'employees_details.html',
         employee=employee,
-        avatar_url=avatar_url, histories=histories, dep_name=dep_name
+        avatar_url=avatar_url, histories=histories, dep_name=dep_name,
+        show_archived=show_archived, has_archived=has_archived
     )
 
 @main.route('/summary/all', methods=['GET'])
+@replica_ok
+@office_ok
 @login_required
 def kpi_absence_summary_all():
     # Lấy các tham số từ URL
@@ -104,40 +180,41 @@ def kpi_absence_summary_all():
     month_str_param = request.args.get('month')  # 'MM-YYYY'
     kw = request.args.get('keyword', type=str)
     department_id = request.args.get('department_id', type=int)
+    team_id = request.args.get('team_id', type=int)
 
     # Xử lý tháng/năm và điều hướng
     y, m = utils.parse_month(month_str_param)
     prev_month_mm, next_month_mm = utils.ym_nav(y, m)
     month_str_mm = f"{m:02d}-{y}"
 
-    # Xây dựng câu truy vấn nhân viên với bộ lọc
-    q = db.session.query(Employee)
-    if kw:
-        q = q.filter(Employee.name.ilike(f"%{kw.strip()}%"))
-    if department_id:
-        q = q.filter(Employee.department_id == department_id)
+    # Xây dựng câu truy vấn nhân viên với bộ lọc (chỉ các cột hiển thị); lọc theo tổ gồm cả tổ con
+    q = readmodels.employee_query(kw, department_id, team_id=team_id)
 
-    pagination = q.order_by(Employee.name.asc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
-    employees = pagination.items
+    pagination = _paginate(q.order_by(Employee.name.asc()), page, 20, department_id,
+                           counted=not kw and not team_id)
+    employees = pagination.items = readmodels.employees(pagination.items)
 
     # Tính toán KPI cho các nhân viên đã lọc
+    assessments = utils.assessment_analytics(db.session, y, m)
+    # Ưu tiên KPI đã tính sẵn (monthly_kpis); thiếu hoặc dirty thì tính trực tiếp bằng 1 truy vấn
+    kpis = kpi.get_monthly_kpis([e.id for e in employees], y, m)
     rows = []
     for e in employees:
-        s = utils.absence_summary(db.session, e.id, y, m)
-        score = 100 - 2 * s["permitted_days_off"] - 10 * s["unpermitted_days_off"]
-        score = max(0, min(100, round(score, 2)))
-        rows.append({
-            "employee": e,
-            "total": s["total_days_off"],
-            "permitted": s["permitted_days_off"],
-            "unpermitted": s["unpermitted_days_off"],
-            "kpi_score": score
-        })
-
-    # Lấy danh sách phòng ban để hiển thị trong bộ lọc
-    departments = db.session.query(Department).order_by(Department.name).all()
+        k = kpis[e.id]
+        rows.append(readmodels.KpiSummaryRow(
+            employee=e,
+            total=k.total_days_off,
+            permitted=k.permitted_days_off,
+            unpermitted=k.unpermitted_days_off,
+            kpi_score=k.attendance_score,
+            composite_score=k.composite_score,
+            is_frozen=k.is_frozen,
+            assessment=assessments.get(e.id)))
+
+    # Danh sách phòng ban + sĩ số để hiển thị trong bộ lọc
+    departments = counters.department_options()
+    # KPI gộp cả nhánh của tổ đang lọc (1 câu GROUP BY trên bảng bao đóng)
+    team_kpi = teams.subtree_kpis(y, m, [team_id]).get(team_id) if team_id else None
 
     return render_template(
         'kpi/summary_all.html',
@@ -149,10 +226,113 @@ def kpi_absence_summary_all():
         pagination=pagination,
         departments=departments,
         keyword=kw,
-        selected_department=department_id
+        selected_department=department_id,
+        team_options=teams.team_options(),
+        selected_team=team_id,
+        team_kpi=team_kpi
     )
 
+@main.route('/reports/monthly', methods=['GET'])
+@login_required
+def monthly_report():
+    """Tải báo cáo Phụ lục 4 của tháng; dùng file đã sinh sẵn nếu dữ liệu chưa đổi."""
+    if not current_user.can_manage_hr:
+        abort(403)
+    y, m = utils.parse_month(request.args.get('month'))
+    department_id = request.args.get('department_id', type=int)
+    if current_user.is_hr_department:
+        # HR phòng chỉ được tải báo cáo phòng mình
+        department_id = current_user.employee.department_id if current_user.employee else None
+        if not department_id:
+            abort(403)
+
+    path = reports.current_report(y, m, department_id)
+    if path is None:
+        # Chưa có bản khớp dữ liệu hiện tại -> sinh ở worker nền (flask worker), không chặn request
+        jobs.enqueue("reports.generate", {"year": y, "month": m, "department_id": department_id},
+                     created_by=current_user.id, unique=True)
+        db.session.commit()
+        flash(f'Báo cáo tháng {m:02d}/{y} đang được sinh, vui lòng tải lại sau ít phút.', 'info')
+        return redirect(request.referrer or url_for('main.index'))
+    scope = f"phong-{department_id}" if department_id else "toan-co-quan"
+    return send_file(path, as_attachment=True,
+                     download_name=f"Phu-luc-4_{scope}_{m:02d}-{y}.xlsx")
+
+@main.route('/offices/summary', methods=['GET'])
+@login_required
+def offices_summary():
+    """Sĩ số + KPI tháng của từng văn phòng và toàn hệ thống (truy vấn song song mọi shard)."""
+    if not shards.can_switch(current_user):
+        abort(403)
+    y, m = utils.parse_month(request.args.get('month'))
+    prev_month_mm, next_month_mm = utils.ym_nav(y, m)
+    rows, total, errors = shards.org_summary(y, m)
+    return render_template('kpi/offices.html', rows=rows, total=total, errors=errors,
+                           year=y, month=m, prev_month_mm=prev_month_mm, next_month_mm=next_month_mm,
+                           local_office=shards.local_office(), selected_office=session.get('office'))
+
+@main.route('/offices/select/<code>', methods=['GET'])
+@login_required
+def select_office(code):
+    """Chọn văn phòng cho các trang @office_ok (danh sách nhân sự, KPI); mã văn phòng mình = bỏ chọn."""
+    if not shards.can_switch(current_user) or code not in shards.offices():
+        abort(403)
+    if code == shards.local_office():
+        session.pop('office', None)
+    else:
+        session['office'] = code
+    return redirect(url_for('main.list_employees'))
+
+@main.route('/documents/tt86', methods=['GET'])
+@login_required
+def tt86_documents():
+    """Tải ZIP tờ khai 08-MST cho danh sách nhân viên đang lọc (phòng / từ khóa / ids=1,2,3)."""
+    if not current_user.can_manage_hr:
+        abort(403)
+    department_id = request.args.get('category_id', type=int) or request.args.get('department_id', type=int)
+    kw = request.args.get('keyword', type=str)
+    ids = [int(i) for i in (request.args.get('ids') or '').split(',') if i.strip().isdigit()]
+    if current_user.is_hr_department:
+        # HR phòng chỉ được xuất tờ khai của phòng mình
+        department_id = current_user.employee.department_id if current_user.employee else None
+        if not department_id:
+            abort(403)
+
+    rows = documents.select_employees(department_id, kw, ids)
+    if not rows:
+        flash('Không có nhân viên nào phù hợp bộ lọc.', 'warning')
+        return redirect(url_for('main.list_employees', keyword=kw, category_id=department_id))
+
+    # Dựng ZIP ở worker nền (flask worker), không giữ luồng của request trong lúc dựng
+    today = date.today()
+    scope = f"phong-{department_id}" if department_id else "danh-sach"
+    documents.remove_old_outputs()
+    job = jobs.enqueue("documents.tt86",
+                       {"employee_ids": [e.id for e in rows], "on_date": today.isoformat(),
+                        "download_name": f"08-MST_{scope}_{today:%d-%m-%Y}.zip"},
+                       created_by=current_user.id, unique=True)
+    db.session.commit()
+    return redirect(url_for('main.tt86_download', job_id=job.id))
+
+@main.route('/documents/tt86/<int:job_id>', methods=['GET'])
+@login_required
+def tt86_download(job_id):
+    """Tải ZIP tờ khai khi worker dựng xong; chưa xong thì hiện tiến độ (trang tự tải lại)."""
+    job = db.session.get(Job, job_id)
+    if job is None or job.kind != "documents.tt86" or job.created_by != current_user.id:
+        abort(404)
+    path = documents.output_path(job.id)
+    if job.status == "done" and os.path.exists(path):
+        name = json.loads(job.payload).get("download_name") or f"08-MST_{job.id}.zip"
+        return send_file(path, as_attachment=True, download_name=name, mimetype='application/zip')
+    if job.status in ("done", "failed", "cancelled"):   # done mà mất file -> coi như lỗi
+        flash('Không dựng được tờ khai 08-MST, vui lòng thử lại.', 'danger')
+        return redirect(url_for('main.list_employees'))
+    return render_template('documents/tt86_wait.html', title='Tờ khai 08-MST', job=job)
+
 @main.route("/kpi_detail/<int:employee_id>", methods=["GET"])
+@replica_ok
+@office_ok
 @login_required
 def kpi_detail(employee_id: int):
     month_str_param = request.args.get("month")   # giờ nhận 'mm-yyyy'
@@ -167,16 +347,13 @@ def kpi_detail(employee_id: int):
     end_day = date(y, m, monthrange(y, m)[1])
 
     s = utils.absence_summary(db.session, employee_id, y, m)
-    records = (db.session.query(Absence)
-               .filter(Absence.employee_id == employee_id,
-                       Absence.work_date >= start_day,
-                       Absence.work_date <= end_day)
-               .order_by(Absence.work_date.asc())
-               .all())
+    records = utils.absence_records(db.session, employee_id, start_day, end_day)
 
     score = 100 - 2 * s["permitted_days_off"] - 10 * s["unpermitted_days_off"]
     score = max(0, min(100, round(score, 2)))
 
+    assessment = utils.assessment_analytics(db.session, y, m).get(employee_id)
+
     return render_template(
         "kpi/detail.html",
         employee=employee,
@@ -184,7 +361,8 @@ def kpi_detail(employee_id: int):
         month_str_mm=month_str_mm,
         prev_month_mm=prev_month_mm,
         next_month_mm=next_month_mm,
-        summary=s, score=score, records=records
+        summary=s, score=score, records=records,
+        assessment=assessment
     )
 
 # --- Route cho trang hồ sơ cá nhân ---
@@ -196,18 +374,13 @@ def profile():
     if form.validate_on_submit():
         # Kiểm tra nếu người dùng upload ảnh mới
         if form.picture.data:
-            # Nếu có ảnh cũ và KHÔNG phải ảnh mặc định thì xóa
-            if employee.avatar_url and employee.avatar_url != "images/default_avatar.png":
-                old_path = os.path.join(current_app.root_path, 'static', employee.avatar_url)
-                try:
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                except Exception as e:
-                    print(f"Lỗi xóa ảnh cũ: {e}")
-
-            # Lưu ảnh mới
-            picture_file = save_picture(form.picture.data)
-            employee.avatar_url = picture_file
+            # Lưu ảnh gốc, worker nền resize + thay ảnh cũ (xem task avatar.process)
+            ext = utils.avatar_ext(form.picture.data.filename)
+            path = jobs.upload_path(ext)
+            form.picture.data.save(path)
+            jobs.enqueue("avatar.process", {"employee_id": employee.id, "path": path, "ext": ext},
+                         created_by=current_user.id)
+            flash('Ảnh đại diện đang được xử lý, sẽ hiển thị sau ít giây.', 'info')
 
         # Cập nhật thông tin nhân viên
         employee.name = form.name.data
@@ -225,8 +398,6 @@ def profile():
 
     # Lấy đường dẫn ảnh để hiển thị
     image_file = url_for('static', filename=employee.avatar_url or 'images/default_avatar.png')
-    print(employee.avatar_url)
-    print(image_file)
     return render_template('profile.html', title='Hồ sơ cá nhân', form=form, image_file=image_file)
 
 # --- Route cho trang đánh giá nhân viên ---
@@ -247,3 +418,56 @@ def new_assessment():
         flash('Đánh giá đã được gửi!', 'success')
         return redirect(url_for('main.kpi_detail', employee_id=form.employee_id.data))
     return render_template('assessments/new.html', title='Đánh giá nhân viên', form=form)
+
+
+# --- Route đánh giá hàng loạt cho cả tổ/phòng ---
+@main.route("/assessments/batch", methods=['GET', 'POST'])
+@login_required
+def batch_assessment():
+    employees = utils.assessable_employees(current_user)
+    if not employees:
+        abort(403)
+    emp_by_id = {e.id: e for e in employees}
+
+    form = BatchAssessmentForm()
+    if form.validate_on_submit():
+        entries = [{
+            "employee_id": row.employee_id.data,
+            "score": row.score.data,
+            "assessment_content": (row.assessment_content.data or '').strip(),
+        } for row in form.rows]   # dòng bỏ trống điểm -> xóa đánh giá mình đã chấm ngày đó
+
+        # Không cho gửi kèm nhân viên ngoài phạm vi được đánh giá
+        if any(e["employee_id"] not in emp_by_id for e in entries):
+            abort(403)
+
+        saved = utils.save_assessment_batch(entries, form.assessment_date.data, current_user.id)
+        flash(f'Đã lưu {saved} đánh giá ngày {form.assessment_date.data.strftime("%d/%m/%Y")}.', 'success')
+        return redirect(url_for('main.batch_assessment',
+                                date=form.assessment_date.data.isoformat()))
+
+    if request.method == 'GET':
+        d = request.args.get('date')
+        try:
+            form.assessment_date.data = date.fromisoformat(d) if d else date.today()
+        except ValueError:
+            form.assessment_date.data = date.today()
+
+        # Điền sẵn đánh giá mình đã chấm trong ngày này (1 truy vấn)
+        existing = {a.employee_id: a for a in
+                    TaskAssessment.query
+                    .with_entities(TaskAssessment.employee_id, TaskAssessment.score,
+                                   TaskAssessment.assessment_content)
+                    .filter(TaskAssessment.employee_id.in_(list(emp_by_id)),
+                            TaskAssessment.assessment_date == form.assessment_date.data,
+                            TaskAssessment.assessor_id == current_user.id)}
+        for e in employees:
+            old = existing.get(e.id)
+            form.rows.append_entry({
+                "employee_id": e.id,
+                "score": old.score if old else None,
+                "assessment_content": old.assessment_content if old else '',
+            })
+
+    return render_template('assessments/batch.html', title='Đánh giá hàng loạt',
+                           form=form, emp_by_id=emp_by_id)
@@ -0,0 +1,175 @@
+# app/shards.py
+# Nhiều văn phòng, mỗi văn phòng 1 CSDL (shard) — cấu hình bằng OFFICE_CODE / OFFICE_DATABASES
+# (xem app/dbrouting.py). Văn phòng của instance này dùng CSDL chính, văn phòng khác là bind
+# "office:<mã>"; RoutingSession đưa mọi câu lệnh sang shard khi db.session.info["office"] được đặt.
+#   - Route theo văn phòng: route GET đánh dấu @office_ok đọc CSDL của văn phòng đang chọn
+#     (chỉ ADMIN / HR toàn cơ quan được chọn, /offices/select/<mã>); route khác luôn ở văn phòng mình.
+#   - Báo cáo toàn hệ thống: fan_out() chạy cùng 1 hàm trên mọi shard song song (mỗi luồng 1 app
+#     context + session riêng), mỗi shard trả về tổng bộ phận (OfficeTotals), merge() cộng lại.
+# Chạy thử với nhiều file SQLite:
+#   OFFICE_DATABASES="CN1=sqlite:////tmp/cn1.db;CN2=sqlite:////tmp/cn2.db"
+#   flask offices create-schema    # tạo bảng trên các shard SQLite trống
+#   flask offices summary --month 09-2025
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import NamedTuple
+from flask import current_app, request, session, g
+from flask_login import current_user
+from sqlalchemy import select
+from . import db, kpi, counters
+from .dbrouting import OFFICE_PREFIX
+from .models import Employee, OrgRole, SystemRole
+
+
+def local_office():
+    return current_app.config['OFFICE_CODE']
+
+def offices():
+    """Mã các văn phòng, văn phòng của instance này đứng đầu."""
+    return list(current_app.config['OFFICES'])
+
+def engine_for(code):
+    return db.engines[None] if code == local_office() else db.engines[OFFICE_PREFIX + code]
+
+@contextmanager
+def using_office(code):
+    """Các câu lệnh của db.session trong khối này chạy trên CSDL văn phòng `code`."""
+    if code not in offices():
+        raise KeyError(f"Không có văn phòng {code!r}")
+    previous = db.session.info.get("office")
+    db.session.info["office"] = None if code == local_office() else code
+    try:
+        yield
+    finally:
+        db.session.info["office"] = previous
+
+
+# --- Truy vấn song song trên mọi shard ---
+def fan_out(fn, *args, codes=None, **kwargs):
+    """
+    Gọi fn(*args, **kwargs) trên từng văn phòng song song.
+    Trả về ({mã: kết quả}, {mã: lỗi}) — shard lỗi / quá OFFICE_FANOUT_TIMEOUT giây không làm hỏng cả báo cáo.
+    """
+    app = current_app._get_current_object()
+    codes = list(codes or offices())
+
+    def run(code):
+        with app.app_context(), using_office(code):
+            return fn(*args, **kwargs)
+
+    results, errors = {}, {}
+    pool = ThreadPoolExecutor(max_workers=len(codes), thread_name_prefix="office")
+    try:
+        futures = {pool.submit(run, code): code for code in codes}
+        done, pending = wait(futures, timeout=app.config.get('OFFICE_FANOUT_TIMEOUT', 30))
+        for f in done:
+            if f.exception() is not None:
+                errors[futures[f]] = f.exception()
+            else:
+                results[futures[f]] = f.result()
+        for f in pending:
+            errors[futures[f]] = TimeoutError("quá thời gian chờ")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, errors
+
+
+# --- Tổng bộ phận của 1 văn phòng + gộp ---
+class OfficeTotals(NamedTuple):
+    """Tổng (không phải trung bình) để cộng được giữa các văn phòng; trung bình tính sau khi gộp."""
+    headcount: int
+    roles: dict            # {tên OrgRole: số người}
+    kpi_count: int         # số nhân viên có KPI tháng
+    days_off: float
+    permitted: float
+    unpermitted: float
+    attendance_sum: float
+    composite_sum: float
+    assessed: int          # số nhân viên có điểm đánh giá
+    assessment_sum: float
+
+    @property
+    def avg_attendance(self):
+        return self.attendance_sum / self.kpi_count if self.kpi_count else None
+
+    @property
+    def avg_composite(self):
+        return self.composite_sum / self.kpi_count if self.kpi_count else None
+
+    @property
+    def avg_assessment(self):
+        return self.assessment_sum / self.assessed if self.assessed else None
+
+def office_totals(year, month):
+    """Tổng của văn phòng hiện tại: sĩ số từ bộ đếm, KPI tháng từ monthly_kpis (thiếu thì tính)."""
+    counts = counters.headcounts()
+    roles = Counter()
+    for by_role in counts.values():
+        roles.update(by_role)
+    ids = db.session.scalars(select(Employee.id)).all()
+    rows = kpi.get_monthly_kpis(ids, year, month).values()
+    assessed = [r.assessment_score for r in rows if r.assessment_score is not None]
+    return OfficeTotals(
+        headcount=sum(roles[r.name] for r in OrgRole),
+        roles={r.name: roles[r.name] for r in OrgRole},
+        kpi_count=len(rows),
+        days_off=sum(r.total_days_off for r in rows),
+        permitted=sum(r.permitted_days_off for r in rows),
+        unpermitted=sum(r.unpermitted_days_off for r in rows),
+        attendance_sum=sum(r.attendance_score for r in rows),
+        composite_sum=sum(r.composite_score for r in rows),
+        assessed=len(assessed),
+        assessment_sum=sum(assessed),
+    )
+
+def merge(parts):
+    """Cộng OfficeTotals của nhiều văn phòng."""
+    parts = list(parts)
+    roles = Counter()
+    for p in parts:
+        roles.update(p.roles)
+    return OfficeTotals(
+        headcount=sum(p.headcount for p in parts),
+        roles={r.name: roles[r.name] for r in OrgRole},
+        kpi_count=sum(p.kpi_count for p in parts),
+        days_off=sum(p.days_off for p in parts),
+        permitted=sum(p.permitted for p in parts),
+        unpermitted=sum(p.unpermitted for p in parts),
+        attendance_sum=sum(p.attendance_sum for p in parts),
+        composite_sum=sum(p.composite_sum for p in parts),
+        assessed=sum(p.assessed for p in parts),
+        assessment_sum=sum(p.assessment_sum for p in parts),
+    )
+
+def org_summary(year, month):
+    """([(mã, OfficeTotals | None)], tổng toàn hệ thống, {mã: lỗi}) — mỗi shard 1 luồng."""
+    results, errors = fan_out(office_totals, year, month)
+    rows = [(code, results.get(code)) for code in offices()]
+    return rows, merge(results.values()), errors
+
+
+# --- Route theo văn phòng ---
+def office_ok(view):
+    """Đánh dấu route GET chỉ đọc, chạy được trên CSDL của văn phòng đang chọn (đặt ngay dưới @bp.route)."""
+    view.office_ok = True
+    return view
+
+def can_switch(user):
+    return user.is_authenticated and user.role in (SystemRole.ADMIN, SystemRole.HR_GENERAL)
+
+def init_offices(app):
+    if len(app.config['OFFICES']) < 2:
+        return
+
+    @app.before_request
+    def _route_office():
+        code = session.get("office")
+        if not code or code == local_office() or request.method not in ("GET", "HEAD"):
+            return
+        view = app.view_functions.get(request.endpoint)
+        if not getattr(view, "office_ok", False) or code not in offices() or not can_switch(current_user):
+            return
+        # Nạp sẵn hồ sơ người đăng nhập (header dùng) từ CSDL văn phòng mình trước khi chuyển shard
+        current_user.employee
+        db.session.info["office"] = g.office = code
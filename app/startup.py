@@ -0,0 +1,147 @@
+# app/startup.py
+# Thời gian khởi động worker:
+#   - step(app, tên): đo từng bước trong create_app (lưu ở app.extensions["startup_timings"])
+#   - LazyExtensions: extension chỉ cần cho CLI (Flask-Migrate -> alembic) được nạp khi lần đầu dùng
+#   - defer_pil(): Flask-Admin không kéo Pillow lúc khởi động (chỉ ImageUploadField cần tới)
+#   - profile(): chạy create_app trong process mới với -X importtime, tổng hợp thời gian import
+#     theo gói + thời gian từng bước (lệnh flask startup-profile, so với benchmarks/baseline.json)
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+import click
+from collections import defaultdict
+from contextlib import contextmanager
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "benchmarks", "baseline.json")
+
+
+@contextmanager
+def step(app, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        app.extensions.setdefault("startup_timings", []).append((name, time.perf_counter() - start))
+
+
+class LazyExtensions(dict):
+    """app.extensions: khóa chưa có mà có loader -> gọi loader (loader tự đăng ký khóa đó)."""
+    def __init__(self, data, loaders):
+        super().__init__(data)
+        self._loaders = loaders
+
+    def __missing__(self, key):
+        loader = self._loaders.pop(key, None)
+        if loader is None:
+            raise KeyError(key)
+        loader()
+        return self[key]
+
+
+class LazyGroup(click.Group):
+    """Nhóm lệnh CLI giữ chỗ: chỉ nạp nhóm thật (vd. `flask db` của Flask-Migrate) khi được gọi."""
+    def __init__(self, name, load, **kwargs):
+        super().__init__(name, **kwargs)
+        self._load = load
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        # Context (tham số, callback nhóm, lệnh con) thuộc về nhóm thật
+        return self._load().make_context(info_name, args, parent=parent, **extra)
+
+
+class _LazyModule:
+    """Đứng thay 1 module chưa nạp: import thật ở lần đầu đọc thuộc tính."""
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+
+def defer_pil():
+    """
+    flask_admin.form (contrib.sqla kéo theo) import form.upload, mà module này chạy ngay
+    `from PIL import Image, ImageOps` (~20 ms, chỉ ImageUploadField dùng). Nạp upload với PIL bị
+    chặn rồi gán lại Image / ImageOps bằng bản nạp khi dùng. Gọi trước khi import flask_admin.
+    """
+    if "flask_admin.form.upload" in sys.modules or "PIL" in sys.modules:
+        return
+    sys.modules["PIL"] = None   # import PIL -> ImportError, upload.py tự gán Image = None
+    try:
+        from flask_admin.form import upload
+    finally:
+        del sys.modules["PIL"]
+    upload.Image = _LazyModule("PIL.Image")
+    upload.ImageOps = _LazyModule("PIL.ImageOps")
+
+
+# --- Đo trong process mới (process hiện tại đã import sẵn mọi thứ) ---
+_CHILD = """
+import json, time
+t0 = time.perf_counter()
+import app as pkg
+t1 = time.perf_counter()
+a = pkg.create_app()
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "create_app_s": t2 - t1,
+                  "steps": a.extensions.get("startup_timings", [])}))
+"""
+
+def _parse_importtime(stderr):
+    """Cộng self time (µs) của các module theo gói gốc -> {gói: giây}."""
+    per_package = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative, name = line[len("import time:"):].split("|")
+        per_package[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return dict(per_package)
+
+def _run_once(root):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD], cwd=root,
+                          capture_output=True, text=True, env=os.environ.copy())
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "create_app lỗi")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["packages"] = _parse_importtime(proc.stderr)
+    return result
+
+def profile(runs=3):
+    """Trung bình `runs` lần khởi động: tổng, import, create_app, theo gói, theo bước."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = [_run_once(root) for _ in range(runs)]
+    avg = lambda values: sum(values) / len(values)
+    packages = defaultdict(list)
+    steps = defaultdict(list)
+    for r in results:
+        for name, sec in r["packages"].items():
+            packages[name].append(sec)
+        for name, sec in r["steps"]:
+            steps[name].append(sec)
+    out = {
+        "import_s": avg([r["import_s"] for r in results]),
+        "create_app_s": avg([r["create_app_s"] for r in results]),
+        "packages": {k: sum(v) / runs for k, v in packages.items()},
+        "steps": {k: avg(v) for k, v in steps.items()},
+    }
+    out["total_s"] = out["import_s"] + out["create_app_s"]
+    return out
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baseline(section, data):
+    baseline = load_baseline()
+    baseline[section] = data
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
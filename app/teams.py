@@ -0,0 +1,146 @@
+# app/teams.py
+# Cây tổ/nhóm (Team.parent_id) + bảng bao đóng team_closure (ancestor, descendant, depth).
+# Bảng bao đóng được cập nhật tăng dần ngay trong flush (mapper event, cùng transaction):
+#   - thêm tổ: chép các dòng tổ tiên của tổ cha + dòng (tổ, tổ, 0)
+#   - chuyển tổ sang cha khác: xóa các cặp (tổ tiên cũ ngoài nhánh, nút trong nhánh) rồi chèn
+#     tích (tổ tiên của cha mới) x (nút trong nhánh) — chỉ đụng tới nhánh bị chuyển
+#   - xóa tổ: ORM đặt parent_id = NULL cho các tổ con trước (thành tổ gốc, xử lý như chuyển tổ),
+#     sau đó chỉ còn xóa các dòng của chính tổ đó
+# Nhờ đó "mọi người dưới quyền 1 người phụ trách" hay KPI cả nhánh là 1 phép join theo index.
+from typing import NamedTuple, Optional
+from sqlalchemy import event, select, insert, delete, literal, func
+from . import db, kpi
+from .cache import memoize
+from .models import Team, TeamClosure, Employee
+
+C = TeamClosure.__table__
+
+
+class TeamMoveError(ValueError):
+    pass
+
+
+# --- Bảo trì bảng bao đóng ---
+def _subtree_ids(conn, team_id):
+    return conn.execute(select(C.c.descendant_id).where(C.c.ancestor_id == team_id)).scalars().all()
+
+def _current_parent(conn, team_id):
+    return conn.execute(select(C.c.ancestor_id)
+                        .where(C.c.descendant_id == team_id, C.c.depth == 1)).scalar()
+
+@event.listens_for(Team, "after_insert")
+def _on_team_insert(mapper, connection, target):
+    connection.execute(insert(C).values(ancestor_id=target.id, descendant_id=target.id, depth=0))
+    if target.parent_id:
+        connection.execute(insert(C).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(C.c.ancestor_id, literal(target.id), C.c.depth + 1)
+            .where(C.c.descendant_id == target.parent_id)))
+
+@event.listens_for(Team, "after_update")
+def _on_team_update(mapper, connection, target):
+    # So với cha đang ghi trong bảng bao đóng (đúng cả khi gán qua quan hệ Team.parent)
+    old_parent = _current_parent(connection, target.id)
+    if old_parent == target.parent_id:
+        return
+    subtree = _subtree_ids(connection, target.id)
+    if target.parent_id in subtree:
+        raise TeamMoveError(f"Không thể chuyển tổ “{target.name}” vào chính nhánh con của nó.")
+    # Lấy danh sách id trước (MySQL không cho DELETE kèm subquery trên cùng bảng)
+    connection.execute(delete(C).where(C.c.descendant_id.in_(subtree), C.c.ancestor_id.notin_(subtree)))
+    if target.parent_id:
+        # Tích (tổ tiên của cha mới) x (nút trong nhánh)
+        sup, sub = C.alias("sup"), C.alias("sub")
+        connection.execute(insert(C).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(sup.c.ancestor_id, sub.c.descendant_id, sup.c.depth + sub.c.depth + 1)
+            .select_from(sup.join(sub, sub.c.ancestor_id == target.id))
+            .where(sup.c.descendant_id == target.parent_id)))
+
+@event.listens_for(Team, "before_delete")
+def _on_team_delete(mapper, connection, target):
+    connection.execute(delete(C).where((C.c.descendant_id == target.id) | (C.c.ancestor_id == target.id)))
+
+def rebuild_closure():
+    """Dựng lại toàn bộ bảng bao đóng từ parent_id (sửa sai lệch nếu có); trả về số dòng."""
+    parents = dict(db.session.execute(select(Team.id, Team.parent_id)).all())
+    rows = []
+    for team_id in parents:
+        node, depth, seen = team_id, 0, set()
+        while node is not None and node not in seen:
+            seen.add(node)
+            rows.append({"ancestor_id": node, "descendant_id": team_id, "depth": depth})
+            node, depth = parents.get(node), depth + 1
+    db.session.execute(delete(C))
+    if rows:
+        db.session.execute(insert(C), rows)
+    db.session.commit()
+    return len(rows)
+
+
+# --- Truy vấn ---
+def subtree(team_id):
+    """Subquery id các tổ thuộc nhánh `team_id` (kể cả chính nó)."""
+    return select(C.c.descendant_id).where(C.c.ancestor_id == team_id)
+
+def managed_employee_ids(manager_employee_id):
+    """Subquery id mọi nhân viên trong các tổ (và tổ con) do người này phụ trách, trừ chính họ."""
+    return (select(Employee.id)
+            .join(C, C.c.descendant_id == Employee.team_id)
+            .join(Team, Team.id == C.c.ancestor_id)
+            .where(Team.manager_id == manager_employee_id, Employee.id != manager_employee_id))
+
+def manages_team(manager_employee_id, team_id):
+    """Người này có phụ trách `team_id` hoặc 1 tổ tổ tiên của nó không."""
+    return db.session.execute(
+        select(C.c.ancestor_id)
+        .join(Team, Team.id == C.c.ancestor_id)
+        .where(C.c.descendant_id == team_id, Team.manager_id == manager_employee_id)
+        .limit(1)).first() is not None
+
+@memoize(tags=lambda: ["teams"])
+def team_options():
+    """[(id, tên, độ sâu)] theo thứ tự cây (cha trước con) cho dropdown lọc."""
+    rows = db.session.execute(select(Team.id, Team.name, Team.parent_id)).all()   # bảng nhỏ, sắp ở Python
+    children = {}
+    for team_id, name, parent_id in rows:
+        children.setdefault(parent_id, []).append((team_id, name))
+    out = []
+
+    def walk(parent_id, depth):
+        for team_id, name in sorted(children.get(parent_id, []), key=lambda t: t[1]):
+            out.append((team_id, name, depth))
+            walk(team_id, depth + 1)
+
+    walk(None, 0)
+    return out
+
+
+class SubtreeKpi(NamedTuple):
+    """KPI tháng gộp của cả nhánh, cùng nguồn với từng dòng nhân viên (kpi.get_monthly_kpis)."""
+    team_id: int
+    headcount: int
+    days_off: float
+    avg_attendance: Optional[float]
+    avg_composite: Optional[float]
+
+def subtree_kpis(year, month, team_ids=None):
+    """
+    {team_id: SubtreeKpi} — mỗi tổ tính gộp cả tổ con, gộp ngay trong SQL: bảng bao đóng join
+    employees join KPI tháng, GROUP BY tổ tiên. KPI qua kpi.monthly_kpi_source nên dòng thiếu /
+    dirty được tính trước như trang tổng hợp.
+    """
+    members = (select(C.c.ancestor_id, Employee.id.label("employee_id"))
+               .join(Employee, Employee.team_id == C.c.descendant_id))
+    if team_ids is not None:
+        members = members.where(C.c.ancestor_id.in_(list(team_ids)))
+    members = members.subquery()
+    k = kpi.monthly_kpi_source(year, month, select(members.c.employee_id))
+
+    rows = db.session.execute(
+        select(members.c.ancestor_id, func.count(), func.sum(k.c.total_days_off),
+               func.avg(k.c.attendance_score), func.avg(k.c.composite_score))
+        .join(k, k.c.employee_id == members.c.employee_id)
+        .group_by(members.c.ancestor_id))
+    return {team_id: SubtreeKpi(team_id, headcount, days_off or 0.0, avg_attendance, avg_composite)
+            for team_id, headcount, days_off, avg_attendance, avg_composite in rows}
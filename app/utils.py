@@ -1,6 +1,13 @@
 from app import create_app, db
-from app.models import Employee, Absence, AbsencePart, User, SystemRole
-from PIL import Image, ImageOps
+from app.models import Employee, Absence, AbsencePart, User, SystemRole, TaskAssessment, OrgRole
+from app.kpi import mark_kpi_dirty
+from app import archive
+from app.changes import record_changes
+from app import live, counters, teams, readmodels
+from app.readmodels import EmployeeRow
+from app.cache import memoize, tag_on_commit, month_tag
+from sqlalchemy import select, func, case, delete, insert, update, bindparam, and_, or_
+from sqlalchemy.exc import IntegrityError
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from flask import current_app
@@ -9,28 +16,24 @@ from datetime import date
 from werkzeug.security import generate_password_hash, check_password_hash
 import re, os, secrets
 
+# Không cache: đây là user loader của Flask-Login, cache theo process sẽ giữ vai trò / quyền cũ
+# của tài khoản bị hạ quyền hoặc xóa ở các worker khác tới hết TTL (xóa tag chỉ có hiệu lực ở
+# process đã commit). Tra theo khóa chính, 1 câu SELECT nhỏ mỗi request.
 def get_user_by_id(user_id):
     return User.query.get(user_id)
 
+# Cache dòng EmployeeRow (chỉ cột), không cache đối tượng ORM: bản ORM tách rời được gắn lại vào
+# session mà không đọc lại, nên ở worker khác (xóa tag chỉ có hiệu lực ở process đã commit khi
+# CACHE_BACKEND = 'local') sẽ ghi đè dữ liệu mới bằng dữ liệu cũ nếu bị sửa rồi commit.
+@memoize(tags=lambda *a, **kw: ["employees", "departments"])
 def load_employees(employee_id=None, kw=None, department_id=None, page=1):
-    query = Employee.query
-
-    if employee_id:
-        query = query.filter(Employee.id == employee_id)
-
-    if kw:
-        kw = kw.strip()
-        if kw:
-            query = query.filter(Employee.name.ilike(f"%{kw}%"))
-
-    if department_id:
-        query = query.filter(Employee.department_id == department_id)
-
+    query = readmodels.employee_query(keyword=(kw or "").strip() or None, department_id=department_id,
+                                      employee_ids=[employee_id] if employee_id else None)
     query = query.order_by(Employee.id.asc())
     page_size = current_app.config['PAGE_SIZE']
     start = (page - 1)*page_size
     end = page_size + start
-    return query.slice(start, end).all()
+    return readmodels.employees(query.slice(start, end).all())
 
 def check_login(username: str, password: str):
     user = User.query.filter(User.username == username.strip()).first()
@@ -40,11 +43,14 @@ def check_login(username: str, password: str):
         return user
     return None
 
+@memoize(tags=lambda employee_id: [f"employee:{employee_id}", "departments"])
 def get_employee_by_id(employee_id):
-    return Employee.query.get(employee_id)
+    """EmployeeRow (chỉ đọc) hoặc None; cần sửa thì lấy Employee qua db.session.get."""
+    row = readmodels.employee_query(employee_ids=[employee_id]).first()
+    return EmployeeRow._make(row) if row else None
 
 def count_employees():
-    return Employee.query.order_by(None).count()
+    return counters.headcount()
 
 def parse_month(month_str: str | None):
     """Nhận 'mm-yyyy' hoặc 'yyyy-mm' -> (year, month). Sai/thiếu -> tháng hiện tại."""
@@ -60,18 +66,32 @@ def parse_month(month_str: str | None):
         return int(m2.group(1)), int(m2.group(2))
     return today.year, today.month
 
+def absence_records(session, employee_id: int, start_day: date, end_day: date):
+    """
+    Các ngày nghỉ của nhân viên trong khoảng ngày.
+    Luôn đọc bảng absences; chỉ khi khoảng ngày rơi vào năm "lạnh" mới đọc thêm file lưu trữ.
+    """
+    records = (session.query(Absence)
+               .filter(Absence.employee_id == employee_id,
+                       Absence.work_date >= start_day,
+                       Absence.work_date <= end_day)
+               .order_by(Absence.work_date.asc())
+               .all())
+    if archive.is_cold(start_day.year):
+        archived = archive.archived_absences(employee_id, start_day, end_day)
+        if archived:
+            records = sorted(archived + records, key=lambda a: a.work_date)
+    return records
+
+@memoize(key=lambda session, employee_id, year, month: (employee_id, year, month),
+         tags=lambda session, employee_id, year, month: [month_tag(employee_id, date(year, month, 1))])
 def absence_summary(session, employee_id: int, year: int, month: int):
     start_day = date(year, month, 1)
     end_day = date(year, month, monthrange(year, month)[1])
 
-    q = (session.query(Absence)
-         .filter(Absence.employee_id == employee_id,
-                 Absence.work_date >= start_day,
-                 Absence.work_date <= end_day))
-
     total = permitted = unpermitted = 0.0
 
-    for a in q.all():
+    for a in absence_records(session, employee_id, start_day, end_day):
         val = 1.0 if a.part == AbsencePart.FULL else 0.5
         total += val
         if a.is_permitted:
@@ -85,6 +105,273 @@ def absence_summary(session, employee_id: int, year: int, month: int):
         "unpermitted_days_off": unpermitted
     }
 
+# --- Phân tích đánh giá nhiệm vụ (TaskAssessment) ---
+def _month_shift(y: int, m: int, back: int):
+    """Lùi `back` tháng từ (y, m) -> (year, month)."""
+    idx = y * 12 + (m - 1) - back
+    return idx // 12, idx % 12 + 1
+
+# Cache theo (năm, tháng): mỗi tháng chỉ chạy 1 câu truy vấn cho toàn cơ quan.
+# Một đánh giá mới ảnh hưởng tới trung bình trượt của 12 tháng sau -> xóa cả tag "assessments".
+@memoize(key=lambda session, year, month: (year, month),
+         tags=lambda session, year, month: ["assessments"], ttl=3600)
+def assessment_analytics(session, year: int, month: int):
+    """
+    Thống kê đánh giá tính đến hết tháng (year, month) cho mọi nhân viên:
+    điểm gần nhất, trung bình trượt 3/6/12 tháng và phân vị trong phòng.
+    Trả về dict {employee_id: {...}}; nhân viên chưa có đánh giá thì không có khóa.
+    """
+    end_day = date(year, month, monthrange(year, month)[1])
+    start_3 = date(*_month_shift(year, month, 2), 1)
+    start_6 = date(*_month_shift(year, month, 5), 1)
+    start_12 = date(*_month_shift(year, month, 11), 1)
+
+    ta = TaskAssessment
+    # Đánh số các lần đánh giá của từng nhân viên, mới nhất = 1
+    ranked = (select(ta.employee_id, ta.score, ta.assessment_date,
+                     func.row_number().over(
+                         partition_by=ta.employee_id,
+                         order_by=(ta.assessment_date.desc(), ta.id.desc())
+                     ).label("rn"))
+              .where(ta.assessment_date >= start_12,
+                     ta.assessment_date <= end_day)
+              .subquery())
+
+    per_emp = (select(
+                   ranked.c.employee_id,
+                   func.max(case((ranked.c.rn == 1, ranked.c.score))).label("latest_score"),
+                   func.max(case((ranked.c.rn == 1, ranked.c.assessment_date))).label("latest_date"),
+                   func.avg(case((ranked.c.assessment_date >= start_3, ranked.c.score))).label("avg_3m"),
+                   func.avg(case((ranked.c.assessment_date >= start_6, ranked.c.score))).label("avg_6m"),
+                   func.avg(ranked.c.score).label("avg_12m"))
+               .group_by(ranked.c.employee_id)
+               .subquery())
+
+    # Phân vị = % nhân viên cùng phòng có điểm gần nhất <= điểm của mình
+    stmt = (select(per_emp,
+                   func.cume_dist().over(
+                       partition_by=Employee.department_id,
+                       order_by=per_emp.c.latest_score
+                   ).label("dept_percentile"))
+            .join(Employee, Employee.id == per_emp.c.employee_id))
+
+    result = {}
+    for r in session.execute(stmt):
+        result[r.employee_id] = {
+            "latest_score": r.latest_score,
+            "latest_date": r.latest_date,
+            "avg_3m": round(r.avg_3m, 2) if r.avg_3m is not None else None,
+            "avg_6m": round(r.avg_6m, 2) if r.avg_6m is not None else None,
+            "avg_12m": round(r.avg_12m, 2) if r.avg_12m is not None else None,
+            "dept_percentile": round(float(r.dept_percentile) * 100, 1),
+        }
+
+    return result
+
+def assessable_employees(user):
+    """
+    Danh sách (id, name, position) các nhân viên mà user được phép đánh giá.
+    Cùng quy tắc với User.can_manage nhưng lọc bằng 1 câu truy vấn thay vì từng người.
+    """
+    q = (Employee.query
+         .with_entities(Employee.id, Employee.name, Employee.position)
+         .order_by(Employee.name.asc()))
+
+    if user.role == SystemRole.ADMIN:
+        return q.all()
+
+    me = user.employee
+    if not me:
+        return []
+
+    # Người trong các tổ (mọi cấp) do mình phụ trách + quy tắc theo phòng như cũ
+    scopes = [Employee.id.in_(teams.managed_employee_ids(me.id))]
+    in_dept = and_(Employee.department_id == me.department_id, Employee.id != me.id)
+    if me.department_id and me.org_role == OrgRole.DEPT_HEAD:
+        scopes.append(in_dept)
+    elif me.department_id and me.org_role == OrgRole.TEAM_LEAD:
+        scopes.append(and_(in_dept, Employee.org_role == OrgRole.MEMBER))
+    return q.filter(or_(*scopes)).all()
+
+def save_assessment_batch(entries, assessment_date, assessor_id: int):
+    """
+    Lưu cả lô đánh giá trong 1 transaction, so với đánh giá đang có theo khóa
+    (nhân viên, ngày đánh giá, người đánh giá): chèn dòng mới, sửa dòng đổi, giữ nguyên dòng
+    không đổi; dòng để trống điểm -> xóa đánh giá mình đã chấm ngày đó.
+    Gửi lại cùng lô không thay đổi gì (id giữ nguyên, không sinh change_log) -> idempotent.
+    Đánh giá của người khác cùng ngày giữ nguyên.
+    entries: list dict {employee_id, score (None = bỏ trống), assessment_content} — mọi dòng của lưới
+    Trả về số đánh giá có điểm sau khi lưu.
+    """
+    # Trùng nhân viên trong cùng lô -> lấy dòng cuối
+    by_emp = {e["employee_id"]: e for e in entries}
+    if not by_emp:
+        return 0
+
+    existing, to_delete, touched = {}, [], set()
+    for r in db.session.execute(
+            select(TaskAssessment.id, TaskAssessment.employee_id, TaskAssessment.score,
+                   TaskAssessment.assessment_content)
+            .where(TaskAssessment.employee_id.in_(list(by_emp)),
+                   TaskAssessment.assessment_date == assessment_date,
+                   TaskAssessment.assessor_id == assessor_id)
+            .order_by(TaskAssessment.id)):
+        # Có thể đã trùng khóa (vd. chấm lẻ nhiều lần ở trang đánh giá từng người) -> giữ dòng đầu, xóa phần thừa
+        if r.employee_id in existing:
+            to_delete.append(r.id)
+            touched.add(r.employee_id)
+        else:
+            existing[r.employee_id] = r
+
+    to_insert, to_update = [], []
+    for emp_id, e in by_emp.items():
+        old = existing.get(emp_id)
+        content = (e.get("assessment_content") or None)
+        if e["score"] is None:
+            if old is not None:
+                to_delete.append(old.id)
+                touched.add(emp_id)
+        elif old is None:
+            to_insert.append({"employee_id": emp_id, "score": e["score"], "assessment_content": content,
+                              "assessment_date": assessment_date, "assessor_id": assessor_id})
+            touched.add(emp_id)
+        elif old.score != e["score"] or old.assessment_content != content:
+            to_update.append({"_id": old.id, "score": e["score"], "assessment_content": content})
+            touched.add(emp_id)
+    saved = sum(1 for e in by_emp.values() if e["score"] is not None)
+    if not touched:
+        return saved
+
+    table = TaskAssessment.__table__
+    try:
+        if to_delete:
+            db.session.execute(delete(table).where(table.c.id.in_(to_delete)))
+        if to_update:
+            db.session.execute(update(table).where(table.c.id == bindparam("_id"))
+                               .values(score=bindparam("score"),
+                                       assessment_content=bindparam("assessment_content")),
+                               to_update)
+        if to_insert:
+            db.session.execute(insert(table), to_insert)
+            new_ids = db.session.scalars(
+                select(TaskAssessment.id)
+                .where(TaskAssessment.employee_id.in_([v["employee_id"] for v in to_insert]),
+                       TaskAssessment.assessment_date == assessment_date,
+                       TaskAssessment.assessor_id == assessor_id))
+            record_changes(db.session, "assessments", new_ids, "I")
+        record_changes(db.session, "assessments", [u["_id"] for u in to_update], "U")
+        record_changes(db.session, "assessments", to_delete, "D")
+        mark_kpi_dirty(db.session, touched, [(assessment_date.year, assessment_date.month)])
+        # bulk insert/update/delete không qua flush -> tự báo tag cần xóa khi commit
+        tag_on_commit(db.session, "assessments")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return saved
+
+def parse_roll_call(entries):
+    """
+    Chuẩn hóa danh sách điểm danh -> {(employee_id, part): (is_permitted, reason)}.
+    Raise ValueError nếu có dòng sai; trùng (nhân viên, buổi) thì lấy dòng cuối.
+    """
+    result = {}
+    for i, e in enumerate(entries, start=1):
+        if not isinstance(e, dict):
+            raise ValueError(f"Dòng {i}: phải là object JSON")
+        try:
+            emp_id = int(e["employee_id"])
+            part = AbsencePart[e.get("part") or "FULL"]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Dòng {i}: employee_id / part không hợp lệ")
+        reason = e.get("reason") or ""
+        if not isinstance(reason, str):
+            raise ValueError(f"Dòng {i}: reason phải là chuỗi")
+        reason = reason.strip()[:200] or None
+        result[(emp_id, part)] = (bool(e.get("is_permitted")), reason)
+    return result
+
+def apply_roll_call(work_date, entries, delete_missing=False, scope_ids=None, _retry=True):
+    """
+    Ghi điểm danh cả ngày trong 1 transaction, so với dữ liệu đang có theo khóa
+    uq_abs_employee_date_part: chèn dòng mới, sửa dòng đổi, giữ nguyên dòng không đổi.
+    delete_missing=True -> xóa các dòng nghỉ của ngày không có trong danh sách
+    (chỉ trong scope_ids nếu có). Gửi lại cùng danh sách không thay đổi gì (an toàn khi retry).
+    Trả về {"inserted", "updated", "deleted", "unchanged"}.
+    """
+    wanted = parse_roll_call(entries)
+    emp_ids = {k[0] for k in wanted}
+    if scope_ids is not None and not emp_ids <= set(scope_ids):
+        raise PermissionError("Danh sách có nhân viên ngoài phạm vi quản lý")
+    unknown = emp_ids - set(db.session.scalars(select(Employee.id).where(Employee.id.in_(emp_ids))))
+    if unknown:
+        raise ValueError(f"Không có nhân viên: {', '.join(map(str, sorted(unknown)[:10]))}")
+
+    q = (select(Absence.id, Absence.employee_id, Absence.part, Absence.is_permitted, Absence.reason)
+         .where(Absence.work_date == work_date))
+    if not delete_missing:
+        q = q.where(Absence.employee_id.in_(emp_ids))
+    elif scope_ids is not None:
+        q = q.where(Absence.employee_id.in_(list(scope_ids)))
+    existing = {(r.employee_id, r.part): r for r in db.session.execute(q)}
+
+    to_insert, to_update, to_delete = [], [], []
+    touched = set()
+    for (emp_id, part), (permitted, reason) in wanted.items():
+        old = existing.get((emp_id, part))
+        if old is None:
+            to_insert.append({"employee_id": emp_id, "work_date": work_date, "part": part,
+                              "is_permitted": permitted, "reason": reason})
+            touched.add(emp_id)
+        elif bool(old.is_permitted) != permitted or old.reason != reason:
+            to_update.append({"_id": old.id, "is_permitted": permitted, "reason": reason})
+            touched.add(emp_id)
+    if delete_missing:
+        to_delete = [r.id for key, r in existing.items() if key not in wanted]
+        touched.update(key[0] for key in existing if key not in wanted)
+
+    summary = {"inserted": len(to_insert), "updated": len(to_update), "deleted": len(to_delete),
+               "unchanged": len(wanted) - len(to_insert) - len(to_update)}
+    if not touched:
+        return summary
+
+    table = Absence.__table__
+    try:
+        if to_delete:
+            db.session.execute(delete(table).where(table.c.id.in_(to_delete)))
+        if to_update:
+            db.session.execute(update(table).where(table.c.id == bindparam("_id"))
+                               .values(is_permitted=bindparam("is_permitted"),
+                                       reason=bindparam("reason")),
+                               to_update)
+        if to_insert:
+            db.session.execute(insert(table), to_insert)
+            new_keys = {(v["employee_id"], v["part"]) for v in to_insert}
+            new_ids = [r.id for r in db.session.execute(
+                select(Absence.id, Absence.employee_id, Absence.part)
+                .where(Absence.work_date == work_date,
+                       Absence.employee_id.in_({k[0] for k in new_keys})))
+                if (r.employee_id, r.part) in new_keys]
+            record_changes(db.session, "absences", new_ids, "I")
+        record_changes(db.session, "absences", [u["_id"] for u in to_update], "U")
+        record_changes(db.session, "absences", to_delete, "D")
+        mark_kpi_dirty(db.session, touched, [(work_date.year, work_date.month)])
+        live.mark_stale(db.session)
+        counters.rebuild_periods(db.session, [(work_date.year, work_date.month)])
+        tag_on_commit(db.session, *(month_tag(e, work_date) for e in touched))
+        db.session.commit()
+    except IntegrityError:
+        # Có request khác vừa ghi cùng ngày -> đọc lại và so lại 1 lần
+        db.session.rollback()
+        if not _retry:
+            raise
+        return apply_roll_call(work_date, entries, delete_missing, scope_ids, _retry=False)
+    except Exception:
+        db.session.rollback()
+        raise
+    return summary
+
 def ym_nav(y: int, m: int):
     """Trả về (prev_mm_yyyy, next_mm_yyyy)."""
     prev_y, prev_m = (y-1, 12) if m == 1 else (y, m-1)
@@ -92,13 +379,27 @@ def ym_nav(y: int, m: int):
     return f"{prev_m:02d}-{prev_y:04d}", f"{next_m:02d}-{next_y:04d}"
 
 # --- Hàm tiện ích để lưu ảnh ---
+def avatar_ext(filename):
+    """Đuôi file ảnh an toàn + viết thường."""
+    orig_ext = Path(secure_filename(filename)).suffix.lower()
+    return orig_ext if orig_ext in {".jpg", ".jpeg", ".png", ".webp"} else ".jpg"  # fallback an toàn
+
 def save_picture(form_picture):
     """Lưu ảnh đại diện do người dùng tải lên, đổi tên và resize."""
-    # Lấy đuôi file an toàn + viết thường
-    orig_ext = Path(secure_filename(form_picture.filename)).suffix.lower()
-    if orig_ext not in {".jpg", ".jpeg", ".png", ".webp"}:
-        orig_ext = ".jpg"  # fallback an toàn
+    return process_avatar(form_picture, avatar_ext(form_picture.filename))
+
+def remove_avatar(avatar_url):
+    """Xóa file ảnh đại diện cũ (bỏ qua ảnh mặc định)."""
+    if avatar_url and avatar_url != "images/default_avatar.png":
+        old_path = os.path.join(current_app.root_path, 'static', avatar_url)
+        try:
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        except OSError as e:
+            current_app.logger.warning("Lỗi xóa ảnh cũ: %s", e)
 
+def process_avatar(src, orig_ext):
+    """Resize ảnh (file object) và lưu vào static/uploads/avatars; trả về đường dẫn dưới static."""
     # Tạo tên file ngẫu nhiên
     picture_fn = f"{secrets.token_hex(8)}{orig_ext}"
 
@@ -107,8 +408,9 @@ def save_picture(form_picture):
     abs_dir = Path(current_app.root_path) / "static" / static_subdir
     abs_dir.mkdir(parents=True, exist_ok=True)
 
-    # Mở + auto-fix xoay, resize
-    img = Image.open(form_picture)
+    # Mở + auto-fix xoay, resize (Pillow chỉ nạp khi có ảnh tải lên)
+    from PIL import Image, ImageOps
+    img = Image.open(src)
     img = ImageOps.exif_transpose(img)        # sửa xoay (nếu có EXIF)
     img.thumbnail((200, 200))                 # resize vừa khung
 
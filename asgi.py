@@ -0,0 +1,5 @@
+# Stack đọc async (ASGI) chạy song song với run.py (WSGI), xem app/aio.py:
+#   uvicorn asgi:app --host 0.0.0.0 --port 5001
+from app.aio import create_asgi_app
+
+app = create_asgi_app()
@@ -0,0 +1,186 @@
+# benchmarks/async_vs_wsgi.py
+# So sánh số client đồng thời phục vụ được của 2 stack đọc trên cùng CSDL (DATABASE_URL):
+#   wsgi : app Flask (create_app) trên waitress (hoặc gunicorn --threads), 1 process, --threads luồng
+#          — cùng server như khi chạy thật / benchmarks/loadtest.py, không dùng server dev của Werkzeug
+#   asgi : app/aio.py trên uvicorn, 1 process
+# Mỗi mức tải: N client cùng lúc gọi liên tục GET /api/v1/<resource> trong --seconds giây.
+# Một stack "phục vụ được" N client nếu không lỗi, p95 <= --slo-ms và RSS đỉnh <= --memory-mb
+# (cùng ngân sách bộ nhớ cho cả 2 stack).
+#   python benchmarks/async_vs_wsgi.py --clients 10,50,200,500 --memory-mb 300
+#   python benchmarks/async_vs_wsgi.py --wsgi-server gunicorn --threads 16
+#   python benchmarks/async_vs_wsgi.py ... --save-baseline     # ghi vào benchmarks/baseline.json
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WSGI_SERVERS = {
+    "waitress": lambda port, args: [
+        sys.executable, "-m", "waitress", "--host=127.0.0.1", f"--port={port}",
+        f"--threads={args.threads}", f"--connection-limit={max(args.levels) + 50}", "--call", "app:create_app"],
+    "gunicorn": lambda port, args: [
+        sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", "1",
+        "--threads", str(args.threads), "--log-level", "warning", "app:create_app()"],
+}
+SERVERS = {
+    "wsgi": lambda port, args: WSGI_SERVERS[args.wsgi_server](port, args),
+    "asgi": lambda port, args: [
+        sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+        "--log-level", "warning", "--port", str(port)],
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _rss_mb(pid):
+    """RSS của process và các process con (gunicorn: master + worker)."""
+    total = 0.0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total = int(line.split()[1]) / 1024
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                total += sum(_rss_mb(int(child)) for child in f.read().split())
+    except FileNotFoundError:
+        pass
+    return total
+
+def _wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server không lên ở cổng {port}")
+
+
+def session_cookie():
+    """Cookie session Flask của 1 tài khoản có sẵn (ký bằng SECRET_KEY của app)."""
+    from sqlalchemy import select
+    from app import create_app, db
+    from app.models import User
+    flask_app = create_app()
+    with flask_app.app_context():
+        user_id = db.session.scalar(select(User.id).order_by(User.id).limit(1))
+    if user_id is None:
+        raise SystemExit("CSDL chưa có tài khoản nào.")
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    return f"{flask_app.config['SESSION_COOKIE_NAME']}={serializer.dumps({'_user_id': str(user_id), '_fresh': True})}"
+
+
+async def _get(port, path, cookie):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\n"
+                     f"Connection: close\r\n\r\n".encode())
+        await writer.drain()
+        data = await reader.read()
+    finally:
+        writer.close()
+    return int(data.split(b" ", 2)[1])
+
+async def _load(port, path, cookie, clients, seconds):
+    latencies, errors = [], 0
+    stop = time.monotonic() + seconds
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(_get(port, path, cookie), timeout=30)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies, errors
+
+
+def run_stack(name, clients_levels, args, cookie):
+    port = _free_port()
+    proc = subprocess.Popen(SERVERS[name](port, args), cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = []
+    try:
+        _wait_ready(port)
+        for clients in clients_levels:
+            peak = {"rss": _rss_mb(proc.pid)}
+            done = threading.Event()
+
+            def sample():
+                while not done.wait(0.2):
+                    peak["rss"] = max(peak["rss"], _rss_mb(proc.pid))
+
+            sampler = threading.Thread(target=sample, daemon=True)
+            sampler.start()
+            latencies, errors = asyncio.run(_load(port, args.path, cookie, clients, args.seconds))
+            done.set()
+            sampler.join()
+            latencies.sort()
+            p = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000 if latencies else None
+            row = {"clients": clients, "rps": len(latencies) / args.seconds, "p50_ms": p(0.50),
+                   "p95_ms": p(0.95), "errors": errors, "rss_mb": peak["rss"]}
+            row["ok"] = (errors == 0 and row["p95_ms"] is not None and row["p95_ms"] <= args.slo_ms
+                         and row["rss_mb"] <= args.memory_mb)
+            results.append(row)
+            print(f"{name:<5} {clients:>6} {row['rps']:>9.1f} {row['p50_ms'] or 0:>9.1f} "
+                  f"{row['p95_ms'] or 0:>9.1f} {errors:>7} {row['rss_mb']:>8.1f}  {'OK' if row['ok'] else '-'}")
+    finally:
+        proc.terminate()
+        proc.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", default="10,50,100,200,500", help="Các mức client đồng thời.")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--path", default="/api/v1/absences?limit=100")
+    parser.add_argument("--slo-ms", type=float, default=500, help="p95 tối đa được chấp nhận.")
+    parser.add_argument("--memory-mb", type=float, default=300, help="Ngân sách RSS của 1 process server.")
+    parser.add_argument("--stacks", default="wsgi,asgi")
+    parser.add_argument("--wsgi-server", choices=sorted(WSGI_SERVERS), default="waitress")
+    parser.add_argument("--threads", type=int, default=8, help="Số luồng của server WSGI.")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    levels = args.levels = [int(x) for x in args.clients.split(",")]
+    cookie = session_cookie()
+    print(f"{'stack':<5} {'clients':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7} {'RSS MB':>8}")
+    summary = {}
+    for name in args.stacks.split(","):
+        rows = run_stack(name, levels, args, cookie)
+        served = max((r["clients"] for r in rows if r["ok"]), default=0)
+        summary[name] = {"max_clients": served, "levels": rows}
+    print(f"Client đồng thời phục vụ được (p95 <= {args.slo_ms:.0f} ms, RSS <= {args.memory_mb:.0f} MB): "
+          + ", ".join(f"{k}={v['max_clients']}" for k, v in summary.items()))
+
+    if args.save_baseline:
+        from app.startup import save_baseline
+        save_baseline("async_read", {
+            "path": args.path, "slo_ms": args.slo_ms, "memory_mb": args.memory_mb,
+            "wsgi_server": args.wsgi_server, "threads": args.threads,
+            **{f"{k}_max_clients": v["max_clients"] for k, v in summary.items()},
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+# benchmarks/loadtest.py
+# Kiểm thử tải đầu-cuối "9 giờ sáng": dựng CSDL có dữ liệu mẫu, chạy app dưới server WSGI
+# kiểu production (waitress, hoặc gunicorn trên Linux) rồi cho nhiều người dùng ảo cùng đăng nhập
+# và thao tác theo tỉ lệ kịch bản. Báo cáo req/s, độ trễ p50/p90/p95/p99, tỉ lệ lỗi theo từng
+# loại request, độ bão hòa pool kết nối CSDL (/api/v1/db/pool-stats) và RSS đỉnh của server.
+#   python benchmarks/loadtest.py                                   # 100 người dùng, 60 giây, SQLite tạm
+#   python benchmarks/loadtest.py --users 300 --ramp 10 --seconds 120
+#   python benchmarks/loadtest.py --mix summary=60,kpi_detail=40    # chỉ 2 kịch bản
+#   python benchmarks/loadtest.py --server gunicorn --workers 4 --threads 8
+#   python benchmarks/loadtest.py --database-url mysql+pymysql://.../qlcv_loadtest   # CSDL trống
+#   python benchmarks/loadtest.py --report run.json --compare old.json   # so sánh 2 lần chạy
+#   python benchmarks/loadtest.py --save-baseline                   # ghi vào benchmarks/baseline.json
+# Mỗi người dùng ảo có tài khoản riêng (u0001, u0002...; --admins tài khoản đầu là ADMIN), đăng
+# nhập lúc bắt đầu (rải trong --ramp giây) rồi lặp: chọn kịch bản theo --mix, nghỉ --think-ms.
+# Kịch bản chỉ dành cho ADMIN (admin_edit) không được chọn cho tài khoản thường.
+# Ảnh đại diện tải lên chỉ được đưa vào hàng đợi (không chạy flask worker trong lúc đo).
+# Số liệu pool là của từng process: với gunicorn nhiều worker, mỗi mẫu lấy từ worker nhận request đó.
+import argparse
+import base64
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from html.parser import HTMLParser
+from urllib.parse import quote
+
+import urllib3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "loadtest"
+DEFAULT_MIX = "login=5,employees=25,search=10,summary=25,kpi_detail=20,avatar=5,admin_edit=10"
+ADMIN_ONLY = {"admin_edit"}
+# Ảnh PNG 1x1 cho kịch bản tải ảnh đại diện
+PNG = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==")
+
+HO = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ"]
+DEM = ["Văn", "Thị", "Hữu", "Minh", "Thanh", "Ngọc", "Đức", "Thu"]
+TEN = ["An", "Bình", "Cường", "Dũng", "Hà", "Hải", "Hạnh", "Hùng", "Lan", "Linh", "Mai", "Nam",
+       "Phương", "Quang", "Sơn", "Tâm", "Thảo", "Trang", "Tuấn", "Vy"]
+
+SERVERS = {
+    "waitress": lambda port, args: [
+        sys.executable, "-m", "waitress", "--host=127.0.0.1", f"--port={port}",
+        f"--threads={args.threads}", f"--connection-limit={args.users + 50}", "--call", "app:create_app"],
+    "gunicorn": lambda port, args: [
+        sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(args.workers),
+        "--threads", str(args.threads), "--log-level", "warning", "app:create_app()"],
+}
+
+
+# --- Dữ liệu mẫu ---
+def seed(n_employees, n_users, n_admins, year, month):
+    """Tạo bảng + dữ liệu mẫu (bằng INSERT hàng loạt) trong CSDL trống; bộ đếm và KPI tháng tính lại sau cùng."""
+    from sqlalchemy import insert, select, func
+    from werkzeug.security import generate_password_hash
+    from app import db, kpi, counters
+    from app.models import (Department, Employee, EmployeeHistory, User, SystemRole, OrgRole,
+                            Absence, AbsencePart, TaskAssessment, EmployeeSearchTerm,
+                            normalize_search, search_terms)
+
+    db.create_all()
+    if db.session.scalar(select(func.count(Employee.id))):
+        raise SystemExit("CSDL đã có nhân viên — kiểm thử tải cần 1 CSDL trống.")
+    rnd = random.Random(42)
+    n_deps = 8
+    db.session.execute(insert(Department), [{"id": i, "name": f"Phòng {i}"} for i in range(1, n_deps + 1)])
+
+    employees = []
+    for i in range(1, n_employees + 1):
+        name = f"{rnd.choice(HO)} {rnd.choice(DEM)} {rnd.choice(TEN)}"
+        role = (OrgRole.DEPT_HEAD if i <= n_deps else OrgRole.TEAM_LEAD if i % 10 == 0 else OrgRole.MEMBER)
+        email, phone = f"nv{i}@vpdk.vn", f"09{i:08d}"
+        employees.append({"id": i, "name": name, "position": "Chuyên viên", "email": email, "phone": phone,
+                          "department_id": (i - 1) % n_deps + 1, "org_role": role,
+                          "year_of_birth": datetime(1975 + i % 25, 1 + i % 12, 1),
+                          "search_key": normalize_search(f"{name} Chuyên viên {email} {phone}")})
+    db.session.execute(insert(Employee), employees)
+    db.session.execute(insert(EmployeeSearchTerm), [
+        {"employee_id": e["id"], "term": t} for e in employees for t in search_terms(e["search_key"])])
+    db.session.execute(insert(EmployeeHistory), [
+        {"employee_id": e["id"], "effective_from": date(2020, 1, 1), "department_id": e["department_id"],
+         "position": e["position"], "org_role": e["org_role"], "change_type": "CREATE", "is_current": True,
+         "source": "loadtest"} for e in employees])
+
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(insert(User), [
+        {"username": f"u{i:04d}", "password_hash": password_hash, "employee_id": i,
+         "role": SystemRole.ADMIN if i <= n_admins else SystemRole.STAFF}
+        for i in range(1, n_users + 1)])
+
+    last_day = min(date.today().day, 28) if (year, month) == (date.today().year, date.today().month) else 28
+    absences, assessments = [], []
+    for e in employees:
+        for d in rnd.sample(range(1, last_day + 1), min(3, last_day)):
+            absences.append({"employee_id": e["id"], "work_date": date(year, month, d),
+                             "part": rnd.choice(list(AbsencePart)), "is_permitted": rnd.random() < 0.6})
+        assessments.append({"employee_id": e["id"], "score": rnd.randint(50, 100),
+                            "assessment_date": date(year, month, 1), "assessor_id": 1})
+    db.session.execute(insert(Absence), absences)
+    db.session.execute(insert(TaskAssessment), assessments)
+    db.session.commit()
+    counters.reconcile()
+    kpi.compute_monthly_kpi(year, month)
+
+
+# --- HTTP ---
+class _FormParser(HTMLParser):
+    """Giá trị hiện tại của các ô trong form (input / select / textarea) của 1 trang."""
+    def __init__(self):
+        super().__init__()
+        self.fields, self._select, self._textarea = {}, None, None
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "input" and a.get("name"):
+            kind = a.get("type", "text")
+            if kind in ("submit", "button", "file") or (kind in ("checkbox", "radio") and "checked" not in a):
+                return
+            self.fields[a["name"]] = a.get("value") or ""
+        elif tag == "select":
+            self._select = a.get("name")
+        elif tag == "option" and self._select:
+            if "selected" in a or self._select not in self.fields:
+                self.fields[self._select] = a.get("value", "")
+        elif tag == "textarea":
+            self._textarea = a.get("name")
+            self.fields[self._textarea] = ""
+
+    def handle_endtag(self, tag):
+        if tag == "select":
+            self._select = None
+        elif tag == "textarea":
+            self._textarea = None
+
+    def handle_data(self, data):
+        if self._textarea:
+            self.fields[self._textarea] += data
+
+def form_fields(html):
+    parser = _FormParser()
+    parser.feed(html.decode("utf-8", "replace"))
+    return parser.fields
+
+
+class VirtualUser:
+    """1 người dùng ảo: cookie riêng, ghi lại (loại request, giây, lỗi) của mọi request."""
+    def __init__(self, http, base, username, is_admin, n_employees, month, rnd):
+        self.http, self.base = http, base
+        self.username, self.is_admin = username, is_admin
+        self.n_employees, self.month, self.rnd = n_employees, month, rnd
+        self.cookies = {}
+        self.samples = defaultdict(list)    # loại -> [giây]
+        self.errors = defaultdict(int)      # loại -> số lỗi
+
+    def request(self, label, method, path, expect=(200,), **kwargs):
+        headers = {"Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items())} if self.cookies else {}
+        start = time.perf_counter()
+        try:
+            resp = self.http.request(method, self.base + path, headers=headers, redirect=False, **kwargs)
+        except urllib3.exceptions.HTTPError:
+            self.errors[label] += 1
+            return None
+        elapsed = time.perf_counter() - start
+        for cookie in resp.headers.getlist("Set-Cookie"):
+            name, _, value = cookie.split(";", 1)[0].partition("=")
+            if value:
+                self.cookies[name] = value
+            else:
+                self.cookies.pop(name, None)
+        # Bị đẩy về trang đăng nhập = mất phiên, tính là lỗi
+        lost_session = resp.status == 302 and "/login" in resp.headers.get("Location", "") and label != "login"
+        if resp.status not in expect or lost_session:
+            self.errors[label] += 1
+            return None
+        self.samples[label].append(elapsed)
+        return resp
+
+    # --- Kịch bản ---
+    def login(self):
+        self.cookies.clear()
+        self.request("login", "POST", "/login", expect=(302,),
+                     fields={"username": self.username, "password": PASSWORD}, encode_multipart=False)
+
+    def employees(self):
+        self.request("employees", "GET", f"/employees?page={self.rnd.randint(1, 5)}")
+
+    def search(self):
+        self.request("search", "GET", f"/employees?keyword={quote(self.rnd.choice(TEN))}")
+
+    def summary(self):
+        dep = f"&department_id={self.rnd.randint(1, 8)}" if self.rnd.random() < 0.3 else ""
+        self.request("summary", "GET", f"/summary/all?month={self.month}&page={self.rnd.randint(1, 3)}{dep}")
+
+    def kpi_detail(self):
+        self.request("kpi_detail", "GET", f"/kpi_detail/{self.rnd.randint(1, self.n_employees)}?month={self.month}")
+
+    def avatar(self):
+        page = self.request("avatar:form", "GET", "/profile")
+        if page is None:
+            return
+        fields = form_fields(page.data)
+        fields["picture"] = ("avatar.png", PNG, "image/png")
+        self.request("avatar:upload", "POST", "/profile", expect=(302,), fields=fields)
+
+    def admin_edit(self):
+        emp_id = self.rnd.randint(1, self.n_employees)
+        path = f"/admin/employee/edit/?id={emp_id}"
+        page = self.request("admin_edit:form", "GET", path)
+        if page is None:
+            return
+        fields = form_fields(page.data)
+        fields["phone"] = f"09{self.rnd.randint(0, 99999999):08d}"
+        self.request("admin_edit:save", "POST", path, expect=(302,), fields=fields, encode_multipart=False)
+
+    def run(self, mix, stop, think):
+        self.login()
+        names = [n for n in mix if self.is_admin or n not in ADMIN_ONLY]
+        weights = [mix[n] for n in names]
+        while time.monotonic() < stop:
+            getattr(self, self.rnd.choices(names, weights)[0])()
+            time.sleep(self.rnd.expovariate(1000 / think) if think else 0)
+
+
+# --- Server + số liệu phía server ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(port, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server dừng với mã {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"Server không lên ở cổng {port}")
+
+def _rss_mb(pid):
+    """RSS (MB) của process + các process con (worker gunicorn); 0 nếu không có /proc."""
+    total = 0.0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            total += sum(_rss_mb(int(c)) for c in f.read().split())
+    except (OSError, StopIteration):
+        pass
+    return total
+
+def _pool_numbers(status):
+    """'Pool size: 5  Connections in pool: 1 Current Overflow: -4 Current Checked out connections: 0'."""
+    words = status.replace(":", "").split()
+    size = int(words[words.index("size") + 1])
+    checked_out = int(words[-1])
+    return size, checked_out
+
+class ServerSampler(threading.Thread):
+    """Lấy mẫu RSS + /api/v1/db/pool-stats (bằng 1 phiên ADMIN) mỗi `interval` giây."""
+    def __init__(self, proc, admin, interval=0.5):
+        super().__init__(daemon=True)
+        self.proc, self.admin, self.interval = proc, admin, interval
+        self.done = threading.Event()
+        self.rss_peak = 0.0
+        self.pools = {}   # tên pool -> số liệu lớn nhất
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.rss_peak = max(self.rss_peak, _rss_mb(self.proc.pid))
+            resp = self.admin.request("pool-stats", "GET", "/api/v1/db/pool-stats")
+            if resp is None:
+                continue
+            for name, s in json.loads(resp.data).items():
+                size, checked_out = _pool_numbers(s["status"])
+                p = self.pools.setdefault(name, {"pool_size": size, "checked_out_max": 0})
+                p["checked_out_max"] = max(p["checked_out_max"], checked_out)
+                for key in ("checkouts", "slow", "wait_max"):
+                    p[key] = s[key]
+                p["wait_avg_ms"] = round(s["wait_avg"] * 1000, 2)
+
+
+# --- Báo cáo ---
+def _percentile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)] * 1000 if values else None
+
+def summarize(users, seconds):
+    samples, errors = defaultdict(list), defaultdict(int)
+    for u in users:
+        for label, values in u.samples.items():
+            samples[label].extend(values)
+        for label, n in u.errors.items():
+            errors[label] += n
+    rows = {}
+    for label in sorted(set(samples) | set(errors)):
+        values = sorted(samples[label])
+        total = len(values) + errors[label]
+        rows[label] = {"requests": total, "rps": round(total / seconds, 2),
+                       "error_rate": round(errors[label] / total, 4) if total else 0.0,
+                       **{f"p{int(q * 100)}_ms": round(_percentile(values, q), 1) if values else None
+                          for q in (0.50, 0.90, 0.95, 0.99)},
+                       "max_ms": round(values[-1] * 1000, 1) if values else None}
+    everything = sorted(v for vs in samples.values() for v in vs)
+    n_errors = sum(errors.values())
+    total = len(everything) + n_errors
+    rows["TOTAL"] = {"requests": total, "rps": round(total / seconds, 2),
+                     "error_rate": round(n_errors / total, 4) if total else 0.0,
+                     **{f"p{int(q * 100)}_ms": round(_percentile(everything, q), 1) if everything else None
+                        for q in (0.50, 0.90, 0.95, 0.99)},
+                     "max_ms": round(everything[-1] * 1000, 1) if everything else None}
+    return rows
+
+def print_report(report, compare=None):
+    def ms(v):
+        return f"{v:8.1f}" if v is not None else f"{'-':>8}"
+
+    print(f"\n{'request':<18} {'n':>7} {'req/s':>8} {'lỗi %':>6} {'p50':>8} {'p90':>8} {'p95':>8} "
+          f"{'p99':>8} {'max':>8}" + ("  Δp95     Δreq/s" if compare else ""))
+    for label, r in report["requests"].items():
+        line = (f"{label:<18} {r['requests']:>7} {r['rps']:>8.1f} {r['error_rate'] * 100:>6.2f} "
+                f"{ms(r['p50_ms'])} {ms(r['p90_ms'])} {ms(r['p95_ms'])} {ms(r['p99_ms'])} {ms(r['max_ms'])}")
+        old = (compare or {}).get("requests", {}).get(label)
+        if old and old.get("p95_ms") and r["p95_ms"]:
+            line += f"  {r['p95_ms'] / old['p95_ms'] - 1:+6.0%}   {r['rps'] / old['rps'] - 1:+6.0%}"
+        print(line)
+    print("\nPool kết nối CSDL (đỉnh trong lúc chạy):")
+    for name, p in report["pool"].items():
+        capacity = p["pool_size"] + report["config"]["max_overflow"]
+        print(f"  {name:<10} đang dùng tối đa {p['checked_out_max']}/{capacity} "
+              f"({p['checked_out_max'] / capacity:.0%}), chờ TB {p['wait_avg_ms']} ms, "
+              f"chờ lâu nhất {p['wait_max'] * 1000:.1f} ms, {p['slow']} lần chờ >= 100 ms")
+    print(f"RSS đỉnh của server: {report['server_rss_mb']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm thử tải đầu-cuối với tỉ lệ kịch bản cấu hình được.")
+    parser.add_argument("--users", type=int, default=100, help="Số người dùng ảo đồng thời.")
+    parser.add_argument("--admins", type=int, help="Số người dùng ảo là ADMIN (mặc định 5%%, tối thiểu 1).")
+    parser.add_argument("--employees", type=int, default=1000, help="Số nhân viên trong dữ liệu mẫu.")
+    parser.add_argument("--seconds", type=float, default=60, help="Thời gian chạy (tính cả --ramp).")
+    parser.add_argument("--ramp", type=float, default=5, help="Rải lần đăng nhập đầu tiên trong N giây.")
+    parser.add_argument("--think-ms", type=float, default=500, help="Thời gian nghỉ trung bình giữa 2 thao tác.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Tỉ lệ kịch bản, vd. " + DEFAULT_MIX)
+    parser.add_argument("--server", choices=sorted(SERVERS), default="waitress")
+    parser.add_argument("--workers", type=int, default=2, help="Số process (chỉ gunicorn).")
+    parser.add_argument("--threads", type=int, default=8, help="Số luồng mỗi process server.")
+    parser.add_argument("--pool-size", type=int, default=5, help="DB_POOL_SIZE của server.")
+    parser.add_argument("--max-overflow", type=int, default=10, help="DB_MAX_OVERFLOW của server.")
+    parser.add_argument("--timeout", type=float, default=30, help="Số giây chờ tối đa mỗi request.")
+    parser.add_argument("--database-url", help="CSDL TRỐNG để nạp dữ liệu mẫu (mặc định: file SQLite tạm).")
+    parser.add_argument("--report", help="Ghi kết quả (JSON) ra file.")
+    parser.add_argument("--compare", help="So với kết quả JSON của lần chạy trước (mặc định: mốc trong baseline.json).")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Thoát mã 1 nếu p95 tổng vượt mốc so sánh quá tỉ lệ này.")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    mix = {}
+    for item in args.mix.split(","):
+        name, _, weight = item.partition("=")
+        if not hasattr(VirtualUser, name.strip()) or name.strip() == "run":
+            parser.error(f"kịch bản không có: {name}")
+        mix[name.strip()] = float(weight or 1)
+    admins = args.admins if args.admins is not None else max(1, args.users // 20)
+    today = date.today()
+    month = f"{today.month:02d}-{today.year}"
+
+    workdir = tempfile.mkdtemp(prefix="qlcv-loadtest-")
+    env = dict(os.environ, DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+               DB_POOL_SIZE=str(args.pool_size), DB_MAX_OVERFLOW=str(args.max_overflow),
+               JOBS_UPLOAD_DIR=os.path.join(workdir, "uploads"))
+    env.pop("DATABASE_REPLICA_URL", None)
+    os.environ.update(env)
+
+    from app import create_app
+    print(f"Nạp dữ liệu mẫu: {args.employees} nhân viên, {args.users} tài khoản ({admins} ADMIN)...")
+    with create_app().app_context():
+        seed(max(args.employees, args.users), args.users, admins, today.year, today.month)
+
+    port = _free_port()
+    proc = subprocess.Popen(SERVERS[args.server](port, args), cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    http = urllib3.PoolManager(maxsize=args.users + 1, block=True, retries=False,
+                               timeout=urllib3.Timeout(connect=10, read=args.timeout))
+    base = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(port, proc)
+        rnd = random.Random(7)
+        sampler_user = VirtualUser(http, base, "u0001", True, args.employees, month, random.Random(0))
+        sampler_user.login()
+        sampler = ServerSampler(proc, sampler_user)
+        users = [VirtualUser(http, base, f"u{i:04d}", i <= admins, args.employees, month,
+                             random.Random(rnd.random())) for i in range(1, args.users + 1)]
+        print(f"Chạy {args.users} người dùng trong {args.seconds:.0f} giây trên {args.server} "
+              f"({args.workers if args.server == 'gunicorn' else 1} process x {args.threads} luồng)...")
+        start = time.monotonic()
+        stop = start + args.seconds
+        threads = []
+        for i, u in enumerate(users):
+            delay = args.ramp * i / len(users)
+            t = threading.Timer(delay, u.run, (mix, stop, args.think_ms))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+        sampler.start()
+        for t in threads:
+            t.join()   # gồm cả thao tác đang dở lúc hết giờ
+        elapsed = time.monotonic() - start
+        sampler.done.set()
+        sampler.join()
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "config": {"server": args.server, "workers": args.workers, "threads": args.threads,
+                   "users": args.users, "admins": admins, "employees": args.employees,
+                   "seconds": args.seconds, "ramp": args.ramp, "think_ms": args.think_ms, "mix": mix,
+                   "pool_size": args.pool_size, "max_overflow": args.max_overflow,
+                   "database": "sqlite" if not args.database_url else args.database_url.split(":", 1)[0]},
+        "requests": summarize(users, elapsed),
+        "pool": sampler.pools,
+        "server_rss_mb": round(sampler.rss_peak, 1),
+    }
+
+    from app.startup import load_baseline, save_baseline
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    else:
+        previous = load_baseline().get("loadtest")
+    print_report(report, previous)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        save_baseline("loadtest", report)
+        print("Đã ghi mốc vào benchmarks/baseline.json.")
+        return
+    if previous and previous["requests"]["TOTAL"]["p95_ms"] and report["requests"]["TOTAL"]["p95_ms"]:
+        ratio = report["requests"]["TOTAL"]["p95_ms"] / previous["requests"]["TOTAL"]["p95_ms"] - 1
+        print(f"p95 tổng so với mốc: {ratio:+.0%}")
+        if ratio > args.max_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# benchmarks/readmodels.py
+# So sánh bộ nhớ / số lần cấp phát mỗi dòng giữa đối tượng ORM và read model (app/readmodels.py)
+# cho 3 loại dòng: nhân viên (trang danh sách), KPI tháng, lịch sử nhân sự.
+#   python benchmarks/readmodels.py                    # dữ liệu trong DATABASE_URL
+#   python benchmarks/readmodels.py --synthetic 5000   # tạo CSDL SQLite tạm với 5000 nhân viên
+#   python benchmarks/readmodels.py --synthetic 5000 --save-baseline
+# Tính trên mỗi dòng (tracemalloc): "giữ lại" = bộ nhớ còn chiếm sau khi dựng xong danh sách
+# (kể cả identity map của session), "đỉnh" = bộ nhớ cao nhất trong lúc đọc,
+# "khối" = số khối bộ nhớ (object) đã cấp phát còn sống.
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed(n):
+    from sqlalchemy import insert
+    from app import db
+    from app.models import Department, Employee, Absence, AbsencePart, EmployeeHistory, MonthlyKpi
+    db.create_all()
+    db.session.execute(insert(Department), [{"id": i, "name": f"Phòng {i}"} for i in range(1, 6)])
+    db.session.execute(insert(Employee), [
+        {"id": i, "name": f"Nhân viên {i:05d}", "position": "Chuyên viên", "email": f"nv{i}@vpdk.vn",
+         "phone": "0900000000", "department_id": i % 5 + 1, "year_of_birth": datetime(1990, 1, 1)}
+        for i in range(1, n + 1)])
+    db.session.execute(insert(Absence), [
+        {"employee_id": i, "work_date": date(2025, 9, d), "part": AbsencePart.FULL, "is_permitted": d % 2 == 0}
+        for i in range(1, n + 1) for d in (3, 10, 17)])
+    db.session.execute(insert(MonthlyKpi), [
+        {"employee_id": i, "year": 2025, "month": 9, "total_days_off": 3, "permitted_days_off": 1,
+         "unpermitted_days_off": 2, "attendance_score": 78, "assessment_score": 90, "composite_score": 84,
+         "attendance_weight": 0.5, "assessment_weight": 0.5, "is_frozen": False, "is_dirty": False,
+         "computed_at": datetime.now()}
+        for i in range(1, n + 1)])
+    db.session.execute(insert(EmployeeHistory), [
+        {"employee_id": i, "effective_from": date(2020, 1, 1), "department_id": i % 5 + 1,
+         "position": "Chuyên viên", "change_type": "Chuyển bộ phận", "is_current": True, "source": "benchmark"}
+        for i in range(1, n + 1)])
+    db.session.commit()
+
+
+def measure(build):
+    """build() -> danh sách dòng; trả về (số dòng, byte giữ lại, byte đỉnh, số khối, ms)."""
+    from app import db
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    rows = build()
+    elapsed = (time.perf_counter() - start) * 1000
+    snap = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    diff = snap.compare_to(base, "filename")
+    retained = sum(s.size_diff for s in diff if s.size_diff > 0)
+    blocks = sum(s.count_diff for s in diff if s.count_diff > 0)
+    n = len(rows)
+    del rows
+    db.session.remove()
+    return n, retained, peak, blocks, elapsed
+
+
+def scenarios():
+    from app import db, readmodels
+    from app.models import Employee, EmployeeHistory, MonthlyKpi
+
+    def orm_employees():
+        rows = Employee.query.order_by(Employee.id).all()
+        # Các thuộc tính trang danh sách đọc (department -> lazy load)
+        for e in rows:
+            (e.id, e.name, e.position, e.email, e.phone, e.department.name if e.department else None)
+        return rows
+
+    def dto_employees():
+        return readmodels.employees(readmodels.employee_query().order_by(Employee.id))
+
+    def orm_kpis():
+        return MonthlyKpi.query.all()
+
+    def dto_kpis():
+        return list(readmodels.kpi_rows(db.session.execute(db.select(*readmodels.KPI_COLUMNS))).values())
+
+    def orm_histories():
+        return EmployeeHistory.query.all()
+
+    def dto_histories():
+        return [readmodels.HistoryRow._make(r)
+                for r in db.session.execute(db.select(*readmodels.HISTORY_COLUMNS))]
+
+    return [("employees", orm_employees, dto_employees),
+            ("kpis", orm_kpis, dto_kpis),
+            ("histories", orm_histories, dto_histories)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", type=int, help="Tạo CSDL SQLite tạm với N nhân viên.")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        tmp.close()
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp.name}"
+        os.environ.pop("DATABASE_REPLICA_URL", None)
+
+    from app import create_app
+    app = create_app()
+    results = {}
+    with app.app_context():
+        if args.synthetic:
+            seed(args.synthetic)
+        print(f"{'rows':<10} {'path':<4} {'n':>7} {'giữ lại B':>10} {'đỉnh B':>8} {'khối':>6} {'ms':>8}")
+        for name, orm, dto in scenarios():
+            for path, build in (("orm", orm), ("dto", dto)):
+                build()   # làm nóng (biên dịch câu SQL, cache của mapper)
+                n, retained, peak, blocks, ms = measure(build)
+                per_row = [v / n if n else 0 for v in (retained, peak, blocks)]
+                results.setdefault(name, {})[path] = {"bytes_per_row": round(per_row[0]),
+                                                      "peak_bytes_per_row": round(per_row[1]),
+                                                      "blocks_per_row": round(per_row[2], 1)}
+                print(f"{name:<10} {path:<4} {n:>7} {per_row[0]:>10.0f} {per_row[1]:>8.0f} "
+                      f"{per_row[2]:>6.1f} {ms:>8.1f}")
+
+    if args.synthetic:
+        os.remove(tmp.name)
+    if args.save_baseline:
+        from app.startup import save_baseline
+        save_baseline("readmodels", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Add employee_search_terms for indexed prefix search in admin
+
+Revision ID: 5d2e8a917c30
+Revises: b81f5e2d7c64
+Create Date: 2026-10-19 23:02:41.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8a917c30'
+down_revision = 'b81f5e2d7c64'
+branch_labels = None
+depends_on = None
+
+
+def _terms(search_key):
+    # Giống app.models.search_terms (chép lại để migration không phụ thuộc code app)
+    terms = set()
+    for word in (search_key or '').split():
+        terms.add(word[:100])
+        terms.update(p[:100] for p in re.split(r'[^a-z0-9]+', word) if p)
+    return terms
+
+
+def upgrade():
+    op.create_table('employee_search_terms',
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employees.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('employee_id', 'term')
+    )
+    with op.batch_alter_table('employee_search_terms', schema=None) as batch_op:
+        batch_op.create_index('ix_search_terms_term', ['term', 'employee_id'], unique=False)
+
+    # LIKE '%term%' không dùng được index này -> bỏ
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_employees_search_key'))
+
+    # Tách từ khóa cho dữ liệu hiện có
+    conn = op.get_bind()
+    employees = sa.table('employees', sa.column('id', sa.Integer), sa.column('search_key', sa.String))
+    terms = sa.table('employee_search_terms',
+                     sa.column('employee_id', sa.Integer), sa.column('term', sa.String))
+    rows = [{'employee_id': r.id, 'term': t}
+            for r in conn.execute(sa.select(employees.c.id, employees.c.search_key))
+            for t in _terms(r.search_key)]
+    if rows:
+        conn.execute(terms.insert(), rows)
+
+
+def downgrade():
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_employees_search_key'), ['search_key'], unique=False)
+
+    with op.batch_alter_table('employee_search_terms', schema=None) as batch_op:
+        batch_op.drop_index('ix_search_terms_term')
+
+    op.drop_table('employee_search_terms')
@@ -0,0 +1,54 @@
+"""Add employees.search_key for accent-insensitive admin search
+
+Revision ID: 8e41b0c6f27a
+Revises: 3c9a7e21d4b8
+Create Date: 2026-10-19 10:05:12.447913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import unicodedata
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41b0c6f27a'
+down_revision = '3c9a7e21d4b8'
+branch_labels = None
+depends_on = None
+
+
+def _normalize(text):
+    # Giống app.models.normalize_search (chép lại để migration không phụ thuộc code app)
+    s = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    s = unicodedata.normalize('NFD', s)
+    s = ''.join(c for c in s if unicodedata.category(c) != 'Mn')
+    return ' '.join(s.lower().split())
+
+
+def upgrade():
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_key', sa.String(length=400), nullable=True))
+        batch_op.create_index(batch_op.f('ix_employees_search_key'), ['search_key'], unique=False)
+
+    # Điền search_key cho dữ liệu hiện có
+    conn = op.get_bind()
+    employees = sa.table('employees',
+                         sa.column('id', sa.Integer), sa.column('name', sa.String),
+                         sa.column('position', sa.String), sa.column('email', sa.String),
+                         sa.column('phone', sa.String), sa.column('search_key', sa.String))
+    rows = conn.execute(sa.select(employees.c.id, employees.c.name, employees.c.position,
+                                  employees.c.email, employees.c.phone)).fetchall()
+    if rows:
+        conn.execute(
+            employees.update()
+            .where(employees.c.id == sa.bindparam('_id'))
+            .values(search_key=sa.bindparam('_key')),
+            [{'_id': r.id,
+              '_key': _normalize(' '.join(filter(None, [r.name, r.position, r.email, r.phone])))}
+             for r in rows])
+
+
+def downgrade():
+    with op.batch_alter_table('employees', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_employees_search_key'))
+        batch_op.drop_column('search_key')
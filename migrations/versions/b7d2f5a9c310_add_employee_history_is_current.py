@@ -0,0 +1,45 @@
+"""Add employee_history.is_current with one-open-period constraint
+
+Revision ID: b7d2f5a9c310
+Revises: 8e41b0c6f27a
+Create Date: 2026-10-19 11:20:33.905114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f5a9c310'
+down_revision = '8e41b0c6f27a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('employee_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_current', sa.Boolean(), nullable=True))
+
+    # Đánh dấu kỳ mở mới nhất của mỗi nhân viên là kỳ hiện hành
+    conn = op.get_bind()
+    hist = sa.table('employee_history',
+                    sa.column('id', sa.Integer), sa.column('employee_id', sa.Integer),
+                    sa.column('effective_from', sa.Date), sa.column('effective_to', sa.Date),
+                    sa.column('is_current', sa.Boolean))
+    rows = conn.execute(sa.select(hist.c.id, hist.c.employee_id)
+                        .where(hist.c.effective_to.is_(None))
+                        .order_by(hist.c.employee_id, hist.c.effective_from, hist.c.id)).fetchall()
+    latest = {}
+    for r in rows:
+        latest[r.employee_id] = r.id
+    if latest:
+        conn.execute(hist.update().where(hist.c.id.in_(list(latest.values()))).values(is_current=True))
+
+    with op.batch_alter_table('employee_history', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_hist_emp_current', ['employee_id', 'is_current'])
+
+
+def downgrade():
+    with op.batch_alter_table('employee_history', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_hist_emp_current', type_='unique')
+        batch_op.drop_column('is_current')
@@ -0,0 +1,50 @@
+"""Partition absences by YEAR(work_date) on MySQL
+
+Revision ID: c41e8d2a6b95
+Revises: b7d2f5a9c310
+Create Date: 2026-10-19 13:02:48.716530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import date
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e8d2a6b95'
+down_revision = 'b7d2f5a9c310'
+branch_labels = None
+depends_on = None
+
+# MySQL yêu cầu:
+# - bảng phân vùng không có khóa ngoại
+# - mọi khóa unique (kể cả PK) phải chứa cột phân vùng -> PK (id, work_date);
+#   uq_abs_employee_date_part đã chứa work_date.
+# Các CSDL khác (SQLite khi chạy thử) bỏ qua; dữ liệu năm cũ được tách bằng `flask archive run`.
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+
+    for fk in sa.inspect(bind).get_foreign_keys('absences'):
+        op.drop_constraint(fk['name'], 'absences', type_='foreignkey')
+
+    op.execute("ALTER TABLE absences DROP PRIMARY KEY, ADD PRIMARY KEY (id, work_date)")
+
+    this_year = date.today().year
+    first = bind.execute(sa.text("SELECT MIN(YEAR(work_date)) FROM absences")).scalar() or this_year
+    parts = [f"PARTITION p{y} VALUES LESS THAN ({y + 1})" for y in range(first, this_year + 2)]
+    parts.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    op.execute(f"ALTER TABLE absences PARTITION BY RANGE (YEAR(work_date)) ({', '.join(parts)})")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+
+    op.execute("ALTER TABLE absences REMOVE PARTITIONING")
+    op.execute("ALTER TABLE absences DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    op.create_foreign_key('absences_ibfk_1', 'absences', 'employees', ['employee_id'], ['id'])
@@ -1,14 +1,11 @@
-from app import create_app, db
-from flask_migrate import Migrate
+from app import create_app
 
 app = create_app()
-migrate = Migrate(app, db)
 
 @app.route('/')
 def home():
     return "Welcome!"
 
+# Schema không tạo lúc khởi động nữa: chạy `flask db upgrade` trước khi start
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
     app.run(debug=True, host='0.0.0.0', port=5000)
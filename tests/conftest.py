@@ -0,0 +1,89 @@
+# tests/conftest.py
+# Chạy: python -m pytest -q (từ thư mục gốc repo). CSDL SQLite tạm, dựng lại bảng + dữ liệu mẫu
+# trước mỗi test. create_app chỉ gọi 1 lần cho cả phiên: Flask-Admin dùng 1 đối tượng `admin`
+# toàn cục, gọi lại sẽ đăng ký view trùng.
+import os
+import shutil
+import sys
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("qlcv")
+    with pytest.MonkeyPatch.context() as mp:
+        for name in ("DATABASE_REPLICA_URL", "OFFICE_DATABASES", "OFFICE_CODE"):
+            mp.delenv(name, raising=False)
+        mp.setenv("DATABASE_URL", f"sqlite:///{tmp / 'test.db'}")
+        mp.setenv("CACHE_BACKEND", "local")
+        from app import create_app
+        flask_app = create_app()
+    flask_app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        CHANGE_FEED_LAG_SECONDS=0,
+        ARCHIVE_DIR=str(tmp / "archive"),
+        REPORT_DIR=str(tmp / "reports"),
+        JOBS_UPLOAD_DIR=str(tmp / "jobs"),
+    )
+    return flask_app
+
+
+@pytest.fixture(autouse=True)
+def data(app):
+    """Bảng trống + 2 phòng, 6 nhân viên, tài khoản admin (nhân viên đầu tiên)."""
+    from werkzeug.security import generate_password_hash
+    from app import db, cache
+    from app.models import Department, Employee, User, SystemRole, OrgRole
+
+    shutil.rmtree(app.config["ARCHIVE_DIR"], ignore_errors=True)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        cache.backend().clear()
+        deps = [Department(name="Phòng Tổ chức"), Department(name="Phòng Kế toán")]
+        db.session.add_all(deps)
+        db.session.flush()
+        employees = [Employee(name=f"Nguyễn Văn {chr(65 + i)}", position="Chuyên viên",
+                              department_id=deps[i % 2].id,
+                              org_role=OrgRole.DEPT_HEAD if i < 2 else OrgRole.MEMBER)
+                     for i in range(6)]
+        db.session.add_all(employees)
+        db.session.flush()
+        admin = User(username="admin", password_hash=generate_password_hash("1"),
+                     role=SystemRole.ADMIN, employee_id=employees[0].id)
+        db.session.add(admin)
+        db.session.commit()
+        yield SimpleNamespace(department_ids=[d.id for d in deps],
+                              employee_ids=[e.id for e in employees],
+                              admin_id=admin.id)
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, data):
+    """Test client đã đăng nhập bằng tài khoản admin."""
+    c = app.test_client()
+    with c.session_transaction() as s:
+        s["_user_id"] = str(data.admin_id)
+        s["_fresh"] = True
+    return c
+
+
+@pytest.fixture
+def add_absence():
+    """add_absence(employee_id, ngày, part='FULL', permitted=False) qua ORM (có flush + commit)."""
+    from app import db
+    from app.models import Absence, AbsencePart
+
+    def add(employee_id, day: date, part="FULL", permitted=False):
+        a = Absence(employee_id=employee_id, work_date=day, part=AbsencePart[part], is_permitted=permitted)
+        db.session.add(a)
+        db.session.commit()
+        return a
+    return add
@@ -0,0 +1,79 @@
+# Cache đọc (app/cache.py): xóa theo tag chỉ khi commit, cả backend local và redis-stub
+import pytest
+from sqlalchemy import update
+
+from app import db, cache, utils
+from app.models import Employee
+
+
+@pytest.fixture(params=["local", "redis-stub"])
+def backend(request, app, monkeypatch):
+    monkeypatch.setitem(app.config, "CACHE_BACKEND", request.param)
+    cache.init_cache(app)
+    yield cache.backend()
+    monkeypatch.setitem(app.config, "CACHE_BACKEND", "local")
+    cache.init_cache(app)
+
+
+def counted(tags):
+    calls = []
+
+    @cache.memoize(tags=tags)
+    def read(employee_id):
+        calls.append(employee_id)
+        return db.session.get(Employee, employee_id).name
+    return read, calls
+
+
+def test_flush_tags_cleared_on_commit_only(backend, data):
+    emp_id = data.employee_ids[0]
+    read, calls = counted(lambda employee_id: [f"employee:{employee_id}"])
+    assert read(emp_id) == read(emp_id)
+    assert len(calls) == 1
+
+    db.session.get(Employee, emp_id).name = "Tên mới"
+    db.session.flush()
+    read(emp_id)
+    assert len(calls) == 1              # chưa commit: vẫn đọc cache
+    db.session.rollback()
+    read(emp_id)
+    assert len(calls) == 1              # rollback: tag bị bỏ
+
+    db.session.get(Employee, emp_id).name = "Tên mới"
+    db.session.commit()
+    assert read(emp_id) == "Tên mới"
+    assert len(calls) == 2
+
+def test_bulk_statements_use_tag_on_commit(backend, data):
+    emp_id = data.employee_ids[0]
+    read, calls = counted(lambda employee_id: ["employees"])
+    read(emp_id)
+    db.session.execute(update(Employee).where(Employee.id == emp_id).values(name="Bulk"))
+    cache.tag_on_commit(db.session, "employees")
+    db.session.commit()
+    assert read(emp_id) == "Bulk"
+    assert len(calls) == 2
+
+def test_employee_reads_are_row_tuples(backend, data):
+    emp_id = data.employee_ids[0]
+    row = utils.get_employee_by_id(emp_id)
+    assert not isinstance(row, db.Model)
+    db.session.get(Employee, emp_id).department.name = "Phòng Đổi Tên"
+    db.session.commit()
+    assert utils.get_employee_by_id(emp_id).department_name == "Phòng Đổi Tên"
+
+def test_orm_results_are_refused(data):
+    @cache.memoize()
+    def orm_read():
+        return db.session.get(Employee, data.employee_ids[0])
+    with pytest.raises(TypeError):
+        orm_read()
+
+def test_local_lru_evicts_oldest():
+    lru = cache.LocalCache(maxsize=2)
+    for key in "abc":
+        lru.set(key, key, tags=["t"])
+    assert lru.get("a") is cache._MISSING
+    assert lru.get("c") == "c"
+    lru.invalidate_tags(["t"])
+    assert lru.get("b") is cache._MISSING and lru.get("c") is cache._MISSING
@@ -0,0 +1,68 @@
+# Nhật ký thay đổi + GET /api/v1/changes (app/changes.py): token, gộp theo dòng, độ trễ an toàn
+from datetime import date
+
+from app import db, changes
+from app.api import encode_cursor
+from app.models import Employee
+
+
+def feed(client, token=None, **params):
+    if token:
+        params["since"] = token
+    resp = client.get("/api/v1/changes", query_string=params)
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return resp.get_json()
+
+
+def test_token_resumes_after_last_change(client, data, add_absence):
+    first = feed(client)
+    assert {e["id"] for e in first["changes"]["employees"]["upserts"]} == set(data.employee_ids)
+    assert feed(client, first["token"])["changes"] == {}
+
+    a = add_absence(data.employee_ids[0], date(2026, 5, 4))
+    emp = db.session.get(Employee, data.employee_ids[1])
+    emp.phone = "0901234567"
+    db.session.commit()
+    second = feed(client, first["token"])
+    assert [r["id"] for r in second["changes"]["absences"]["upserts"]] == [a.id]
+    assert [r["id"] for r in second["changes"]["employees"]["upserts"]] == [emp.id]
+
+    db.session.delete(a)
+    db.session.commit()
+    third = feed(client, second["token"])
+    assert third["changes"] == {"absences": {"upserts": [], "deletes": [a.id]}}
+    # Token cũ: thêm rồi xóa trong cùng đoạn -> chỉ còn lệnh xóa
+    assert feed(client, first["token"])["changes"]["absences"] == {"upserts": [], "deletes": [a.id]}
+
+def test_paging_with_has_more(client, data):
+    seen, token = set(), None
+    while True:
+        page = feed(client, token, limit=4)
+        seen |= {e["id"] for e in page["changes"].get("employees", {}).get("upserts", [])}
+        token = page["token"]
+        if not page["has_more"]:
+            break
+    assert seen == set(data.employee_ids)
+
+def test_lag_holds_back_fresh_changes(app, client, data, monkeypatch, add_absence):
+    token = feed(client)["token"]
+    monkeypatch.setitem(app.config, "CHANGE_FEED_LAG_SECONDS", 60)
+    add_absence(data.employee_ids[0], date(2026, 5, 4))
+    page = feed(client, token)
+    assert page["changes"] == {}
+    assert page["token"] == token          # chưa đọc qua dòng đang chờ -> không bỏ sót
+    monkeypatch.setitem(app.config, "CHANGE_FEED_LAG_SECONDS", 0)
+    assert "absences" in feed(client, token)["changes"]
+
+def test_compact_keeps_latest_per_row(data):
+    emp = db.session.get(Employee, data.employee_ids[0])
+    for phone in ("1", "2", "3"):
+        emp.phone = phone
+        db.session.commit()
+    assert changes.compact(older_than_days=-1) == 3
+    collapsed, _, _ = changes.read_changes(0, 100)
+    assert collapsed["employees"]["upserts"] == set(data.employee_ids)
+
+def test_bad_cursor(client):
+    assert client.get("/api/v1/changes?since=***").status_code == 400
+    assert client.get("/api/v1/changes", query_string={"since": encode_cursor(0)}).status_code == 200
@@ -0,0 +1,80 @@
+# Bộ đếm theo phòng (app/counters.py): cộng/trừ theo flush, rebuild_periods sau lệnh bulk, reconcile
+from datetime import date
+
+from sqlalchemy import delete, update
+
+from app import db, counters
+from app.models import Absence, Employee, OrgRole, DepartmentCounter
+
+T = DepartmentCounter.__table__
+
+
+def totals(department_id, year=2026, month=5):
+    return counters.absence_totals.uncached(year, month).get(department_id, {}).get("total", 0.0)
+
+
+def test_headcount_follows_inserts_moves_and_deletes(data):
+    d1, d2 = data.department_ids
+    assert counters.headcount() == 6
+    assert counters.headcount(d1) == 3
+    e = Employee(name="Trần Thị X", position="Chuyên viên", department_id=d1)
+    db.session.add(e)
+    db.session.commit()
+    assert counters.headcount(d1) == 4
+    e.department_id, e.org_role = d2, OrgRole.TEAM_LEAD
+    db.session.commit()
+    assert counters.headcount(d1) == 3
+    assert counters.headcount(d2, OrgRole.TEAM_LEAD) == 1
+    db.session.delete(e)
+    db.session.commit()
+    assert counters.headcount(d2) == 3
+    assert counters.reconcile() == 0
+
+def test_absence_deltas(data, add_absence):
+    d1, d2 = data.department_ids
+    emp = data.employee_ids[0]           # thuộc phòng d1
+    a = add_absence(emp, date(2026, 5, 4))
+    add_absence(emp, date(2026, 5, 5), part="PM", permitted=True)
+    assert totals(d1) == 1.5
+    a.work_date = date(2026, 6, 1)       # đổi tháng: trừ tháng cũ, cộng tháng mới
+    db.session.commit()
+    assert totals(d1) == 0.5
+    assert totals(d1, 2026, 6) == 1.0
+    db.session.get(Employee, emp).department_id = d2   # chuyển phòng: ngày nghỉ đi theo
+    db.session.commit()
+    assert totals(d1) == 0.0
+    assert totals(d2) == 0.5
+    assert counters.reconcile() == 0
+
+def test_rebuild_periods_after_bulk_delete(data, add_absence):
+    d1 = data.department_ids[0]
+    emp = data.employee_ids[0]
+    for day in (4, 5, 6):
+        add_absence(emp, date(2026, 5, day))
+    add_absence(emp, date(2026, 4, 30))
+    db.session.execute(delete(Absence).where(Absence.work_date >= date(2026, 5, 5)))
+    counters.rebuild_periods(db.session, [(2026, 4), (2026, 5)])
+    db.session.commit()
+    assert totals(d1) == 1.0
+    assert totals(d1, 2026, 4) == 1.0
+    assert counters.reconcile() == 0
+
+def test_rebuild_periods_keeps_other_periods(data, add_absence):
+    d1 = data.department_ids[0]
+    add_absence(data.employee_ids[0], date(2026, 5, 4))
+    add_absence(data.employee_ids[0], date(2026, 7, 1))
+    counters.rebuild_periods(db.session, [(2026, 5)])
+    db.session.commit()
+    assert totals(d1, 2026, 7) == 1.0
+    assert totals(d1) == 1.0
+
+def test_reconcile_repairs_drift(data, add_absence):
+    d1 = data.department_ids[0]
+    add_absence(data.employee_ids[0], date(2026, 5, 4))
+    db.session.execute(update(T).where(T.c.period == "2026-05").values(value=9))
+    db.session.execute(delete(T).where(T.c.period == ""))
+    db.session.commit()
+    assert counters.reconcile() > 0
+    assert totals(d1) == 1.0
+    assert counters.headcount() == 6
+    assert counters.reconcile() == 0
@@ -0,0 +1,71 @@
+# KPI tháng (app/kpi.py): dirty khi dữ liệu nguồn đổi, chốt tháng, năm đã lưu trữ
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from app import db, kpi, archive
+from app.models import MonthlyKpi, TaskAssessment
+
+
+def stored(employee_id, year=2026, month=5):
+    return db.session.execute(select(MonthlyKpi).where(MonthlyKpi.employee_id == employee_id,
+                                                       MonthlyKpi.year == year,
+                                                       MonthlyKpi.month == month)).scalar_one()
+
+
+def test_dirty_rows_are_recomputed(data, add_absence):
+    emp = data.employee_ids[0]
+    assert kpi.compute_monthly_kpi(2026, 5) == len(data.employee_ids)
+    assert stored(emp).attendance_score == 100
+
+    add_absence(emp, date(2026, 5, 4))                     # không phép: -10
+    assert stored(emp).is_dirty
+    assert kpi.get_monthly_kpis([emp], 2026, 5)[emp].attendance_score == 90   # tính trực tiếp
+
+    assert kpi.refresh_dirty_kpis() == 1
+    row = stored(emp)
+    assert (row.is_dirty, row.attendance_score) == (False, 90)
+
+def test_assessment_changes_dirty_both_employees(data):
+    e1, e2 = data.employee_ids[:2]
+    ta = TaskAssessment(employee_id=e1, score=80, assessment_date=date(2026, 5, 20), assessor_id=e2)
+    db.session.add(ta)
+    db.session.commit()
+    kpi.compute_monthly_kpi(2026, 5)
+    ta.employee_id = e2                                    # chuyển sang người khác
+    db.session.commit()
+    assert stored(e1).is_dirty and stored(e2).is_dirty
+    kpi.refresh_dirty_kpis()
+    assert stored(e1).assessment_score is None
+    assert stored(e2).assessment_score == 80
+
+def test_frozen_month_needs_force(data, add_absence):
+    emp = data.employee_ids[0]
+    kpi.close_month(2026, 5)
+    with pytest.raises(ValueError):
+        kpi.compute_monthly_kpi(2026, 5)
+
+    add_absence(emp, date(2026, 5, 4))
+    assert stored(emp).is_dirty
+    kpi.refresh_dirty_kpis()                               # giữ trạng thái chốt
+    row = stored(emp)
+    assert (row.is_frozen, row.is_dirty, row.attendance_score) == (True, False, 90)
+
+    kpi.compute_monthly_kpi(2026, 5, force=True)
+    assert all(r.is_frozen for r in MonthlyKpi.query.filter_by(year=2026, month=5))
+
+def test_archived_year_is_never_recomputed(data, add_absence):
+    emp = data.employee_ids[0]
+    year = archive.first_hot_year() - 1
+    add_absence(emp, date(year, 3, 2))
+    assert archive.archive_year(year) == (1, 0)
+    assert stored(emp, year, 3).attendance_score == 90
+
+    with pytest.raises(ValueError):
+        kpi.compute_monthly_kpi(year, 3, force=True)
+    kpi.mark_kpi_dirty(db.session, [emp], [(year, 3)])
+    db.session.commit()
+    assert kpi.refresh_dirty_kpis() == 0
+    # Dữ liệu nguồn đã chuyển ra file: dùng nguyên số đã chốt kể cả khi bị đánh dấu dirty
+    assert kpi.get_monthly_kpis([emp], year, 3)[emp].attendance_score == 90
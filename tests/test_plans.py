@@ -0,0 +1,25 @@
+# Kế hoạch truy vấn của các trang chính (flask plans check) trên SQLite
+from datetime import date
+
+from app import db, plans
+from app.models import Team, Employee, TaskAssessment
+
+
+def test_hot_queries_use_indexes(data, add_absence):
+    today = date.today()
+    root = Team(name="Tổ gốc")
+    db.session.add(root)
+    db.session.flush()
+    child = Team(name="Tổ con", parent_id=root.id)
+    db.session.add(child)
+    db.session.flush()
+    for i, emp_id in enumerate(data.employee_ids):
+        db.session.get(Employee, emp_id).team_id = (root, child)[i % 2].id
+        db.session.add(TaskAssessment(employee_id=emp_id, score=70 + i, assessment_date=today,
+                                      assessor_id=data.employee_ids[0]))
+    db.session.commit()
+    for day, emp_id in enumerate(data.employee_ids, start=1):
+        add_absence(emp_id, today.replace(day=min(day, 28)))
+
+    messages = []
+    assert plans.check(echo=messages.append) == 0, "\n".join(messages)
@@ -0,0 +1,68 @@
+# Điểm danh cả ngày (utils.apply_roll_call, POST /api/v1/absences/roll-call): gửi lại không đổi gì
+from datetime import date
+
+import pytest
+from sqlalchemy import select, func
+
+from app import db, utils
+from app.models import Absence, ChangeLog
+
+DAY = date(2026, 5, 6)
+
+
+def snapshot():
+    return db.session.execute(select(Absence.id, Absence.employee_id, Absence.part,
+                                     Absence.is_permitted, Absence.reason)
+                              .order_by(Absence.id)).all()
+
+def log_size():
+    return db.session.scalar(select(func.count(ChangeLog.id)).where(ChangeLog.resource == "absences"))
+
+
+def test_resubmit_is_idempotent(data):
+    e1, e2, e3 = data.employee_ids[:3]
+    entries = [{"employee_id": e1}, {"employee_id": e2, "part": "AM", "is_permitted": True, "reason": " Ốm "},
+               {"employee_id": e3, "part": "PM"}]
+    assert utils.apply_roll_call(DAY, entries) == {"inserted": 3, "updated": 0, "deleted": 0, "unchanged": 0}
+    rows, logged = snapshot(), log_size()
+    assert logged == 3
+    assert utils.apply_roll_call(DAY, entries) == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 3}
+    assert snapshot() == rows
+    assert log_size() == logged
+
+def test_changes_and_delete_missing(data):
+    e1, e2, e3 = data.employee_ids[:3]
+    utils.apply_roll_call(DAY, [{"employee_id": e1}, {"employee_id": e2}, {"employee_id": e3}])
+    ids = {r.employee_id: r.id for r in snapshot()}
+    summary = utils.apply_roll_call(DAY, [{"employee_id": e1, "is_permitted": True}, {"employee_id": e2}],
+                                    delete_missing=True)
+    assert summary == {"inserted": 0, "updated": 1, "deleted": 1, "unchanged": 1}
+    rows = {r.employee_id: r for r in snapshot()}
+    assert set(rows) == {e1, e2}
+    assert rows[e1].id == ids[e1] and rows[e1].is_permitted
+    assert {op for (op,) in db.session.execute(select(ChangeLog.op).where(ChangeLog.resource == "absences"))} \
+        == {"I", "U", "D"}
+
+def test_delete_missing_limited_to_scope(data):
+    e1, e2 = data.employee_ids[:2]
+    utils.apply_roll_call(DAY, [{"employee_id": e1}, {"employee_id": e2}])
+    utils.apply_roll_call(DAY, [{"employee_id": e1}], delete_missing=True, scope_ids={e1})
+    assert {r.employee_id for r in snapshot()} == {e1, e2}
+
+def test_rejects_bad_entries(data):
+    with pytest.raises(ValueError):
+        utils.apply_roll_call(DAY, [{"employee_id": 9999}])
+    with pytest.raises(ValueError):
+        utils.apply_roll_call(DAY, [{"employee_id": data.employee_ids[0], "part": "NIGHT"}])
+    with pytest.raises(PermissionError):
+        utils.apply_roll_call(DAY, [{"employee_id": data.employee_ids[1]}], scope_ids={data.employee_ids[0]})
+    assert snapshot() == []
+
+def test_api_roll_call(client, data):
+    body = {"work_date": DAY.isoformat(), "entries": [{"employee_id": data.employee_ids[0], "part": "AM"}]}
+    first = client.post("/api/v1/absences/roll-call", json=body)
+    again = client.post("/api/v1/absences/roll-call", json=body)
+    assert first.status_code == again.status_code == 200
+    assert first.get_json()["inserted"] == 1
+    assert again.get_json()["unchanged"] == 1
+    assert client.post("/api/v1/absences/roll-call", json={"work_date": "06/05/2026", "entries": []}).status_code == 400
@@ -0,0 +1,97 @@
+# Bảng bao đóng team_closure cập nhật tăng dần khi thêm / chuyển / xóa tổ (app/teams.py)
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from app import db, kpi, teams
+from app.models import Team, Employee
+
+
+def closure():
+    C = teams.C
+    return set(db.session.execute(select(C.c.ancestor_id, C.c.descendant_id, C.c.depth)).all())
+
+def ancestors(team_id):
+    C = teams.C
+    return dict(db.session.execute(select(C.c.ancestor_id, C.c.depth).where(C.c.descendant_id == team_id)).all())
+
+def assert_matches_rebuild():
+    """Bảng cập nhật tăng dần phải trùng với bảng dựng lại từ parent_id."""
+    incremental = closure()
+    teams.rebuild_closure()
+    assert closure() == incremental
+
+def make_tree():
+    a = Team(name="A")
+    db.session.add(a)
+    db.session.flush()
+    b = Team(name="B", parent_id=a.id)
+    d = Team(name="D", parent_id=a.id)
+    db.session.add_all([b, d])
+    db.session.flush()
+    c = Team(name="C", parent_id=b.id)
+    db.session.add(c)
+    db.session.commit()
+    return a, b, c, d
+
+
+def test_insert_copies_ancestors():
+    a, b, c, d = make_tree()
+    assert ancestors(c.id) == {c.id: 0, b.id: 1, a.id: 2}
+    assert ancestors(d.id) == {d.id: 0, a.id: 1}
+    assert_matches_rebuild()
+
+def test_move_subtree_to_new_parent():
+    a, b, c, d = make_tree()
+    b.parent_id = d.id
+    db.session.commit()
+    assert ancestors(b.id) == {b.id: 0, d.id: 1, a.id: 2}
+    assert ancestors(c.id) == {c.id: 0, b.id: 1, d.id: 2, a.id: 3}
+    assert_matches_rebuild()
+
+def test_move_to_root_and_back():
+    a, b, c, d = make_tree()
+    b.parent = None
+    db.session.commit()
+    assert ancestors(c.id) == {c.id: 0, b.id: 1}
+    b.parent = a
+    db.session.commit()
+    assert ancestors(c.id) == {c.id: 0, b.id: 1, a.id: 2}
+    assert_matches_rebuild()
+
+def test_move_into_own_subtree_is_refused():
+    a, b, c, d = make_tree()
+    before = closure()
+    b.parent_id = c.id
+    with pytest.raises(teams.TeamMoveError):
+        db.session.commit()
+    db.session.rollback()
+    assert closure() == before
+
+def test_delete_team_detaches_children():
+    a, b, c, d = make_tree()
+    db.session.delete(b)
+    db.session.commit()
+    assert ancestors(c.id) == {c.id: 0}
+    assert all(b.id not in row[:2] for row in closure())
+    assert_matches_rebuild()
+
+def test_subtree_kpis_group_by_ancestor(data, add_absence):
+    a, b, c, d = make_tree()
+    ids = data.employee_ids
+    placement = {ids[0]: a.id, ids[1]: b.id, ids[2]: c.id, ids[3]: c.id, ids[4]: d.id}
+    for emp_id, team_id in placement.items():
+        db.session.get(Employee, emp_id).team_id = team_id
+    db.session.commit()
+    add_absence(ids[2], date(2026, 3, 2))
+    kpi.compute_monthly_kpi(2026, 3, employee_ids=[ids[0], ids[1]])
+    add_absence(ids[1], date(2026, 3, 3), part="AM")   # dòng KPI đã tính -> dirty
+
+    result = teams.subtree_kpis(2026, 3)
+    assert {t: r.headcount for t, r in result.items()} == {a.id: 5, b.id: 3, c.id: 2, d.id: 1}
+    assert result[b.id].days_off == 1.5
+    # Cùng số với từng dòng nhân viên (kpi.get_monthly_kpis)
+    rows = kpi.get_monthly_kpis([ids[1], ids[2], ids[3]], 2026, 3)
+    assert result[b.id].avg_attendance == pytest.approx(sum(r.attendance_score for r in rows.values()) / 3)
+    assert set(teams.subtree_kpis(2026, 3, [c.id])) == {c.id}